@@ -1,4 +1,4 @@
-""
+"""
 Alembic environment configuration.
 """
 import asyncio
@@ -7,6 +7,7 @@ import os
 import sys
 from logging.config import fileConfig
 
+from alembic import context
 from sqlalchemy import engine_from_config, pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
@@ -17,7 +18,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 # Import the models to ensure they are registered with SQLAlchemy
 from app.db.base import Base  # noqa
 from app.db.models.user import User  # noqa
+from app.db.models.block import ContentBlock  # noqa
 from app.db.models.contribution import Contribution, ContributionHistory  # noqa
+from app.db.models.history_archive import HistoryArchive  # noqa
+from app.db.models.outbox import SearchOutbox  # noqa
+from app.db.models.search import SEARCH_TABLES  # noqa
+from app.db.models.upload import UploadSession  # noqa
 from app.core.config import settings  # noqa
 
 # this is the Alembic Config object, which provides
@@ -3,7 +3,16 @@ API v1 router configuration.
 """
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import health_check, auth, data, search, validate
+from app.api.v1.endpoints import (
+    admin,
+    health_check,
+    auth,
+    changes,
+    data,
+    search,
+    uploads,
+    validate,
+)
 
 # Create main API router
 api_router = APIRouter()
@@ -11,6 +20,7 @@ api_router = APIRouter()
 # Include endpoint routers
 api_router.include_router(health_check.router, tags=["System"])
 api_router.include_router(auth.router, prefix="/authenticate", tags=["Authentication"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
 api_router.include_router(
     data.router,
     prefix="/{repository}/data",
@@ -26,6 +36,11 @@ api_router.include_router(
     prefix="/{repository}/validate",
     tags=["Validation"],
 )
+api_router.include_router(
+    changes.router,
+    prefix="/{repository}/changes",
+    tags=["Change Feed"],
+)
 
 # Private endpoints (require authentication)
 private_router = APIRouter()
@@ -44,6 +59,16 @@ private_router.include_router(
     prefix="/private/validate",
     tags=["Private Validation"],
 )
+private_router.include_router(
+    changes.private_router,
+    prefix="/private/changes",
+    tags=["Private Change Feed"],
+)
+private_router.include_router(
+    uploads.private_router,
+    prefix="/private/uploads",
+    tags=["Private Uploads"],
+)
 
 # Include private router with repository prefix
 api_router.include_router(
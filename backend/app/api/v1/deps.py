@@ -1,17 +1,18 @@
 """
 Dependencies for API endpoints.
 """
-from typing import Optional
+from typing import Callable, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.security import decode_token
+from app.db.models.search import SearchLevel
 from app.db.session import get_db
-from app.schemas.token import TokenPayload, UserResponse
+from app.schemas.token import UserResponse
+from app.services.projection import Projection
 from app.services.user import get_user
 
 # OAuth2 scheme for token authentication
@@ -43,19 +44,18 @@ async def get_current_user(
     )
     
     try:
-        payload = decode_token(token)
-        user_id: int = int(payload.sub)
-        if user_id is None:
-            raise credentials_exception
-        token_data = TokenPayload(user_id=user_id)
-    except (JWTError, ValueError):
+        token_data = decode_token(token)
+    except ValueError:
+        # The subject is not a user id
+        raise credentials_exception
+    if token_data.sub is None:
         raise credentials_exception
     
-    user = await get_user(db, user_id=token_data.user_id)
+    user = await get_user(db, user_id=token_data.sub)
     if user is None:
         raise credentials_exception
     
-    return UserResponse.from_orm(user)
+    return UserResponse.model_validate(user, from_attributes=True)
 
 
 async def get_current_active_user(
@@ -99,3 +99,65 @@ async def get_current_active_superuser(
             detail="The user doesn't have enough privileges",
         )
     return current_user
+
+
+def _projection(
+    level: str,
+    fields: Optional[str],
+    exclude: Optional[str],
+    view: Optional[str],
+) -> Projection:
+    try:
+        return Projection.from_query(level, fields, exclude, view)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        ) from e
+
+
+def get_projection(level: str) -> Callable[..., Projection]:
+    """
+    Build a dependency that reads field projection query parameters.
+    
+    Args:
+        level: Search level whose view presets apply
+        
+    Returns:
+        Dependency returning the requested projection
+    """
+    def projection(
+        fields: Optional[str] = Query(
+            None, description="Comma-separated dotted paths to include"
+        ),
+        exclude: Optional[str] = Query(
+            None, description="Comma-separated dotted paths to exclude"
+        ),
+        view: Optional[str] = Query(
+            None, description="Named field preset, e.g. summaries or map"
+        ),
+    ) -> Projection:
+        return _projection(level, fields, exclude, view)
+    
+    return projection
+
+
+def get_level_projection(
+    table: SearchLevel,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated dotted paths to include"
+    ),
+    exclude: Optional[str] = Query(
+        None, description="Comma-separated dotted paths to exclude"
+    ),
+    view: Optional[str] = Query(
+        None, description="Named field preset, e.g. summaries or map"
+    ),
+) -> Projection:
+    """
+    Read field projection query parameters for the level in the path.
+    
+    Returns:
+        Projection of the rows of that level
+    """
+    return _projection(table.value, fields, exclude, view)
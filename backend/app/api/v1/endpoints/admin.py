@@ -0,0 +1,72 @@
+"""
+Admin-only endpoints for operating the API.
+"""
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse
+
+from app.api.v1.deps import get_current_active_superuser
+from app.core import profiling
+from app.core.config import settings
+from app.db.slow_queries import slow_query_log
+from app.schemas.admin import ProfileInfo, SlowQueryLog
+
+# Create router
+router = APIRouter(dependencies=[Depends(get_current_active_superuser)])
+
+
+@router.get("/slow-queries", response_model=SlowQueryLog)
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of entries"),
+    service: Optional[str] = Query(
+        None, description="Only statements issued by this service method"
+    ),
+    min_duration_ms: float = Query(0, ge=0, description="Only statements this slow"),
+) -> Any:
+    """
+    Get recent slow database statements of this worker, slowest first.
+    """
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "explain_sample_rate": settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        "items": slow_query_log.list(limit, service, min_duration_ms),
+    }
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries() -> Response:
+    """
+    Clear the slow query log of this worker.
+    """
+    slow_query_log.clear()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def get_profiles(
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of profiles"),
+) -> Any:
+    """
+    List stored request profiles, newest first.
+    """
+    return profiling.list_profiles(limit)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query(
+        "html", description="html for a report, speedscope for https://speedscope.app"
+    ),
+) -> Any:
+    """
+    Download a stored request profile.
+    """
+    path = profiling.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+    return FileResponse(path, media_type=profiling.PROFILE_FORMATS[format][1])
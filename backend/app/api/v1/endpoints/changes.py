@@ -0,0 +1,220 @@
+"""
+Change feed endpoints for mirrors and downstream services.
+"""
+import asyncio
+from typing import Any, AsyncContextManager, AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.deps import get_current_active_user
+from app.core.config import settings
+from app.db.session import (
+    AsyncSessionLocal,
+    get_db,
+    get_read_db,
+    read_session,
+)
+from app.schemas.changes import ChangeCursor, ChangeEvent, ChangeFeed
+from app.schemas.data import RepositoryEnum
+from app.schemas.token import UserResponse
+from app.services.contribution import ContributionService
+from app.services.history_archive import HistoryArchivedError, check_cursor
+
+# Create routers
+router = APIRouter()
+private_router = APIRouter(dependencies=[Depends(get_current_active_user)])
+
+
+def _archived(error: HistoryArchivedError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_410_GONE,
+        detail=(
+            f"Changes up to cursor {error.archived_until} have been archived; "
+            "resume from cursor 0"
+        ),
+    )
+
+
+def _parse_cursor(value: str) -> ChangeCursor:
+    try:
+        return ChangeCursor.parse(value)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid cursor '{value}'",
+        ) from e
+
+
+def _to_event(history) -> ChangeEvent:
+    return ChangeEvent(
+        cursor=str(ChangeCursor(history.txid, history.id)),
+        contribution_id=history.contribution_id,
+        action=history.action,
+        created_at=history.created_at,
+    )
+
+
+async def _poll_changes(
+    db: AsyncSession,
+    repository: RepositoryEnum,
+    cursor: ChangeCursor,
+    limit: int,
+    wait: int,
+    user: Optional[UserResponse],
+) -> ChangeFeed:
+    """Return the next page of changes, waiting up to ``wait`` seconds for one."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(wait, settings.CHANGE_FEED_MAX_WAIT)
+    while True:
+        try:
+            events, next_cursor = await ContributionService.get_changes(
+                db,
+                repository=repository.value,
+                cursor=cursor,
+                limit=limit,
+                user=user,
+            )
+        except HistoryArchivedError as e:
+            raise _archived(e)
+        if events or loop.time() >= deadline:
+            return ChangeFeed(
+                events=[_to_event(event) for event in events],
+                next_cursor=str(next_cursor),
+            )
+        cursor = next_cursor
+        # End the read transaction so the connection is not held while waiting.
+        await db.commit()
+        await asyncio.sleep(settings.CHANGE_FEED_POLL_INTERVAL)
+
+
+async def _stream_changes(
+    request: Request,
+    repository: RepositoryEnum,
+    cursor: ChangeCursor,
+    user: Optional[UserResponse],
+) -> AsyncIterator[str]:
+    """Yield server-sent events until the client disconnects."""
+    while not await request.is_disconnected():
+        # Public streams follow a replica, chosen again for every poll.
+        session = AsyncSessionLocal() if user is not None else read_session(request)
+        async with session as db:
+            try:
+                events, cursor = await ContributionService.get_changes(
+                    db,
+                    repository=repository.value,
+                    cursor=cursor,
+                    limit=500,
+                    user=user,
+                )
+            except HistoryArchivedError as e:
+                # Only if the client fell behind by a whole archived month.
+                yield f"event: error\ndata: {_archived(e).detail}\n\n"
+                return
+        for event in events:
+            payload = _to_event(event)
+            yield f"id: {payload.cursor}\nevent: change\ndata: {payload.json()}\n\n"
+        if not events:
+            yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.CHANGE_FEED_POLL_INTERVAL)
+
+
+async def _check_stream_cursor(
+    session: AsyncContextManager[AsyncSession],
+    repository: RepositoryEnum,
+    cursor: ChangeCursor,
+) -> None:
+    """Refuse an archived cursor before the stream starts."""
+    async with session as db:
+        try:
+            await check_cursor(db, repository.value, cursor.id)
+        except HistoryArchivedError as e:
+            raise _archived(e)
+
+
+def _sse_response(generator: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        generator,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Public endpoints
+
+
+@router.get("", response_model=ChangeFeed)
+async def get_changes(
+    repository: RepositoryEnum,
+    cursor: str = Query("0", description="Return changes after this cursor"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes"),
+    wait: int = Query(
+        0, ge=0, description="Seconds to long-poll for changes if none are ready"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """
+    Get changes to public contributions after a cursor.
+
+    Archived months of history are not replayed: a cursor into them gets
+    410 Gone, and cursor 0 starts at the oldest change still kept.
+    """
+    return await _poll_changes(
+        db, repository, _parse_cursor(cursor), limit, wait, user=None
+    )
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    repository: RepositoryEnum,
+    cursor: str = Query("0", description="Stream changes after this cursor"),
+    last_event_id: Optional[str] = Header(None),
+) -> Any:
+    """
+    Stream changes to public contributions as server-sent events.
+
+    Reconnecting clients resume from the ``Last-Event-ID`` header.
+    """
+    start = _parse_cursor(last_event_id if last_event_id is not None else cursor)
+    await _check_stream_cursor(read_session(request), repository, start)
+    return _sse_response(_stream_changes(request, repository, start, user=None))
+
+
+# Private endpoints
+
+
+@private_router.get("", response_model=ChangeFeed)
+async def get_private_changes(
+    repository: RepositoryEnum,
+    cursor: str = Query("0", description="Return changes after this cursor"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes"),
+    wait: int = Query(
+        0, ge=0, description="Seconds to long-poll for changes if none are ready"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get changes to public contributions and the user's own contributions.
+    """
+    return await _poll_changes(
+        db, repository, _parse_cursor(cursor), limit, wait, current_user
+    )
+
+
+@private_router.get("/stream")
+async def stream_private_changes(
+    request: Request,
+    repository: RepositoryEnum,
+    cursor: str = Query("0", description="Stream changes after this cursor"),
+    last_event_id: Optional[str] = Header(None),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Stream changes visible to the user as server-sent events.
+    """
+    start = _parse_cursor(last_event_id if last_event_id is not None else cursor)
+    await _check_stream_cursor(AsyncSessionLocal(), repository, start)
+    return _sse_response(_stream_changes(request, repository, start, current_user))
@@ -1,84 +1,369 @@
 """
 Data endpoints for public and private data operations.
 """
-from typing import Any, Dict, List, Optional
+import asyncio
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import FileResponse, JSONResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_current_active_user
-from app.db.session import get_db
+from app.api.v1.deps import get_current_active_user, get_projection
+from app.core.config import settings
+from app.core.responses import (
+    dumps,
+    json_response,
+    json_stream_response,
+    render_envelope,
+    render_list,
+    stream_envelope,
+)
+from app.db.session import get_db, get_read_db
+from app.schemas.changes import HistoryEntry, HistoryPage
 from app.schemas.data import (
+    BulkStatusChange,
+    BulkStatusResult,
+    ContributionStatus,
     DataCreate,
+    DataEnvelope,
     DataInDB,
-    DataResponse,
+    DataSearchEnvelope,
     DataSearchResult,
-    DataType,
+    DataTableEnvelope,
+    DataTableList,
+    DataTablePage,
     DataUpdate,
     DataValidationResult,
     RepositoryEnum,
 )
 from app.schemas.token import UserResponse
+from app.services import columnar, offload, patch
+from app.services.contribution import (
+    ContributionService,
+    LineageNotFoundError,
+    RevisionMismatchError,
+)
+from app.services.projection import Projection
 
 # Create routers
 router = APIRouter()
 private_router = APIRouter(dependencies=[Depends(get_current_active_user)])
 
+
+
+def make_etag(data_id: int, revision: int) -> str:
+    """
+    Build the strong ETag for a contribution revision.
+    
+    Compressed responses send it weak (see weaken_etag).
+    """
+    return f'"{data_id}-{revision}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Check an If-None-Match / If-Match header against an ETag.
+    
+    Weak validators compare equal to their strong form, as If-None-Match
+    requires.
+    """
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+def parse_if_match(header: Optional[str], data_id: int) -> Optional[int]:
+    """
+    Get the revision an If-Match header asks for.
+    
+    Returns:
+        Expected revision, or None if any revision is acceptable
+        
+    Raises:
+        HTTPException: If the header names a different contribution
+    """
+    if header is None or header.strip() == "*":
+        return None
+    prefix = f'"{data_id}-'
+    # The weak form comes from compressed responses of the same revision.
+    for tag in (tag.strip().removeprefix("W/") for tag in header.split(",")):
+        if tag.startswith(prefix) and tag.endswith('"'):
+            try:
+                return int(tag[len(prefix):-1])
+            except ValueError:
+                break
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="If-Match does not match this data",
+    )
+
+
+async def _history_page(
+    db: AsyncSession,
+    repository: RepositoryEnum,
+    data_id: int,
+    user: Optional[UserResponse],
+    page: int,
+    per_page: int,
+    include_changes: bool,
+) -> HistoryPage:
+    found = await ContributionService.get_history(
+        db,
+        data_id,
+        user=user,
+        page=page,
+        per_page=per_page,
+        include_changes=include_changes,
+        repository=repository.value,
+    )
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Data not found",
+        )
+    
+    entries, total = found
+    return HistoryPage(
+        items=[
+            HistoryEntry.model_validate(entry, from_attributes=True)
+            for entry in entries
+        ],
+        total=total,
+        page=page,
+        per_page=per_page,
+    )
+
+
 # Public endpoints
 
 
 @router.get("", response_model=DataInDB)
 async def get_data(
     repository: RepositoryEnum,
+    request: Request,
     data_id: int = Query(..., description="ID of the data to retrieve"),
-    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    projection: Projection = Depends(get_projection("contributions")),
+    db: AsyncSession = Depends(get_read_db),
 ) -> Any:
     """
     Retrieve data by ID.
+    
+    Use fields, exclude or view to return only parts of the data, e.g.
+    ``fields=contribution,sites.lat,sites.lon``.
+    
+    Send the ETag from a previous response as If-None-Match to get an empty
+    304 response when the data has not changed.
     """
-    # TODO: Implement actual data retrieval
-    # This is a placeholder implementation
-    if data_id < 1:
+    if if_none_match is not None:
+        # Only the revision is read, never the data document.
+        revision = await ContributionService.get_contribution_revision(
+            db, data_id, repository=repository.value
+        )
+        if revision is not None:
+            etag = make_etag(data_id, revision)
+            if etag_matches(if_none_match, etag):
+                # Echo the form the client holds, weak if it was compressed
+                if f"W/{etag}" in if_none_match:
+                    etag = f"W/{etag}"
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Vary": "Accept-Encoding"},
+                )
+    
+    found = await ContributionService.get_contribution_json(
+        db, data_id, projection=projection, repository=repository.value
+    )
+    if found is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Data not found",
         )
     
-    return {
-        "id": data_id,
-        "repository": repository.value,
-        "data_type": "sample",  # Default type
-        "data": {"id": data_id, "name": f"Sample Data {data_id}"},
-        "created_at": "2023-01-01T00:00:00",
-    }
+    contribution, data_json = found
+    envelope = DataEnvelope.model_validate(contribution, from_attributes=True)
+    headers = {"ETag": make_etag(contribution.id, contribution.revision)}
+    if data_json is None and offload.is_offloaded(contribution):
+        return json_stream_response(
+            request,
+            stream_envelope(envelope, offload.stream_json(contribution)),
+            headers=headers,
+        )
+    return await json_response(
+        request, render_envelope(envelope, data_json), headers=headers
+    )
 
 
 @router.get("/search", response_model=DataSearchResult)
 async def search_data(
     repository: RepositoryEnum,
-    query: str = Query("*", description="Search query"),
+    request: Request,
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(10, ge=1, le=100, description="Items per page"),
-    db: AsyncSession = Depends(get_db),
+    only_latest: bool = Query(
+        False, description="Only the latest version of each contribution"
+    ),
+    projection: Projection = Depends(get_projection("contributions")),
+    db: AsyncSession = Depends(get_read_db),
 ) -> Any:
     """
     Search for data.
+    
+    Use fields, exclude or view to return only parts of each item's data.
     """
-    # TODO: Implement actual search
-    # This is a placeholder implementation
-    return {
-        "total": 1,
-        "items": [
-            {
-                "id": 1,
-                "repository": repository.value,
-                "data_type": "sample",
-                "data": {"id": 1, "name": "Sample Data 1"},
-                "created_at": "2023-01-01T00:00:00",
-            }
-        ],
-    }
+    rows, total = await ContributionService.search_contributions_json(
+        db,
+        repository=repository.value,
+        is_public=True,
+        page=page,
+        per_page=per_page,
+        projection=projection,
+        only_latest=only_latest,
+    )
+    items = (
+        render_envelope(
+            DataEnvelope.model_validate(contribution, from_attributes=True),
+            data_json,
+        )
+        for contribution, data_json in rows
+    )
+    return await json_response(
+        request,
+        render_list(DataSearchEnvelope(total=total), "items", items),
+    )
+
+
+@router.get("/{data_id}/history", response_model=HistoryPage)
+async def get_data_history(
+    data_id: int,
+    repository: RepositoryEnum,
+    page: int = Query(1, ge=1, description="Page number"),
+    per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    include_changes: bool = Query(
+        False, description="Include what changed in each entry"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """
+    Get the history of public data, newest first.
+    """
+    return await _history_page(
+        db, repository, data_id, None, page, per_page, include_changes
+    )
+
+
+async def _published_tables(
+    db: AsyncSession, repository: RepositoryEnum, data_id: int
+) -> List[str]:
+    if not columnar.enabled():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Columnar tables are not available",
+        )
+    found = await ContributionService.get_published_tables(
+        db, data_id, repository=repository.value
+    )
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Published data not found",
+        )
+    return found
+
+
+@router.get("/{data_id}/tables", response_model=DataTableList)
+async def list_data_tables(
+    data_id: int,
+    repository: RepositoryEnum,
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """
+    List the tables of published data that can be read by column.
+    """
+    _, tables = await _published_tables(db, repository, data_id)
+    return DataTableList(tables=tables)
+
+
+@router.get("/{data_id}/tables/{table}", response_model=DataTablePage)
+async def get_data_table(
+    data_id: int,
+    table: str,
+    repository: RepositoryEnum,
+    request: Request,
+    columns: Optional[str] = Query(
+        None, description="Comma-separated columns to return, all by default"
+    ),
+    offset: int = Query(0, ge=0, description="Index of the first row"),
+    limit: Optional[int] = Query(None, ge=1, description="Number of rows"),
+    format: str = Query(
+        "json", pattern="^(json|arrow)$", description="json or arrow"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """
+    Get a table of published data, or some of its columns and rows.
+    
+    With ``format=arrow`` the whole table is downloaded as an Arrow IPC
+    file, which ``pandas.read_feather`` reads directly; a selection of
+    columns or rows is sent as an Arrow IPC stream
+    (``pyarrow.ipc.open_stream``). JSON responses need ``limit``, as
+    tables can have millions of rows.
+    """
+    contribution, tables = await _published_tables(db, repository, data_id)
+    if table not in tables:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Table not found",
+        )
+    
+    path = columnar.table_path(contribution.table_hashes[table])
+    selected = columns.split(",") if columns else None
+    if format == "arrow" and not selected and offset == 0 and limit is None:
+        return FileResponse(
+            path,
+            media_type=columnar.ARROW_FILE_MEDIA_TYPE,
+            filename=f"{repository.value}-{data_id}-{table}.arrow",
+        )
+    if format == "json" and limit is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Set limit to read a table as JSON",
+        )
+    
+    arrow_table = await asyncio.to_thread(columnar.open_table, path)
+    try:
+        part = columnar.select(arrow_table, selected, offset, limit)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown columns: {e.args[0]}",
+        ) from e
+    
+    if format == "arrow":
+        return Response(
+            await asyncio.to_thread(columnar.to_ipc_stream, part),
+            media_type=columnar.ARROW_STREAM_MEDIA_TYPE,
+        )
+    page = DataTableEnvelope(
+        table=table,
+        total=arrow_table.num_rows,
+        offset=offset,
+        columns=part.column_names,
+    )
+    rows = await asyncio.to_thread(lambda: [dumps(row) for row in part.to_pylist()])
+    return await json_response(request, render_list(page, "rows", rows))
 
 
 # Private endpoints
@@ -88,23 +373,77 @@ async def search_data(
 async def create_data(
     data_in: DataCreate,
     repository: RepositoryEnum,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> Any:
     """
     Create new data.
+    
+    Set version_of to the ID of an existing contribution to create a new
+    version of it.
     """
-    # TODO: Implement actual data creation
-    # This is a placeholder implementation
-    return {
-        "id": 1,
-        "repository": repository.value,
-        "data_type": data_in.data_type.value,
-        "data": data_in.data,
-        "metadata": data_in.metadata or {},
-        "created_by": current_user.id,
-        "created_at": "2023-01-01T00:00:00",
-    }
+    try:
+        contribution = await ContributionService.create_contribution(
+            db, data_in, repository.value, current_user
+        )
+    except LineageNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        ) from e
+    response.headers["ETag"] = make_etag(contribution.id, contribution.revision)
+    return contribution
+
+
+@private_router.post("/status", response_model=BulkStatusResult)
+async def change_data_status(
+    change: BulkStatusChange,
+    repository: RepositoryEnum,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Change the status of many contributions at once, e.g. to publish them.
+    
+    Give an item's revision to only change it if it is still at that
+    revision. Results are reported per item. In atomic mode nothing is
+    changed, and 409 is returned with the results, if any item is not found
+    or at another revision; in best_effort mode the other items are changed.
+    """
+    if len(change.items) > settings.BULK_STATUS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.BULK_STATUS_MAX_ITEMS} items per request",
+        )
+    ids = [item.id for item in change.items]
+    if len(set(ids)) < len(ids):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Items must have distinct ids",
+        )
+    result = await ContributionService.change_contributions_status(
+        db,
+        change.items,
+        change.status,
+        current_user,
+        repository.value,
+        comment=change.comment,
+        mode=change.mode,
+    )
+    if not result.applied:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content=result.model_dump(),
+        )
+    if change.status == ContributionStatus.PUBLISHED and result.changed:
+        background_tasks.add_task(
+            columnar.publish_many,
+            repository.value,
+            [item.id for item in result.results if item.result == "changed"],
+        )
+    return result
 
 
 @private_router.put("/{data_id}", response_model=DataInDB)
@@ -112,24 +451,135 @@ async def update_data(
     data_id: int,
     data_in: DataUpdate,
     repository: RepositoryEnum,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> Any:
     """
     Update existing data.
+    
+    Send the ETag the update is based on as If-Match to reject the update
+    with 412 if someone else changed the data in the meantime.
     """
-    # TODO: Implement actual data update
-    # This is a placeholder implementation
-    return {
-        "id": data_id,
-        "repository": repository.value,
-        "data_type": "sample",  # Should get from existing data
-        "data": data_in.data,
-        "metadata": data_in.metadata or {},
-        "created_by": 1,  # Should get from existing data
-        "created_at": "2023-01-01T00:00:00",
-        "updated_at": "2023-01-02T00:00:00",
-    }
+    try:
+        contribution = await ContributionService.update_contribution(
+            db,
+            data_id,
+            data_in,
+            current_user,
+            expected_revision=parse_if_match(if_match, data_id),
+            repository=repository.value,
+        )
+    except RevisionMismatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Data has been modified",
+        ) from e
+    
+    if contribution is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Data not found",
+        )
+    
+    response.headers["ETag"] = make_etag(contribution.id, contribution.revision)
+    return contribution
+
+
+@private_router.patch("/{data_id}", response_model=DataEnvelope)
+async def patch_data(
+    data_id: int,
+    repository: RepositoryEnum,
+    request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Partially update data with a JSON Patch or a JSON Merge Patch.
+    
+    Send ``Content-Type: application/json-patch+json`` with an RFC 6902
+    operation list, or ``application/merge-patch+json`` with an RFC 7386
+    merge document. The patch is applied in the database; the response has
+    the updated fields without the data. A failed ``test`` operation or a
+    missing path is answered with 409.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in (
+        "application/json-patch+json",
+        "application/merge-patch+json",
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use application/json-patch+json or application/merge-patch+json",
+        )
+    try:
+        body = orjson.loads(await request.body())
+        if content_type == "application/json-patch+json":
+            operations = patch.parse_json_patch(body, settings.PATCH_MAX_OPERATIONS)
+            changes = {"patch": body}
+        else:
+            operations = patch.merge_patch_operations(
+                body, settings.PATCH_MAX_OPERATIONS
+            )
+            changes = {"merge_patch": body}
+    except (orjson.JSONDecodeError, patch.PatchError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        ) from e
+    
+    try:
+        contribution = await ContributionService.patch_contribution(
+            db,
+            data_id,
+            operations,
+            changes,
+            current_user,
+            expected_revision=parse_if_match(if_match, data_id),
+            repository=repository.value,
+        )
+    except RevisionMismatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Data has been modified",
+        ) from e
+    except patch.PatchConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        ) from e
+    
+    if contribution is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Data not found",
+        )
+    
+    response.headers["ETag"] = make_etag(contribution.id, contribution.revision)
+    return DataEnvelope.model_validate(contribution, from_attributes=True)
+
+
+@private_router.get("/{data_id}/history", response_model=HistoryPage)
+async def get_private_data_history(
+    data_id: int,
+    repository: RepositoryEnum,
+    page: int = Query(1, ge=1, description="Page number"),
+    per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    include_changes: bool = Query(
+        False, description="Include what changed in each entry"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get the history of data visible to the user, newest first.
+    """
+    return await _history_page(
+        db, repository, data_id, current_user, page, per_page, include_changes
+    )
 
 
 @private_router.delete("/{data_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -156,9 +606,6 @@ async def validate_data(
     """
     Validate data.
     """
-    # TODO: Implement actual data validation
-    # This is a placeholder implementation
-    return {
-        "valid": True,
-        "data": data_in.data,
-    }
+    return await ContributionService.validate_contribution_data(
+        db, data_in, repository.value
+    )
@@ -5,8 +5,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
-from app.db.session import get_db
-from app.schemas.health_check import HealthCheckResponse
+from app.core.admission import admission_controller
+from app.core.config import settings
+from app.db.session import get_db, replica_router
+from app.schemas.health_check import (
+    AdmissionStatus,
+    HealthCheckResponse,
+    ReplicasStatus,
+    SearchIndexStatus,
+)
+from app.services.search_index import get_index_lag
 
 router = APIRouter()
 
@@ -39,3 +47,65 @@ async def health_check_db(db: AsyncSession = Depends(get_db)):
             status_code=503,
             detail={"status": "error", "database": "disconnected", "error": str(e)}
         ) from e
+
+
+@router.get("/health-check/search-index", response_model=SearchIndexStatus)
+async def health_check_search_index(db: AsyncSession = Depends(get_db)):
+    """
+    Search index lag endpoint.
+    
+    Returns:
+        Outbox backlog and the age of the oldest change not yet indexed.
+    """
+    lag = await get_index_lag(db)
+    if not settings.SEARCH_INDEXER_ENABLED:
+        status = "disabled"
+    elif lag["failed"]:
+        status = "degraded"
+    else:
+        status = "ok"
+    return {"status": status, **lag}
+
+
+@router.get("/health-check/admission", response_model=AdmissionStatus)
+async def health_check_admission():
+    """
+    Admission control endpoint.
+    
+    Returns:
+        Queue depth and rejections of each endpoint class in this worker.
+    """
+    classes = admission_controller.stats()
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        status = "disabled"
+    elif any(value["queued"] or value["active"] >= value["concurrency"]
+             for value in classes.values()):
+        status = "saturated"
+    else:
+        status = "ok"
+    return {"status": status, "classes": classes}
+
+
+@router.get("/health-check/replicas", response_model=ReplicasStatus)
+async def health_check_replicas():
+    """
+    Read replica endpoint.
+    
+    Returns:
+        Health and replay lag of each read replica, as last checked by this
+        worker.
+    """
+    replicas = replica_router.status()
+    if not replicas:
+        status = "disabled"
+    elif all(replica["usable"] for replica in replicas):
+        status = "ok"
+    elif any(replica["usable"] for replica in replicas):
+        status = "degraded"
+    else:
+        status = "primary-only"
+    return {
+        "status": status,
+        "max_lag_seconds": settings.REPLICA_MAX_LAG_SECONDS,
+        "replicas": replicas,
+    }
@@ -1,82 +1,141 @@
 """
 Search endpoints for public and private data.
 """
-from typing import Any, Dict, List, Optional
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_current_active_user
-from app.db.session import get_db
-from app.schemas.data import DataSearchResult, RepositoryEnum
+from app.api.v1.deps import get_current_active_user, get_level_projection
+from app.core.responses import json_response, render_envelope, render_list
+from app.db.models.search import SearchLevel
+from app.db.session import get_db, get_read_db
+from app.schemas.data import RepositoryEnum
+from app.schemas.search import (
+    SearchRowEnvelope,
+    SearchRowPageEnvelope,
+    SearchRowResult,
+)
 from app.schemas.token import UserResponse
+from app.services import search_tables
+from app.services.projection import Projection
 
 # Create routers
 router = APIRouter()
 private_router = APIRouter(dependencies=[Depends(get_current_active_user)])
 
+
+async def _search_level(
+    request: Request,
+    db: AsyncSession,
+    table: SearchLevel,
+    repository: RepositoryEnum,
+    page: int,
+    per_page: int,
+    sort: Optional[str],
+    filters: Optional[str],
+    projection: Projection,
+    user: Optional[UserResponse],
+    only_latest: bool = False,
+    with_total: bool = False,
+) -> Any:
+    """Search one level table and render the rows without decoding them."""
+    try:
+        conditions = search_tables.parse_filters(filters)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        ) from e
+    
+    rows, total, has_more = await search_tables.search_rows(
+        db,
+        level=table,
+        repository=repository.value,
+        filters=conditions,
+        user=user,
+        sort=sort,
+        page=page,
+        per_page=per_page,
+        projection=projection,
+        only_latest=only_latest,
+        with_total=with_total,
+    )
+    items = (
+        render_envelope(
+            SearchRowEnvelope.model_validate(row, from_attributes=True), row_json
+        )
+        for row, row_json in rows
+    )
+    return await json_response(
+        request,
+        render_list(
+            SearchRowPageEnvelope(total=total, has_more=has_more), "items", items
+        ),
+    )
+
+
 # Public endpoints
 
 
-@router.get("/{table}", response_model=DataSearchResult)
+@router.get("/{table}", response_model=SearchRowResult)
 async def search_table(
-    table: str,
+    table: SearchLevel,
     repository: RepositoryEnum,
-    q: str = Query("*", description="Search query"),
+    request: Request,
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(10, ge=1, le=100, description="Items per page"),
     sort: Optional[str] = Query(None, description="Sort field and direction, e.g., 'field:asc' or 'field:desc'"),
     filters: Optional[str] = Query(None, description="Filter conditions in format 'field:value,field2:value2'"),
-    db: AsyncSession = Depends(get_db),
+    only_latest: bool = Query(
+        False, description="Only rows of the latest version of each contribution"
+    ),
+    with_total: bool = Query(
+        False, description="Also count all matching rows, which is slower"
+    ),
+    projection: Projection = Depends(get_level_projection),
+    db: AsyncSession = Depends(get_read_db),
 ) -> Any:
     """
-    Search data in a specific table.
+    Search the rows of public contributions at one level.
+    
+    Each level (contributions, locations, sites, samples, specimens,
+    experiments, measurements) has its own table, so filters are answered by
+    an index scan of that table alone.
     """
-    # TODO: Implement actual table search
-    # This is a placeholder implementation
-    return {
-        "total": 1,
-        "items": [
-            {
-                "id": 1,
-                "repository": repository.value,
-                "table": table,
-                "data": {"id": 1, "name": f"Sample {table.capitalize()} 1"},
-            }
-        ],
-    }
+    return await _search_level(
+        request, db, table, repository, page, per_page, sort, filters,
+        projection, user=None, only_latest=only_latest, with_total=with_total,
+    )
 
 
 # Private endpoints
 
 
-@private_router.get("/private/{table}", response_model=DataSearchResult)
+@private_router.get("/private/{table}", response_model=SearchRowResult)
 async def search_private_table(
-    table: str,
+    table: SearchLevel,
     repository: RepositoryEnum,
-    q: str = Query("*", description="Search query"),
+    request: Request,
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(10, ge=1, le=100, description="Items per page"),
     sort: Optional[str] = Query(None, description="Sort field and direction"),
     filters: Optional[str] = Query(None, description="Filter conditions"),
+    only_latest: bool = Query(
+        False, description="Only rows of the latest version of each contribution"
+    ),
+    with_total: bool = Query(
+        False, description="Also count all matching rows, which is slower"
+    ),
+    projection: Projection = Depends(get_level_projection),
     db: AsyncSession = Depends(get_db),
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> Any:
     """
-    Search private data in a specific table.
+    Search the rows of public contributions and the user's own contributions.
     """
-    # TODO: Implement actual private table search
-    # This is a placeholder implementation
-    return {
-        "total": 1,
-        "items": [
-            {
-                "id": 1,
-                "repository": repository.value,
-                "table": table,
-                "data": {"id": 1, "name": f"Private {table.capitalize()} 1"},
-                "created_by": current_user.id,
-            }
-        ],
-    }
+    return await _search_level(
+        request, db, table, repository, page, per_page, sort, filters,
+        projection, user=current_user, only_latest=only_latest,
+        with_total=with_total,
+    )
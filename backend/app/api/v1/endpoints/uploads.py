@@ -0,0 +1,245 @@
+"""
+Resumable upload endpoints for large contribution files.
+"""
+from typing import Any, Dict, Optional
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.deps import get_current_active_user
+from app.core.config import settings
+from app.db.models.upload import UploadSession
+from app.db.session import get_db
+from app.schemas.data import RepositoryEnum
+from app.schemas.token import UserResponse
+from app.schemas.upload import UploadStatusResponse
+from app.services import upload as upload_service
+
+# Create routers
+private_router = APIRouter(dependencies=[Depends(get_current_active_user)])
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,checksum,termination,expiration"
+
+# Status tus uses for a chunk that does not match its Upload-Checksum.
+CHECKSUM_MISMATCH = 460
+
+
+def _tus_headers(upload: Optional[UploadSession] = None) -> Dict[str, str]:
+    headers = {"Tus-Resumable": TUS_VERSION, "Cache-Control": "no-store"}
+    if upload is not None:
+        headers["Upload-Offset"] = str(
+            upload_service.contiguous_offset(upload.received or [])
+        )
+        headers["Upload-Length"] = str(upload.upload_length)
+        headers["Upload-Expires"] = upload.expires_at.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT"
+        )
+        # Not part of tus: lets parallel clients see which chunks are missing.
+        headers["Upload-Ranges"] = ",".join(
+            f"{start}-{end}" for start, end in upload.received or []
+        )
+    return headers
+
+
+async def _get_upload(
+    db: AsyncSession, upload_id: str, user: UserResponse
+) -> UploadSession:
+    upload = await upload_service.get_session(db, upload_id, user)
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found",
+        )
+    return upload
+
+
+@private_router.options("")
+async def upload_options() -> Response:
+    """
+    Describe the supported tus protocol version, extensions and limits.
+    """
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            "Tus-Resumable": TUS_VERSION,
+            "Tus-Version": TUS_VERSION,
+            "Tus-Extension": TUS_EXTENSIONS,
+            "Tus-Max-Size": str(settings.UPLOAD_MAX_SIZE),
+            "Tus-Checksum-Algorithm": ",".join(
+                sorted(upload_service.CHECKSUM_ALGORITHMS)
+            ),
+        },
+    )
+
+
+@private_router.post("", status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    repository: RepositoryEnum,
+    request: Request,
+    upload_length: int = Header(..., description="Total size of the file in bytes"),
+    upload_metadata: Optional[str] = Header(
+        None, description="tus metadata: data_type, and optionally format and filename"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Start a resumable upload.
+
+    The response Location is the upload URL to send chunks to.
+    """
+    try:
+        upload = await upload_service.create_session(
+            db,
+            repository.value,
+            upload_length,
+            upload_service.parse_metadata(upload_metadata),
+            current_user,
+        )
+    except upload_service.UploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from e
+
+    headers = _tus_headers(upload)
+    headers["Location"] = str(request.url_for(
+        "get_upload", repository=repository.value, upload_id=upload.id
+    ))
+    return Response(status_code=status.HTTP_201_CREATED, headers=headers)
+
+
+@private_router.head("/{upload_id}")
+async def head_upload(
+    upload_id: str,
+    repository: RepositoryEnum,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get the offset to resume an upload from.
+    """
+    upload = await _get_upload(db, upload_id, current_user)
+    return Response(status_code=status.HTTP_200_OK, headers=_tus_headers(upload))
+
+
+@private_router.patch("/{upload_id}")
+async def patch_upload(
+    upload_id: str,
+    repository: RepositoryEnum,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    upload_offset: int = Header(..., description="Byte offset of this chunk"),
+    upload_checksum: Optional[str] = Header(
+        None, description="Checksum of this chunk, e.g. 'sha256 <base64>'"
+    ),
+    content_type: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Send a chunk of an upload.
+
+    Chunks may be sent in any order and in parallel, but not over bytes
+    already received or after the upload completed (409). The response
+    Upload-Offset is the number of bytes received without gaps; once it
+    reaches Upload-Length the file is parsed and stored as a contribution in
+    the background, and GET on the upload URL reports the outcome.
+    """
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Chunks must be sent as application/offset+octet-stream",
+        )
+
+    upload = await _get_upload(db, upload_id, current_user)
+    # Do not hold a transaction open while the chunk streams in.
+    await db.commit()
+
+    try:
+        checksum = upload_service.parse_checksum(upload_checksum)
+        chunk = await upload_service.read_chunk(
+            upload, upload_offset, request.stream(), checksum
+        )
+        upload, completed = await upload_service.write_chunk(
+            db, upload_id, current_user, upload_offset, chunk
+        )
+    except upload_service.ChecksumMismatchError as e:
+        raise HTTPException(status_code=CHECKSUM_MISMATCH, detail=str(e)) from e
+    except (upload_service.UploadOffsetError, upload_service.UploadStateError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        ) from e
+    except upload_service.UploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from e
+
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found",
+        )
+    if completed:
+        background_tasks.add_task(
+            upload_service.process_upload, upload.id, current_user
+        )
+
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT, headers=_tus_headers(upload)
+    )
+
+
+@private_router.get("/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload(
+    upload_id: str,
+    repository: RepositoryEnum,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get the state of an upload, and the contribution it produced.
+    """
+    upload = await _get_upload(db, upload_id, current_user)
+    response.headers.update(_tus_headers(upload))
+    return UploadStatusResponse(
+        id=upload.id,
+        status=upload.status.value,
+        upload_length=upload.upload_length,
+        upload_offset=upload_service.contiguous_offset(upload.received or []),
+        received=upload.received or [],
+        contribution_id=upload.contribution_id,
+        error=upload.error,
+        expires_at=upload.expires_at,
+    )
+
+
+@private_router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(
+    upload_id: str,
+    repository: RepositoryEnum,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user),
+) -> Response:
+    """
+    Cancel an upload and delete what was received.
+    """
+    upload = await _get_upload(db, upload_id, current_user)
+    await upload_service.delete_session(db, upload)
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={"Tus-Resumable": TUS_VERSION},
+    )
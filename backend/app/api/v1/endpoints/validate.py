@@ -1,13 +1,12 @@
 """
 Validation endpoints for public and private data.
 """
-from typing import Any, Dict, List, Optional
+from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_current_active_user
+from app.api.v1.deps import get_current_active_user
 from app.db.session import get_db
 from app.schemas.data import (
     DataCreate,
@@ -15,6 +14,7 @@ from app.schemas.data import (
     RepositoryEnum,
 )
 from app.schemas.token import UserResponse
+from app.services.contribution import ContributionService
 
 # Create routers
 router = APIRouter()
@@ -32,12 +32,9 @@ async def validate_data(
     """
     Validate data against the schema.
     """
-    # TODO: Implement actual data validation
-    # This is a placeholder implementation
-    return {
-        "valid": True,
-        "data": data_in.data,
-    }
+    return await ContributionService.validate_contribution_data(
+        db, data_in, repository.value
+    )
 
 
 # Private endpoints
@@ -53,9 +50,6 @@ async def validate_private_data(
     """
     Validate private data against the schema.
     """
-    # TODO: Implement actual private data validation
-    # This is a placeholder implementation
-    return {
-        "valid": True,
-        "data": data_in.data,
-    }
+    return await ContributionService.validate_contribution_data(
+        db, data_in, repository.value
+    )
@@ -0,0 +1,366 @@
+"""
+Admission control and load shedding for expensive endpoints.
+
+Validation, downloads, searches and upload chunks are each grouped into an
+endpoint class with its own limits:
+
+- a token bucket per user and class, so one client cannot use up a class,
+- a token bucket per class, bounding the total rate a worker accepts,
+- a cap on the requests of a class running at once, with a bounded queue of
+  requests waiting for a slot, and a cap on each user's share of both.
+
+Requests that would exceed a rate are rejected with 429, and requests that
+find the queue full or wait too long in it are shed with 503, both with a
+Retry-After header, so that a bulk client backs off before it starves
+interactive users. Other requests are not limited.
+
+Users are identified by the subject of a valid bearer token and anonymous
+clients by their address (see app.core.clients). All state is in memory, so limits apply per
+worker process.
+"""
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.clients import client_key
+from app.core.config import settings
+
+
+class Limits(NamedTuple):
+    """Admission limits of an endpoint class."""
+    rate: float  # Requests per second per user
+    burst: float  # Bucket size per user
+    route_rate: float  # Requests per second over all users
+    route_burst: float  # Bucket size over all users
+    concurrency: int  # Requests running at once
+    user_concurrency: int  # Requests running or queued at once per user
+    queue_size: int  # Requests waiting for a slot
+    queue_timeout: float  # Seconds a request may wait for a slot
+
+
+DEFAULT_LIMITS: Dict[str, Limits] = {
+    "validate": Limits(
+        rate=1, burst=5, route_rate=10, route_burst=20,
+        concurrency=4, user_concurrency=2, queue_size=16, queue_timeout=10,
+    ),
+    "download": Limits(
+        rate=5, burst=20, route_rate=100, route_burst=200,
+        concurrency=16, user_concurrency=4, queue_size=64, queue_timeout=15,
+    ),
+    "search": Limits(
+        rate=5, burst=20, route_rate=100, route_burst=200,
+        concurrency=16, user_concurrency=4, queue_size=64, queue_timeout=10,
+    ),
+    "upload": Limits(
+        rate=20, burst=50, route_rate=200, route_burst=400,
+        concurrency=8, user_concurrency=4, queue_size=32, queue_timeout=30,
+    ),
+}
+
+# First match wins: (endpoint class, methods or None for any, path pattern).
+ROUTE_CLASSES: List[Tuple[str, Optional[Set[str]], Pattern]] = [
+    ("validate", None, re.compile(r"^/v1/[^/]+/(private/)?(data/)?validate(/|$)")),
+    ("search", None, re.compile(r"^/v1/[^/]+/(private/)?(data/)?search(/|$)")),
+    ("upload", None, re.compile(r"^/v1/[^/]+/private/uploads(/|$)")),
+    ("download", {"GET"}, re.compile(r"^/v1/[^/]+/(private/)?data(/|$)")),
+]
+
+# Idle buckets are dropped once there are this many, to bound memory.
+MAX_BUCKETS = 10000
+
+REJECTION_REASONS = (
+    "user_rate",
+    "route_rate",
+    "user_concurrency",
+    "queue_full",
+    "queue_timeout",
+)
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at ``rate`` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def take(self) -> None:
+        """Take a token; call wait_time first."""
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """Whether the bucket has refilled completely."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class ConcurrencyGate:
+    """
+    A semaphore with a bounded FIFO queue of waiters.
+
+    A released slot is handed straight to the oldest waiter, so requests
+    arriving later cannot overtake the queue.
+    """
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot."""
+        return len(self.waiters)
+
+    async def acquire(self, timeout: float) -> None:
+        """
+        Take a slot, waiting up to ``timeout`` seconds in the queue.
+
+        Raises:
+            OverflowError: If the queue is full
+            asyncio.TimeoutError: If no slot was free in time
+        """
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.queue_size:
+            raise OverflowError("queue full")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up.
+                self.release()
+            else:
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it to the oldest waiter if there is one."""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class EndpointClass:
+    """Limits and state of one endpoint class."""
+
+    def __init__(self, name: str, limits: Limits):
+        self.name = name
+        self.limits = limits
+        self.gate = ConcurrencyGate(limits.concurrency, limits.queue_size)
+        self.route_bucket = TokenBucket(
+            limits.route_rate, limits.route_burst, time.monotonic()
+        )
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        self.user_inflight: Dict[str, int] = {}
+        self.admitted = 0
+        self.rejected = {reason: 0 for reason in REJECTION_REASONS}
+        # Moving average of request duration, for Retry-After estimates.
+        self.average_duration = 1.0
+
+    def _user_bucket(self, user: str, now: float) -> TokenBucket:
+        bucket = self.user_buckets.get(user)
+        if bucket is None:
+            if len(self.user_buckets) >= MAX_BUCKETS:
+                self.user_buckets = {
+                    key: value
+                    for key, value in self.user_buckets.items()
+                    if not value.is_full(now)
+                }
+            bucket = TokenBucket(self.limits.rate, self.limits.burst, now)
+            self.user_buckets[user] = bucket
+        return bucket
+
+    def _reject(self, status_code: int, reason: str, retry_after: float) -> Rejected:
+        self.rejected[reason] += 1
+        return Rejected(status_code, reason, retry_after)
+
+    def _queue_retry_after(self) -> float:
+        # Time for the requests ahead to drain through the available slots.
+        return self.average_duration * (self.gate.queued + 1) / max(self.gate.limit, 1)
+
+    async def admit(self, user: str) -> None:
+        """
+        Admit a request of a user, waiting in the queue if needed.
+
+        Raises:
+            Rejected: If the request is rate limited or shed
+        """
+        now = time.monotonic()
+        user_bucket = self._user_bucket(user, now)
+        wait = user_bucket.wait_time(now)
+        if wait:
+            raise self._reject(429, "user_rate", wait)
+        wait = self.route_bucket.wait_time(now)
+        if wait:
+            raise self._reject(503, "route_rate", wait)
+        inflight = self.user_inflight.get(user, 0)
+        if inflight >= self.limits.user_concurrency:
+            raise self._reject(429, "user_concurrency", self._queue_retry_after())
+
+        user_bucket.take()
+        self.route_bucket.take()
+        self.user_inflight[user] = inflight + 1
+        try:
+            await self.gate.acquire(self.limits.queue_timeout)
+        except OverflowError:
+            self._done(user)
+            raise self._reject(503, "queue_full", self._queue_retry_after()) from None
+        except asyncio.TimeoutError:
+            self._done(user)
+            raise self._reject(503, "queue_timeout", self._queue_retry_after()) from None
+        except BaseException:
+            self._done(user)
+            raise
+        self.admitted += 1
+
+    def release(self, user: str, duration: float) -> None:
+        """Release the slot of an admitted request."""
+        self.gate.release()
+        self._done(user)
+        self.average_duration += 0.1 * (duration - self.average_duration)
+
+    def _done(self, user: str) -> None:
+        inflight = self.user_inflight.get(user, 0) - 1
+        if inflight > 0:
+            self.user_inflight[user] = inflight
+        else:
+            self.user_inflight.pop(user, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth, limits and counters."""
+        return {
+            "active": self.gate.active,
+            "queued": self.gate.queued,
+            "concurrency": self.limits.concurrency,
+            "queue_size": self.limits.queue_size,
+            "users": len(self.user_inflight),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "average_duration": round(self.average_duration, 4),
+        }
+
+
+def configured_limits(overrides: Dict[str, Dict[str, float]]) -> Dict[str, Limits]:
+    """
+    Apply ``ADMISSION_LIMITS`` overrides to the default limits.
+
+    Args:
+        overrides: Limits to change by endpoint class, e.g.
+            ``{"search": {"concurrency": 32}}``
+
+    Returns:
+        Limits by endpoint class
+
+    Raises:
+        ValueError: If an override names an unknown class or limit
+    """
+    limits = dict(DEFAULT_LIMITS)
+    for name, values in overrides.items():
+        if name not in limits:
+            raise ValueError(f"Unknown admission endpoint class '{name}'")
+        unknown = set(values) - set(Limits._fields)
+        if unknown:
+            raise ValueError(f"Unknown admission limits {sorted(unknown)} for '{name}'")
+        current = limits[name]
+        limits[name] = current._replace(**{
+            key: type(getattr(current, key))(value) for key, value in values.items()
+        })
+    return limits
+
+
+class AdmissionController:
+    """Endpoint classes of the application and their state."""
+
+    def __init__(self, limits: Dict[str, Limits]):
+        self.classes = {name: EndpointClass(name, value) for name, value in limits.items()}
+
+    def classify(self, method: str, path: str) -> Optional[EndpointClass]:
+        """Get the endpoint class of a request, None if it is not limited."""
+        for name, methods, pattern in ROUTE_CLASSES:
+            if (methods is None or method in methods) and pattern.match(path):
+                return self.classes.get(name)
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Stats of every endpoint class."""
+        return {name: value.stats() for name, value in self.classes.items()}
+
+
+admission_controller = AdmissionController(configured_limits(settings.ADMISSION_LIMITS))
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying the admission controller to HTTP requests."""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint_class = self.controller.classify(scope["method"], scope["path"])
+        if endpoint_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        user = client_key(scope)
+        try:
+            await endpoint_class.admit(user)
+        except Rejected as e:
+            response = JSONResponse(
+                {"detail": f"Too many {endpoint_class.name} requests, retry later"},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(min(e.retry_after, 3600))))},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            endpoint_class.release(user, time.monotonic() - started)
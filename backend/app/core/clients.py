@@ -0,0 +1,32 @@
+"""
+Identification of the clients of requests, for per-client state such as
+admission limits and read replica pins.
+"""
+from jose import JWTError, jwt
+from starlette.types import Scope
+
+from app.core.config import settings
+
+
+def client_key(scope: Scope) -> str:
+    """
+    Identify the client of a request.
+
+    Returns:
+        ``user:<id>`` for a valid bearer token, ``ip:<address>`` otherwise
+    """
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    payload = jwt.decode(
+                        token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+                    )
+                except JWTError:
+                    break
+                if payload.get("sub") is not None:
+                    return f"user:{payload['sub']}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
@@ -0,0 +1,198 @@
+"""
+MagIC data models, method codes and controlled vocabularies.
+
+These are compiled ahead of time by ``scripts/build_data_models.py`` into a
+single snapshot file, ``DATA_MODELS_SNAPSHOT``:
+
+- 8 bytes ``FIESTADM``, then the format version and the index length as
+  little-endian unsigned 32-bit integers,
+- the index, a JSON object with the offset (from the end of the index) and
+  length of every section,
+- the sections, one JSON document each: ``data_models/<version>``,
+  ``method_codes`` and ``vocabularies``.
+
+The snapshot is memory-mapped on first use and a section is only decoded
+when it is first asked for, so workers start without parsing anything and
+only pay for the data model versions they actually use. The mapped pages
+are shared by all workers through the page cache.
+"""
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.core.config import settings
+
+MAGIC = b"FIESTADM"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+
+
+class DataModelSnapshot:
+    """Read-only view of a data model snapshot file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(
+                f"{path} is not a version {FORMAT_VERSION} data model snapshot"
+            )
+        start = _HEADER.size
+        self.index: Dict[str, Any] = orjson.loads(
+            self._mmap[start:start + index_length]
+        )
+        self._data_start = start + index_length
+        self._sections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def versions(self) -> List[str]:
+        """Data model versions in the snapshot, oldest first."""
+        return self.index["versions"]
+
+    def section(self, name: str) -> Any:
+        """
+        Get a decoded section, decoding it on first access.
+
+        Args:
+            name: Section name, e.g. ``data_models/3.0``
+
+        Returns:
+            Section content
+
+        Raises:
+            KeyError: If the snapshot has no such section
+        """
+        try:
+            return self._sections[name]
+        except KeyError:
+            pass
+        offset, length = self.index["sections"][name]
+        offset += self._data_start
+        with self._lock:
+            if name not in self._sections:
+                with memoryview(self._mmap) as view:
+                    self._sections[name] = orjson.loads(view[offset:offset + length])
+        return self._sections[name]
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._sections.clear()
+        self._mmap.close()
+
+
+def build_snapshot(document: Dict[str, Any], path: Path, source: str = "") -> int:
+    """
+    Write a snapshot of the data models, method codes and vocabularies.
+
+    The file is replaced atomically, so running workers keep their mapping of
+    the old one.
+
+    Args:
+        document: Output of ``scripts/dump_data_models.js``
+        path: Snapshot file to write
+        source: Description of where the document came from
+
+    Returns:
+        Size of the snapshot in bytes
+    """
+    sections = {
+        f"data_models/{version}": model
+        for version, model in document["data_models"].items()
+    }
+    sections["method_codes"] = document["method_codes"]
+    sections["vocabularies"] = document["vocabularies"]
+
+    payloads = {name: orjson.dumps(value) for name, value in sections.items()}
+    offsets = {}
+    offset = 0
+    for name, payload in payloads.items():
+        offsets[name] = [offset, len(payload)]
+        offset += len(payload)
+    index = {
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "versions": sorted(
+            document["data_models"], key=lambda v: tuple(map(int, v.split(".")))
+        ),
+        "sections": offsets,
+    }
+    index_bytes = orjson.dumps(index)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for payload in payloads.values():
+            f.write(payload)
+    os.replace(tmp_path, path)
+    return _HEADER.size + len(index_bytes) + offset
+
+
+_snapshot: Optional[DataModelSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> DataModelSnapshot:
+    """
+    Get the snapshot of this process, mapping it on first use.
+
+    Raises:
+        FileNotFoundError: If the snapshot has not been built
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                path = Path(settings.DATA_MODELS_SNAPSHOT)
+                if not path.is_file():
+                    raise FileNotFoundError(
+                        f"Data model snapshot {path} not found; build it with "
+                        "'python -m scripts.build_data_models'"
+                    )
+                _snapshot = DataModelSnapshot(path)
+    return _snapshot
+
+
+def get_versions() -> List[str]:
+    """Get the known data model versions, oldest first."""
+    return get_snapshot().versions
+
+
+def get_data_model(version: str) -> Dict[str, Any]:
+    """
+    Get a MagIC data model.
+
+    Args:
+        version: Data model version, e.g. ``3.0``
+
+    Returns:
+        Data model with its tables and columns
+
+    Raises:
+        ValueError: If the version is unknown
+    """
+    try:
+        return get_snapshot().section(f"data_models/{version}")
+    except KeyError:
+        raise ValueError(f"Unknown data model version: {version}") from None
+
+
+def get_method_codes() -> Dict[str, Any]:
+    """Get the MagIC method codes by type."""
+    return get_snapshot().section("method_codes")
+
+
+def get_vocabularies() -> Dict[str, Any]:
+    """Get the controlled vocabularies by name."""
+    return get_snapshot().section("vocabularies")
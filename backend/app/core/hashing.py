@@ -0,0 +1,81 @@
+"""
+Canonical content hashes for contribution documents.
+
+A document is hashed table by table: each top-level value is serialized
+canonically (sorted keys, no whitespace) and hashed with SHA-256, and the
+document hash is the hash of the sorted ``table:hash`` lines. Two documents
+with equal content therefore have equal hashes whatever their key order,
+a change to one table only needs that table re-hashed, and the hashes can
+be used as dedup and cache keys.
+"""
+import hashlib
+from typing import Any, Dict, Optional, Set, Tuple
+
+import orjson
+
+HASH_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+def canonical_json(value: Any) -> bytes:
+    """Serialize a value canonically: sorted keys, no whitespace."""
+    return orjson.dumps(value, option=HASH_OPTIONS)
+
+
+def value_hash(value: Any) -> str:
+    """SHA-256 hex digest of the canonical serialization of a value."""
+    return hashlib.sha256(canonical_json(value)).hexdigest()
+
+
+def combine_hashes(table_hashes: Dict[str, str]) -> str:
+    """
+    Combine per-table hashes into the document hash.
+
+    Args:
+        table_hashes: Hash of each top-level value, by key
+
+    Returns:
+        SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    for table in sorted(table_hashes):
+        digest.update(canonical_json(table))
+        digest.update(b":")
+        digest.update(table_hashes[table].encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def content_hashes(data: Any) -> Tuple[str, Optional[Dict[str, str]]]:
+    """
+    Hash a contribution document.
+
+    Args:
+        data: Contribution document
+
+    Returns:
+        Tuple of (document hash, per-table hashes); per-table hashes are None
+        if the document is not an object
+    """
+    if not isinstance(data, dict):
+        return value_hash(data), None
+    tables = {str(table): value_hash(value) for table, value in data.items()}
+    return combine_hashes(tables), tables
+
+
+def changed_tables(
+    old_tables: Optional[Dict[str, str]], new_tables: Optional[Dict[str, str]]
+) -> Optional[Set[str]]:
+    """
+    Compare per-table hashes.
+
+    Returns:
+        Names of tables added, removed or changed, or None if either side has
+        no per-table hashes
+    """
+    if old_tables is None or new_tables is None:
+        return None
+    return {
+        table
+        for table in set(old_tables) | set(new_tables)
+        if old_tables.get(table) != new_tables.get(table)
+    }
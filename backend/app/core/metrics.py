@@ -0,0 +1,288 @@
+"""
+Prometheus metrics for requests, database statements and payload sizes.
+
+Requests are labeled by route template (``/v1/{repository}/data``), never by
+raw path, so label cardinality stays bounded. Database statements are timed
+with cursor-execute events on the engine and labeled by the service method
+that issued them, which ``instrument_service`` records in a context
+variable; SQLAlchemy carries context variables into the greenlets it runs
+the driver in, so the label survives the sync/async boundary.
+
+Metrics are exported by ``/metrics`` when ``prometheus_client`` is installed
+(``pip install .[metrics]``) and ``METRICS_ENABLED`` is set. Each request
+costs a few dictionary lookups and histogram observations.
+"""
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.admission import admission_controller
+from app.core.config import settings
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+# Service method issuing database statements in the current context.
+current_service: ContextVar[str] = ContextVar("current_service", default="-")
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+STATEMENT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0, 30.0,
+)
+# 100 B to 1 GB, by factors of 10.
+SIZE_BUCKETS = tuple(10.0 ** exponent for exponent in range(2, 10))
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+METRICS_AVAILABLE = prometheus_client is not None
+enabled = METRICS_AVAILABLE and settings.METRICS_ENABLED
+
+if enabled:
+    REQUESTS = prometheus_client.Counter(
+        "fiesta_http_requests_total",
+        "HTTP requests by route template and status code.",
+        ["method", "route", "status"],
+    )
+    REQUEST_ERRORS = prometheus_client.Counter(
+        "fiesta_http_request_errors_total",
+        "HTTP requests answered with a 5xx status or an unhandled exception.",
+        ["method", "route"],
+    )
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        "fiesta_http_request_duration_seconds",
+        "HTTP request latency by route template.",
+        ["method", "route"],
+        buckets=LATENCY_BUCKETS,
+    )
+    REQUESTS_IN_PROGRESS = prometheus_client.Gauge(
+        "fiesta_http_requests_in_progress",
+        "HTTP requests being handled.",
+    )
+    REQUEST_SIZE = prometheus_client.Histogram(
+        "fiesta_http_request_size_bytes",
+        "HTTP request body size by route template.",
+        ["method", "route"],
+        buckets=SIZE_BUCKETS,
+    )
+    RESPONSE_SIZE = prometheus_client.Histogram(
+        "fiesta_http_response_size_bytes",
+        "HTTP response body size (as sent, after compression) by route template.",
+        ["method", "route"],
+        buckets=SIZE_BUCKETS,
+    )
+    STATEMENT_LATENCY = prometheus_client.Histogram(
+        "fiesta_db_statement_duration_seconds",
+        "Database statement execution time by issuing service method.",
+        ["service", "operation"],
+        buckets=STATEMENT_BUCKETS,
+    )
+    STATEMENT_ERRORS = prometheus_client.Counter(
+        "fiesta_db_statement_errors_total",
+        "Database statements that raised, by issuing service method.",
+        ["service", "operation"],
+    )
+
+
+class AdmissionCollector:
+    """Export the admission controller's queue depth and counters."""
+
+    def collect(self):
+        from prometheus_client.core import (
+            CounterMetricFamily,
+            GaugeMetricFamily,
+        )
+
+        active = GaugeMetricFamily(
+            "fiesta_admission_active",
+            "Requests running by endpoint class.",
+            labels=["endpoint_class"],
+        )
+        queued = GaugeMetricFamily(
+            "fiesta_admission_queued",
+            "Requests waiting for a slot by endpoint class.",
+            labels=["endpoint_class"],
+        )
+        admitted = CounterMetricFamily(
+            "fiesta_admission_admitted",
+            "Requests admitted by endpoint class.",
+            labels=["endpoint_class"],
+        )
+        rejected = CounterMetricFamily(
+            "fiesta_admission_rejected",
+            "Requests rejected by endpoint class and reason.",
+            labels=["endpoint_class", "reason"],
+        )
+        for name, stats in admission_controller.stats().items():
+            active.add_metric([name], stats["active"])
+            queued.add_metric([name], stats["queued"])
+            admitted.add_metric([name], stats["admitted"])
+            for reason, count in stats["rejected"].items():
+                rejected.add_metric([name, reason], count)
+        yield from (active, queued, admitted, rejected)
+
+
+if enabled:
+    prometheus_client.REGISTRY.register(AdmissionCollector())
+
+
+def service_name(func: Callable) -> str:
+    """
+    Label of a service function.
+
+    Methods are labeled ``Class.method``; module functions
+    ``module.function`` using the last part of the module name.
+    """
+    qualname = func.__qualname__
+    if "." in qualname:
+        return qualname
+    return f"{func.__module__.rsplit('.', 1)[-1]}.{qualname}"
+
+
+def instrument_service(func: F) -> F:
+    """
+    Label the database statements of an async service function.
+
+    Apply below ``@classmethod``. Nested services relabel their own
+    statements and restore the caller's label when they return.
+    """
+    name = service_name(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_service.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_service.reset(token)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def statement_operation(statement: str) -> str:
+    """First keyword of a statement, e.g. SELECT, as a low-cardinality label."""
+    keyword = statement.lstrip()[:16].split(None, 1)
+    return keyword[0].upper() if keyword else "-"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement of an engine with cursor-execute events.
+
+    Args:
+        engine: Sync engine, e.g. ``AsyncEngine.sync_engine``
+    """
+    if not enabled:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        STATEMENT_LATENCY.labels(
+            current_service.get(), statement_operation(statement)
+        ).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("metrics_started") if conn is not None else None
+        if stack:
+            stack.pop()
+            STATEMENT_ERRORS.labels(
+                current_service.get(),
+                statement_operation(exception_context.statement or ""),
+            ).inc()
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the route that handled a request."""
+    # FastAPI versions that include routers lazily leave the router-relative
+    # route in scope["route"] and record the full path separately.
+    fastapi_scope = scope.get("fastapi")
+    route = None
+    if isinstance(fastapi_scope, dict):
+        route = fastapi_scope.get("effective_route_context")
+    if route is None:
+        route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    return getattr(route, "path_format", None) or getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        request_size = 0
+        response_size = 0
+        status_code = 500
+
+        async def receive_counted() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message: Message) -> None:
+            nonlocal response_size, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.dec()
+            method = scope["method"]
+            route = route_template(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            if status_code >= 500:
+                REQUEST_ERRORS.labels(method, route).inc()
+            REQUEST_LATENCY.labels(method, route).observe(duration)
+            REQUEST_SIZE.labels(method, route).observe(request_size)
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+
+
+def render_latest() -> Optional[bytes]:
+    """
+    Render the metrics in the Prometheus text format.
+
+    Returns:
+        Exposition body, or None if metrics are disabled
+    """
+    if not enabled:
+        return None
+    return prometheus_client.generate_latest()
+
+
+CONTENT_TYPE = (
+    prometheus_client.CONTENT_TYPE_LATEST if METRICS_AVAILABLE else "text/plain"
+)
@@ -0,0 +1,192 @@
+"""
+On-demand CPU profiling of individual requests.
+
+A request is profiled with pyinstrument's sampling profiler when it carries
+an ``X-Profile`` header equal to ``PROFILING_TOKEN``, or at random at
+``PROFILING_SAMPLE_RATE``. The profile covers only the request's own async
+context, so concurrent requests do not show up in it. After the response
+is sent, the profile is stored in ``PROFILING_DIR`` as an HTML report and a
+speedscope JSON file, the response carries its ID in ``X-Profile-Id``, and
+superusers can list and download profiles at ``/v1/admin/profiles``.
+
+The middleware is only installed when pyinstrument is available
+(``pip install .[profiling]``) and a token or sample rate is configured, so
+it costs nothing when profiling is off.
+"""
+import asyncio
+import hmac
+import importlib.util
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import route_template
+
+# pyinstrument is imported on first use, so that it stays off worker startup.
+if TYPE_CHECKING:
+    from pyinstrument import Profiler
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = {
+    "html": ("html", "text/html"),
+    "speedscope": ("speedscope.json", "application/json"),
+}
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Paths never profiled, so that reading profiles does not create more.
+SKIPPED_PATHS = ("/metrics", "/v1/admin/profiles")
+
+PROFILING_AVAILABLE = importlib.util.find_spec("pyinstrument") is not None
+enabled = PROFILING_AVAILABLE and bool(
+    settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE > 0
+)
+
+
+def profile_dir() -> Path:
+    """Directory profile artifacts are stored in."""
+    return Path(settings.PROFILING_DIR)
+
+
+def profile_path(profile_id: str, format: str) -> Optional[Path]:
+    """
+    Get the file of a stored profile.
+
+    Args:
+        profile_id: ID from the X-Profile-Id header
+        format: One of PROFILE_FORMATS
+
+    Returns:
+        Path of the artifact, or None if the ID or format is invalid or the
+        profile does not exist
+    """
+    if not _PROFILE_ID.match(profile_id) or format not in PROFILE_FORMATS:
+        return None
+    path = profile_dir() / f"{profile_id}.{PROFILE_FORMATS[format][0]}"
+    return path if path.is_file() else None
+
+
+def list_profiles(limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Get the metadata of stored profiles, newest first.
+
+    Args:
+        limit: Maximum number of profiles
+
+    Returns:
+        Metadata of each profile
+    """
+    profiles = []
+    for path in sorted(
+        profile_dir().glob("*.meta.json"),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )[:limit]:
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def save_profile(profiler: "Profiler", metadata: Dict[str, Any]) -> None:
+    """
+    Render a stopped profiler and store its artifacts.
+
+    Drops the oldest profiles beyond ``PROFILING_MAX_PROFILES``.
+    """
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = metadata["id"]
+    (directory / f"{profile_id}.html").write_text(profiler.output_html())
+    (directory / f"{profile_id}.speedscope.json").write_text(
+        profiler.output(renderer=SpeedscopeRenderer())
+    )
+    (directory / f"{profile_id}.meta.json").write_text(json.dumps(metadata))
+
+    metas = sorted(directory.glob("*.meta.json"), key=lambda path: path.stat().st_mtime)
+    for meta in metas[:max(len(metas) - settings.PROFILING_MAX_PROFILES, 0)]:
+        old_id = meta.name.split(".", 1)[0]
+        for extension in ("meta.json", *(value[0] for value in PROFILE_FORMATS.values())):
+            (directory / f"{old_id}.{extension}").unlink(missing_ok=True)
+
+
+def _requested(scope: Scope) -> bool:
+    if settings.PROFILING_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                return hmac.compare_digest(
+                    value, settings.PROFILING_TOKEN.encode("latin-1")
+                )
+    return False
+
+
+def should_profile(scope: Scope) -> bool:
+    """Whether to profile a request."""
+    if scope["path"].startswith(SKIPPED_PATHS):
+        return False
+    return _requested(scope) or random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests."""
+
+    def __init__(self, app: ASGIApp):
+        from pyinstrument import Profiler
+
+        self.app = app
+        self.profiler_class = Profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        profiler = self.profiler_class(
+            interval=settings.PROFILING_INTERVAL, async_mode="enabled"
+        )
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            metadata = {
+                "id": profile_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            try:
+                # Rendering takes a while; the response has been sent already.
+                await asyncio.to_thread(save_profile, profiler, metadata)
+            except Exception:
+                logger.exception("Storing profile %s failed", profile_id)
@@ -0,0 +1,255 @@
+"""
+Fast JSON responses for large contribution payloads.
+
+Routes that return contributions declare ``response_model`` for the OpenAPI
+schema, but FastAPI would then validate and re-encode the whole arbitrary
+``data`` document through pydantic and the stdlib JSON encoder. Instead these
+helpers validate only the small envelope fields and splice the ``data``
+document in as JSON text, usually exactly as Postgres rendered it, then
+compress the body if the client accepts it.
+"""
+import asyncio
+import gzip
+import zlib
+from typing import Any, AsyncIterator, Iterable, Mapping, Optional, Tuple, Union
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+JSONText = Union[bytes, str]
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize a JSON-compatible object with orjson."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _as_bytes(value: Union[JSONText, Mapping[str, Any], None]) -> bytes:
+    if value is None:
+        return b"null"
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    return dumps(value)
+
+
+def render_envelope(
+    envelope: BaseModel,
+    data: Union[JSONText, Mapping[str, Any], None],
+    data_field: str = "data",
+) -> bytes:
+    """
+    Render an envelope model with a pre-serialized document spliced in.
+
+    Args:
+        envelope: Validated envelope fields (without the document)
+        data: Document as JSON text, or a dict to encode with orjson
+        data_field: Key to store the document under
+
+    Returns:
+        JSON object bytes
+    """
+    prefix, suffix = _envelope_parts(envelope, data_field)
+    return prefix + _as_bytes(data) + suffix
+
+
+def _envelope_parts(envelope: BaseModel, data_field: str) -> Tuple[bytes, bytes]:
+    head = dumps(envelope.model_dump(mode="json"))
+    separator = b"," if len(head) > 2 else b""
+    return b"{" + dumps(data_field) + b":", separator + head[1:]
+
+
+async def stream_envelope(
+    envelope: BaseModel,
+    chunks: AsyncIterator[bytes],
+    data_field: str = "data",
+) -> AsyncIterator[bytes]:
+    """
+    Render an envelope model around a document streamed as JSON chunks.
+
+    Args:
+        envelope: Validated envelope fields (without the document)
+        chunks: The document's JSON, in pieces
+        data_field: Key to store the document under
+    """
+    prefix, suffix = _envelope_parts(envelope, data_field)
+    yield prefix
+    async for chunk in chunks:
+        yield chunk
+    yield suffix
+
+
+def render_list(
+    envelope: BaseModel, items_field: str, items: Iterable[bytes]
+) -> bytes:
+    """
+    Render an envelope model with a list of pre-rendered JSON items.
+
+    Args:
+        envelope: Validated envelope fields (without the item list)
+        items_field: Key to store the items under
+        items: Rendered JSON items
+
+    Returns:
+        JSON object bytes
+    """
+    head = dumps(envelope.model_dump(mode="json"))
+    separator = b"," if len(head) > 2 else b""
+    body = b",".join(items)
+    return b"{" + dumps(items_field) + b":[" + body + b"]" + separator + head[1:]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick a content encoding the client accepts.
+
+    Args:
+        accept_encoding: Value of the Accept-Encoding request header
+
+    Returns:
+        "br", "gzip" or None
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a body with the negotiated encoding if it is large enough.
+
+    Returns:
+        Tuple of (body, encoding actually applied)
+    """
+    if encoding is None or len(body) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL), "gzip"
+
+
+def weaken_etag(headers: Mapping[str, str]) -> dict:
+    """
+    Mark a strong ETag weak for a compressed body.
+
+    A strong ETag promises byte-identical bodies, which the identity, gzip
+    and brotli encodings of one revision are not; the weak form still
+    matches If-None-Match, which uses weak comparison.
+    """
+    headers = dict(headers)
+    for name in headers:
+        if name.lower() == "etag" and not headers[name].startswith("W/"):
+            headers[name] = "W/" + headers[name]
+    return headers
+
+
+class RawJSONResponse(Response):
+    """Response for JSON bytes that are already serialized (and encoded)."""
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: bytes,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        content_encoding: Optional[str] = None,
+    ):
+        if content_encoding and headers:
+            headers = weaken_etag(headers)
+        super().__init__(content=content, status_code=status_code, headers=headers)
+        self.headers["Vary"] = "Accept-Encoding"
+        if content_encoding:
+            self.headers["Content-Encoding"] = content_encoding
+
+
+async def json_response(
+    request: Request,
+    content: bytes,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> RawJSONResponse:
+    """
+    Build a response for serialized JSON, compressed as the client allows.
+
+    Compression runs in a worker thread so multi-megabyte bodies do not
+    block the event loop.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(content) >= settings.RESPONSE_COMPRESSION_MIN_SIZE:
+        content, encoding = await asyncio.to_thread(compress, content, encoding)
+    else:
+        encoding = None
+    return RawJSONResponse(
+        content,
+        status_code=status_code,
+        headers=headers,
+        content_encoding=encoding,
+    )
+
+
+async def _compress_stream(
+    chunks: AsyncIterator[bytes], encoding: Optional[str]
+) -> AsyncIterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=settings.RESPONSE_BROTLI_QUALITY)
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(settings.RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress_chunk, finish = compressor.compress, compressor.flush
+    async for chunk in chunks:
+        compressed = await asyncio.to_thread(compress_chunk, chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def json_stream_response(
+    request: Request,
+    chunks: AsyncIterator[bytes],
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> StreamingResponse:
+    """
+    Build a response that streams JSON chunks, compressed as the client
+    allows.
+
+    Used for documents too large to hold in memory; the body length is not
+    known up front, so the response is chunked.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    response_headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        chunks = _compress_stream(chunks, encoding)
+        response_headers = weaken_etag(response_headers)
+        response_headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        chunks,
+        status_code=status_code,
+        media_type="application/json",
+        headers=response_headers,
+    )
@@ -2,16 +2,20 @@
 Security utilities for authentication and authorization.
 """
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any, Optional, Union
 
 from jose import jwt
-from passlib.context import CryptContext
 
 from app.core.config import settings
 from app.schemas.token import TokenPayload
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hashing context, created on first use to keep passlib off startup."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def create_access_token(
     data: dict, expires_delta: Optional[timedelta] = None
@@ -49,7 +53,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True if password matches hash, False otherwise
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """
@@ -61,7 +65,7 @@ def get_password_hash(password: str) -> str:
     Returns:
         Hashed password
     """
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def decode_token(token: str) -> TokenPayload:
     """
@@ -0,0 +1,231 @@
+"""
+Blob storage for data moved out of the database, on local disk or in S3.
+
+``BLOB_STORAGE`` selects the backend: ``local`` keeps blobs as files
+under ``BLOB_DIR``, ``s3`` keeps them in ``S3_BUCKET_NAME`` under
+``BLOB_S3_PREFIX``. Blobs are read by byte range or streamed in chunks, so
+that a small part of a large blob is read without fetching the rest, and a
+large blob is sent on without holding all of it in memory.
+"""
+import asyncio
+import os
+import shutil
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Bytes read at a time when streaming a blob.
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Stores immutable blobs under string keys."""
+
+    async def put(self, key: str, data: bytes) -> None:
+        """
+        Store a blob.
+
+        Args:
+            key: Key of the blob, e.g. ``history/magic/2024-01.jsonl.gz``
+            data: Contents of the blob
+        """
+        raise NotImplementedError
+
+    async def put_file(self, key: str, path: Path) -> None:
+        """
+        Store the contents of a file.
+
+        Args:
+            key: Key of the blob
+            path: File to store
+        """
+        raise NotImplementedError
+
+    async def get(self, key: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        """
+        Read a blob, or a byte range of it.
+
+        Args:
+            key: Key of the blob
+            start: First byte to read
+            length: Number of bytes to read, or None to read to the end
+
+        Raises:
+            FileNotFoundError: If there is no blob with the key
+        """
+        raise NotImplementedError
+
+    def iter_bytes(self, key: str) -> AsyncIterator[bytes]:
+        """
+        Read a blob in chunks of at most ``CHUNK_SIZE`` bytes.
+
+        Raises:
+            FileNotFoundError: If there is no blob with the key
+        """
+        raise NotImplementedError
+
+    async def list(self, prefix: str) -> List[Tuple[str, datetime]]:
+        """
+        List the blobs whose keys start with a prefix.
+
+        Returns:
+            List of (key, time the blob was stored)
+        """
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Delete a blob, if it exists."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files in a directory."""
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return path
+
+    def _partial(self, key: str) -> Path:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target.with_name(target.name + ".partial")
+
+    def _put(self, key: str, data: bytes) -> None:
+        partial = self._partial(key)
+        partial.write_bytes(data)
+        os.replace(partial, self._path(key))
+
+    def _put_file(self, key: str, path: Path) -> None:
+        partial = self._partial(key)
+        shutil.copyfile(path, partial)
+        os.replace(partial, self._path(key))
+
+    def _get(self, key: str, start: int, length: Optional[int]) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            return f.read() if length is None else f.read(length)
+
+    def _list(self, prefix: str) -> List[Tuple[str, datetime]]:
+        blobs = []
+        for path in self.root.rglob("*"):
+            key = path.relative_to(self.root).as_posix()
+            if path.is_file() and key.startswith(prefix) and path.suffix != ".partial":
+                modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+                blobs.append((key, modified))
+        return blobs
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put, key, data)
+
+    async def put_file(self, key: str, path: Path) -> None:
+        await asyncio.to_thread(self._put_file, key, path)
+
+    async def get(self, key: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        return await asyncio.to_thread(self._get, key, start, length)
+
+    async def iter_bytes(self, key: str) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+
+    async def list(self, prefix: str) -> List[Tuple[str, datetime]]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+
+class S3BlobStore(BlobStore):
+    """Blobs as objects in an S3 bucket."""
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        # boto3 takes long to import, so only workers that read blobs pay for it.
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            region_name=settings.AWS_REGION,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
+        )
+
+    def _get_object(self, key: str, **kwargs):
+        try:
+            return self.client.get_object(
+                Bucket=self.bucket, Key=self.prefix + key, **kwargs
+            )
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key) from None
+
+    def _get(self, key: str, start: int, length: Optional[int]) -> bytes:
+        end = "" if length is None else start + length - 1
+        return self._get_object(key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    def _list(self, prefix: str) -> List[Tuple[str, datetime]]:
+        blobs = []
+        pages = self.client.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=self.prefix + prefix
+        )
+        for page in pages:
+            for item in page.get("Contents", []):
+                blobs.append((item["Key"][len(self.prefix):], item["LastModified"]))
+        return blobs
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(
+            self.client.put_object, Bucket=self.bucket, Key=self.prefix + key, Body=data
+        )
+
+    async def put_file(self, key: str, path: Path) -> None:
+        await asyncio.to_thread(
+            self.client.upload_file, str(path), self.bucket, self.prefix + key
+        )
+
+    async def get(self, key: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        if length == 0:
+            return b""
+        return await asyncio.to_thread(self._get, key, start, length)
+
+    async def iter_bytes(self, key: str) -> AsyncIterator[bytes]:
+        body = (await asyncio.to_thread(self._get_object, key))["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def list(self, prefix: str) -> List[Tuple[str, datetime]]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(
+            self.client.delete_object, Bucket=self.bucket, Key=self.prefix + key
+        )
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    """
+    Get the blob store selected by ``BLOB_STORAGE``.
+
+    Raises:
+        ValueError: If ``BLOB_STORAGE`` is not a known backend
+    """
+    if settings.BLOB_STORAGE == "local":
+        return LocalBlobStore(settings.BLOB_DIR)
+    if settings.BLOB_STORAGE == "s3":
+        return S3BlobStore(settings.S3_BUCKET_NAME, settings.BLOB_S3_PREFIX)
+    raise ValueError(f"Unknown BLOB_STORAGE: {settings.BLOB_STORAGE!r}")
@@ -0,0 +1,51 @@
+"""
+Content block database model.
+"""
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import BaseModel
+
+
+class ContentBlock(BaseModel):
+    """
+    A top-level table of contribution documents, stored once by content
+    (see app.services.blocks).
+
+    ``hash`` is the table's canonical SHA-256, as in ``table_hashes`` of the
+    contributions that contain it, and ``ref_count`` the number of such
+    references. Blocks whose count dropped to zero, or that were only
+    validated, keep the time in ``released_at`` until they are collected.
+    """
+    __tablename__ = "content_blocks"
+
+    hash = Column(String(64), nullable=False, unique=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    released_at = Column(DateTime(timezone=True), nullable=True)
+    # Length of the canonical JSON
+    size = Column(BigInteger, nullable=False)
+    # Row count and columns, computed when the block is first seen
+    summary = Column(JSONB, nullable=False, default=dict)
+    # Validation messages by "<table>@<data model version>"
+    validation = Column(JSONB, nullable=True)
+    # Blob of the block, once an offloaded document needed it
+    key = Column(String(200), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_content_blocks_released",
+            "released_at",
+            postgresql_where=text("ref_count <= 0"),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<ContentBlock {self.hash[:12]} ({self.ref_count} refs)>"
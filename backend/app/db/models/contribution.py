@@ -2,49 +2,68 @@
 Contribution database model.
 """
 from datetime import datetime
-from enum import Enum as EnumType
 from typing import Dict, List, Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     Enum,
     ForeignKey,
+    ForeignKeyConstraint,
+    Index,
     Integer,
     JSON,
     String,
     Table,
     Text,
+    event,
+    false,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from app.db.base import BaseModel
-
-
-class ContributionStatus(str, EnumType):
-    """Status of a contribution."""
-    DRAFT = "draft"
-    SUBMITTED = "submitted"
-    PUBLISHED = "published"
-    REJECTED = "rejected"
-    ARCHIVED = "archived"
+from app.db.partitions import create_partitions
+from app.schemas.data import ContributionStatus
 
 
 class Contribution(BaseModel):
-    """Contribution model for storing data contributions."""
+    """
+    Contribution model for storing data contributions.
+    
+    The table is partitioned by repository (see app.db.partitions), so the
+    repository is part of the primary key; ids still come from a single
+    sequence and are unique on their own.
+    """
     __tablename__ = "contributions"
     
-    id = Column(Integer, primary_key=True, index=True)
-    repository = Column(String(50), nullable=False, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repository = Column(String(50), primary_key=True)
     data_type = Column(String(50), nullable=False, index=True)
     version = Column(String(20), default="1.0.0")
+    # Versions of a contribution share the id of the first one; the newest
+    # published version of each lineage is flagged as the latest.
+    lineage_id = Column(Integer, nullable=True)
+    is_latest = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Bumped on every ORM update and checked in its WHERE clause; exposed to
+    # clients as the ETag.
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
     
-    # Data storage
-    data = Column(JSONB, nullable=False)
+    # Data storage. Large documents are kept zstd-compressed in blob storage
+    # instead, with data NULL (see app.services.offload).
+    data = Column(JSONB(none_as_null=True), nullable=True)
+    data_ref = Column(String(200), nullable=True, index=True)
+    data_checksum = Column(String(64), nullable=True)
+    data_size = Column(BigInteger, nullable=True)
     metadata = Column(JSONB, default=dict)
+    # Canonical SHA-256 of data and of each of its top-level tables, so that
+    # changes are detected without reading the document (see app.core.hashing).
+    content_hash = Column(String(64), nullable=True, index=True)
+    table_hashes = Column(JSONB, nullable=True)
     
     # Status and ownership
     status = Column(Enum(ContributionStatus), default=ContributionStatus.DRAFT)
@@ -59,6 +78,19 @@ class Contribution(BaseModel):
     creator = relationship("User", foreign_keys=[created_by])
     updater = relationship("User", foreign_keys=[updated_by])
     
+    __table_args__ = (
+        Index("ix_contributions_lineage", "repository", "lineage_id", "id"),
+        # Latest versions only, in id order, as only_latest searches page them
+        Index(
+            "ix_contributions_latest",
+            "repository",
+            "id",
+            postgresql_where=text("is_latest"),
+        ),
+        {"postgresql_partition_by": "LIST (repository)"},
+    )
+    __mapper_args__ = {"version_id_col": revision}
+    
     def __repr__(self):
         return f"<Contribution {self.id} ({self.repository}/{self.data_type})>"
     
@@ -69,6 +101,10 @@ class Contribution(BaseModel):
             "repository": self.repository,
             "data_type": self.data_type,
             "version": self.version,
+            "lineage_id": self.lineage_id,
+            "is_latest": self.is_latest,
+            "revision": self.revision,
+            "content_hash": self.content_hash,
             "status": self.status.value,
             "is_public": self.is_public,
             "created_at": self.created_at.isoformat() if self.created_at else None,
@@ -90,11 +126,24 @@ class Contribution(BaseModel):
 
 
 class ContributionHistory(BaseModel):
-    """Audit history for contributions."""
+    """
+    Audit history for contributions, partitioned by repository like them and
+    then by month, so that old months can be archived.
+    
+    Partition keys must be part of the primary key, but ids are unique on
+    their own and the ORM identifies rows without the creation time.
+    """
     __tablename__ = "contribution_history"
     
-    id = Column(Integer, primary_key=True)
-    contribution_id = Column(Integer, ForeignKey("contributions.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contribution_id = Column(Integer, nullable=False)
+    repository = Column(String(50), primary_key=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        server_default=func.now(),
+        nullable=False,
+    )
     
     # What changed
     action = Column(String(50), nullable=False)  # create, update, status_change, etc.
@@ -103,18 +152,49 @@ class ContributionHistory(BaseModel):
     # Who made the change
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
+    # Top-level transaction that wrote the row. Ids are taken when rows are
+    # inserted but become visible at commit, so the change feed orders by
+    # (txid, id) and only serves transactions older than every one still
+    # running (see ContributionService.get_changes).
+    txid = Column(
+        BigInteger,
+        nullable=False,
+        server_default=text("pg_current_xact_id()::text::bigint"),
+    )
+    
     # Relationships
     contribution = relationship("Contribution", back_populates="history")
     user = relationship("User")
     
+    # Change feed reads are "WHERE repository = ? AND (txid, id) > (?, ?)
+    # ORDER BY txid, id", served by ix_contribution_history_feed; history
+    # pages are "WHERE contribution_id = ? ORDER BY id DESC".
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["contribution_id", "repository"],
+            ["contributions.id", "contributions.repository"],
+            ondelete="CASCADE",
+        ),
+        Index("ix_contribution_history_contribution_id", "contribution_id", "id"),
+        Index("ix_contribution_history_feed", "repository", "txid", "id"),
+        {"postgresql_partition_by": "LIST (repository)"},
+    )
+    __mapper_args__ = {"primary_key": [id, repository]}
+    
     def __repr__(self):
         return f"<ContributionHistory {self.id} ({self.action} on {self.contribution_id})>"
 
 
-# Add relationship to Contribution model
+# Add relationship to Contribution model. History only grows, so it is never
+# loaded as a collection: entries are added directly and read page by page.
 Contribution.history = relationship(
     "ContributionHistory",
-    order_by=ContributionHistory.created_at,
+    order_by=ContributionHistory.id,
     back_populates="contribution",
     cascade="all, delete-orphan",
+    lazy="write_only",
+    passive_deletes=True,
 )
+
+event.listen(Contribution.__table__, "after_create", create_partitions)
+event.listen(ContributionHistory.__table__, "after_create", create_partitions)
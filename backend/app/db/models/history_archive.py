@@ -0,0 +1,50 @@
+"""
+History archive database model.
+"""
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import BaseModel
+
+
+class HistoryArchive(BaseModel):
+    """
+    A month of a repository's contribution history, moved out of the
+    database into blob storage (see app.services.history_archive).
+
+    The blob is a series of gzip members, one per contribution, each holding
+    its entries as JSON lines by ascending id; ``contributions`` maps each
+    contribution id to the ``[offset, length, entries]`` of its member, so
+    one contribution's entries are read without the rest of the month.
+    """
+    __tablename__ = "history_archives"
+
+    repository = Column(String(50), nullable=False)
+    period_start = Column(DateTime(timezone=True), nullable=False)
+    period_end = Column(DateTime(timezone=True), nullable=False)
+    key = Column(String(500), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    entries = Column(Integer, nullable=False)
+    min_history_id = Column(Integer, nullable=True)
+    max_history_id = Column(Integer, nullable=True)
+    contributions = Column(JSONB, nullable=False, default=dict)
+
+    __table_args__ = (
+        UniqueConstraint("repository", "period_start"),
+        Index(
+            "ix_history_archives_contributions",
+            "contributions",
+            postgresql_using="gin",
+        ),
+    )
+
+    def __repr__(self):
+        return f"<HistoryArchive {self.repository} {self.period_start:%Y-%m}>"
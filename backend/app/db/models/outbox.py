@@ -0,0 +1,70 @@
+"""
+Search outbox database model.
+"""
+from enum import Enum as EnumType
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+    text,
+)
+
+from app.db.base import BaseModel
+
+
+class SearchOutboxAction(str, EnumType):
+    """Operation to apply to the search index."""
+    INDEX = "index"
+    DELETE = "delete"
+
+
+class SearchOutbox(BaseModel):
+    """
+    Pending search index operations.
+
+    Rows are written in the same transaction as the contribution change that
+    caused them and are drained by the background search indexer. Successful
+    rows are deleted; rows that exhaust their retries are kept with
+    ``processed_at`` and ``last_error`` set as a dead letter record.
+    """
+    __tablename__ = "search_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    # No foreign key: delete operations must outlive the contribution row.
+    contribution_id = Column(Integer, nullable=False, index=True)
+    repository = Column(String(50), nullable=False)
+    action = Column(
+        Enum(SearchOutboxAction),
+        nullable=False,
+        default=SearchOutboxAction.INDEX,
+    )
+
+    # Delivery state
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_search_outbox_pending",
+            "available_at",
+            "id",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<SearchOutbox {self.id} ({self.action} "
+            f"{self.repository}/{self.contribution_id})>"
+        )
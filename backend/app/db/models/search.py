@@ -0,0 +1,139 @@
+"""
+Per-level search table database models.
+"""
+from enum import Enum as EnumType
+from typing import Dict, Type
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    String,
+    false,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declared_attr
+
+from app.db.base import BaseModel
+
+
+class SearchLevel(str, EnumType):
+    """Levels of the MagIC search, from whole contributions down to rows."""
+    CONTRIBUTIONS = "contributions"
+    LOCATIONS = "locations"
+    SITES = "sites"
+    SAMPLES = "samples"
+    SPECIMENS = "specimens"
+    EXPERIMENTS = "experiments"
+    MEASUREMENTS = "measurements"
+
+
+class SearchRowMixin:
+    """
+    Columns shared by the per-level search tables.
+
+    Each table holds one row per row of its level across all contributions,
+    copied from the contribution documents when they are written, so a
+    search at one level scans a single indexed table instead of the JSONB
+    of every contribution.
+    """
+    id = Column(BigInteger, primary_key=True)
+    repository = Column(String(50), nullable=False)
+    is_public = Column(Boolean, nullable=False, default=False)
+    # Whether the contribution is the latest version of its lineage
+    is_latest = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Position of the row within its table in the contribution document.
+    row_index = Column(Integer, nullable=False)
+    row = Column(JSONB, nullable=False)
+
+    @declared_attr
+    def contribution_id(cls):
+        return Column(Integer, nullable=False, index=True)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            # Contributions are partitioned by repository, which is part of
+            # their primary key.
+            ForeignKeyConstraint(
+                ["contribution_id", "repository"],
+                ["contributions.id", "contributions.repository"],
+                ondelete="CASCADE",
+            ),
+            Index(
+                f"ix_{cls.__tablename__}_repository_public",
+                "repository",
+                "is_public",
+            ),
+            # jsonb_path_ops serves the @> containment filters of searches.
+            Index(
+                f"ix_{cls.__tablename__}_row",
+                "row",
+                postgresql_using="gin",
+                postgresql_ops={"row": "jsonb_path_ops"},
+            ),
+            # Serves the same filters restricted to latest versions
+            Index(
+                f"ix_{cls.__tablename__}_row_latest",
+                "row",
+                postgresql_using="gin",
+                postgresql_ops={"row": "jsonb_path_ops"},
+                postgresql_where=text("is_latest"),
+            ),
+        )
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} {self.id} "
+            f"({self.repository}/{self.contribution_id}#{self.row_index})>"
+        )
+
+
+class SearchContribution(SearchRowMixin, BaseModel):
+    """Search rows at the contributions level."""
+    __tablename__ = "search_contributions"
+
+
+class SearchLocation(SearchRowMixin, BaseModel):
+    """Search rows at the locations level."""
+    __tablename__ = "search_locations"
+
+
+class SearchSite(SearchRowMixin, BaseModel):
+    """Search rows at the sites level."""
+    __tablename__ = "search_sites"
+
+
+class SearchSample(SearchRowMixin, BaseModel):
+    """Search rows at the samples level."""
+    __tablename__ = "search_samples"
+
+
+class SearchSpecimen(SearchRowMixin, BaseModel):
+    """Search rows at the specimens level."""
+    __tablename__ = "search_specimens"
+
+
+class SearchExperiment(SearchRowMixin, BaseModel):
+    """Search rows at the experiments level, one per experiment and specimen."""
+    __tablename__ = "search_experiments"
+
+
+class SearchMeasurement(SearchRowMixin, BaseModel):
+    """Search rows at the measurements level."""
+    __tablename__ = "search_measurements"
+
+
+SEARCH_TABLES: Dict[SearchLevel, Type[SearchRowMixin]] = {
+    SearchLevel.CONTRIBUTIONS: SearchContribution,
+    SearchLevel.LOCATIONS: SearchLocation,
+    SearchLevel.SITES: SearchSite,
+    SearchLevel.SAMPLES: SearchSample,
+    SearchLevel.SPECIMENS: SearchSpecimen,
+    SearchLevel.EXPERIMENTS: SearchExperiment,
+    SearchLevel.MEASUREMENTS: SearchMeasurement,
+}
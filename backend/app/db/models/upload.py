@@ -0,0 +1,61 @@
+"""
+Resumable upload session database model.
+"""
+from enum import Enum as EnumType
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import BaseModel
+
+
+class UploadStatus(str, EnumType):
+    """State of an upload session."""
+    UPLOADING = "uploading"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class UploadSession(BaseModel):
+    """
+    A resumable upload of a contribution file.
+
+    Chunks are written into a spool file of the full upload length at their
+    offsets, in any order and in parallel; ``received`` holds the merged
+    ``[start, end)`` byte ranges that have been stored and verified. Once the
+    ranges cover the whole file it is parsed into a contribution.
+    """
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    repository = Column(String(50), nullable=False)
+    data_type = Column(String(50), nullable=False)
+    format = Column(String(20), nullable=False, default="magic")
+    filename = Column(String(255), nullable=True)
+
+    # Transfer state
+    upload_length = Column(BigInteger, nullable=False)
+    received = Column(JSONB, nullable=False, default=list)
+    status = Column(Enum(UploadStatus), nullable=False, default=UploadStatus.UPLOADING)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    # Ownership and result
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Not a foreign key: contributions are partitioned by repository, so a
+    # reference would have to include it, and ON DELETE SET NULL would then
+    # clear the upload's repository as well.
+    contribution_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"<UploadSession {self.id} ({self.status} {self.repository})>"
@@ -0,0 +1,193 @@
+"""
+LIST partitions of the contribution tables by repository.
+
+``contributions`` and ``contribution_history`` are partitioned by their
+``repository`` column, with one partition per repository in
+``RepositoryEnum`` and a default partition for any other. Each repository
+thus has its own heap, indexes and autovacuum, and queries that filter on
+the repository only touch its partition.
+
+Partitions are created right after their parent table, and are named after
+it, e.g. ``contributions_magic`` and ``contributions_default``.
+``scripts/partition_by_repository.py`` converts existing unpartitioned
+tables.
+
+The repository partitions of ``contribution_history`` are in turn RANGE
+partitioned by ``created_at``, one partition per month, e.g.
+``contribution_history_magic_2024_01``, so that old months can be detached
+and archived (see app.services.history_archive). Months are created
+``HISTORY_PARTITION_MONTHS_AHEAD`` in advance by
+``scripts/archive_history.py``; a default partition per repository catches
+rows of months that were not created in time.
+"""
+import re
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.schemas.data import RepositoryEnum
+
+PARTITIONED_TABLES = ("contributions", "contribution_history")
+HISTORY_TABLE = "contribution_history"
+
+_REPOSITORY_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+def repositories() -> List[str]:
+    """Repositories with a partition of their own."""
+    return [repository.value for repository in RepositoryEnum]
+
+
+def partition_name(table: str, repository: Optional[str]) -> str:
+    """
+    Get the name of a partition.
+
+    Args:
+        table: Partitioned table
+        repository: Repository, or None for the default partition
+
+    Returns:
+        Partition name, e.g. ``contributions_magic``
+    """
+    return f"{table}_{repository.lower() if repository else 'default'}"
+
+
+def partition_ddl(table: str, repository: Optional[str]) -> str:
+    """
+    Get the statement creating a partition if it does not exist.
+
+    Args:
+        table: Partitioned table
+        repository: Repository, or None for the default partition
+
+    Raises:
+        ValueError: If the repository name is not a plain identifier
+    """
+    name = partition_name(table, repository)
+    if repository is None:
+        ddl = f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} DEFAULT"
+    elif not _REPOSITORY_NAME.match(repository):
+        raise ValueError(f"Invalid repository name: {repository!r}")
+    else:
+        ddl = (
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES IN ('{repository}')"
+        )
+    if table == HISTORY_TABLE:
+        ddl += " PARTITION BY RANGE (created_at)"
+    return ddl
+
+
+def month_start(moment: datetime) -> datetime:
+    """Get the start of the month of a moment, in UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """Move the start of a month by a number of months."""
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def history_partition_name(repository: Optional[str], month: datetime) -> str:
+    """
+    Get the name of a month partition of contribution history.
+
+    Args:
+        repository: Repository, or None for the default partition
+        month: Start of the month
+
+    Returns:
+        Partition name, e.g. ``contribution_history_magic_2024_01``
+    """
+    return f"{partition_name(HISTORY_TABLE, repository)}_{month:%Y_%m}"
+
+
+def parse_history_partition_name(
+    repository: Optional[str], name: str
+) -> Optional[datetime]:
+    """
+    Get the month of a month partition from its name.
+
+    Returns:
+        Start of the month, or None if the name is not a month partition of
+        the repository
+    """
+    prefix = partition_name(HISTORY_TABLE, repository) + "_"
+    if not name.startswith(prefix):
+        return None
+    try:
+        month = datetime.strptime(name[len(prefix):], "%Y_%m")
+    except ValueError:
+        return None
+    return month.replace(tzinfo=timezone.utc)
+
+
+def history_partition_ddl(repository: Optional[str], month: datetime) -> str:
+    """
+    Get the statement creating a month partition of contribution history.
+
+    Args:
+        repository: Repository, or None for the default partition
+        month: Start of the month, in UTC
+    """
+    parent = partition_name(HISTORY_TABLE, repository)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {history_partition_name(repository, month)} "
+        f"PARTITION OF {parent} FOR VALUES "
+        f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def create_history_partitions(
+    connection: Connection, start: datetime, end: datetime
+) -> None:
+    """
+    Create the month partitions of all repositories' history.
+
+    Creating a month fails if the repository's default partition already
+    holds rows of it; those have to be moved out first.
+
+    Args:
+        connection: Database connection
+        start: Any moment of the first month
+        end: Any moment of the last month
+    """
+    last = month_start(end)
+    for repository in [*repositories(), None]:
+        month = month_start(start)
+        while month <= last:
+            connection.exec_driver_sql(history_partition_ddl(repository, month))
+            month = add_months(month, 1)
+
+
+def create_partitions(target: Table, connection: Connection, **kw: Any) -> None:
+    """
+    Create the partitions of a table, after it was created.
+
+    Registered as an ``after_create`` listener of the partitioned tables.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for repository in [*repositories(), None]:
+        connection.exec_driver_sql(partition_ddl(target.name, repository))
+        if target.name == HISTORY_TABLE:
+            parent = partition_name(HISTORY_TABLE, repository)
+            connection.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {parent}_default "
+                f"PARTITION OF {parent} DEFAULT"
+            )
+    if target.name == HISTORY_TABLE:
+        now = datetime.now(timezone.utc)
+        create_history_partitions(
+            connection,
+            now,
+            add_months(month_start(now), settings.HISTORY_PARTITION_MONTHS_AHEAD),
+        )
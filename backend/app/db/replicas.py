@@ -0,0 +1,192 @@
+"""
+Routing of read-only sessions to read replicas.
+
+Public read routes take their session from ``get_read_db``, which uses a
+replica from ``DATABASE_REPLICA_URLS`` if one is usable:
+
+- the replica answered its last health check, and
+- its replay lag was at most ``REPLICA_MAX_LAG_SECONDS``, and
+- the client has not written anything through this worker in the last
+  ``REPLICA_PIN_SECONDS``, so it reads its own writes.
+
+Otherwise the session goes to the primary. Replicas are checked every
+``REPLICA_CHECK_INTERVAL`` seconds by a background task, and a replica whose
+connection fails during a request is taken out of rotation until the next
+check succeeds.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Replay lag of a standby; zero when it has replayed everything it received,
+# so that an idle primary does not make replicas look stale.
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+# Most pinned clients remembered before expired pins are dropped.
+MAX_PINS = 10000
+
+
+class Replica:
+    """A read replica and the result of its last health check."""
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.session_factory = sessionmaker(
+            bind=engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+
+    @property
+    def usable(self) -> bool:
+        """Whether reads may be routed to the replica."""
+        return (
+            self.healthy
+            and self.lag is not None
+            and self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+        )
+
+    async def _query_lag(self) -> Optional[float]:
+        async with self.engine.connect() as conn:
+            return await conn.scalar(LAG_QUERY)
+
+    async def check(self) -> None:
+        """Measure the replica's lag, marking it unhealthy if that fails."""
+        try:
+            lag = await asyncio.wait_for(
+                self._query_lag(), timeout=settings.REPLICA_CHECK_INTERVAL
+            )
+        except Exception as e:
+            self.mark_failed(e)
+        else:
+            self.healthy = True
+            self.lag = float(lag) if lag is not None else None
+            self.error = None if lag is not None else "Replay lag unknown"
+        self.checked_at = datetime.now(timezone.utc)
+
+    def mark_failed(self, error: BaseException) -> None:
+        """Take the replica out of rotation until its next successful check."""
+        if self.healthy:
+            logger.warning("Read replica %s failed: %s", self.name, error)
+        self.healthy = False
+        self.error = str(error).splitlines()[0][:1000] if str(error) else repr(error)
+
+
+class ReplicaRouter:
+    """Chooses a replica for each read session and watches their lag."""
+
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._next = itertools.count()
+        self._pins: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def pin(self, client: str) -> None:
+        """
+        Send a client's reads to the primary for ``REPLICA_PIN_SECONDS``.
+
+        Args:
+            client: Client key, see ``app.core.clients.client_key``
+        """
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._pins) >= MAX_PINS:
+            self._pins = {
+                key: until for key, until in self._pins.items() if until > now
+            }
+        self._pins[client] = now + settings.REPLICA_PIN_SECONDS
+
+    def is_pinned(self, client: str) -> bool:
+        """Whether a client wrote recently."""
+        until = self._pins.get(client)
+        return until is not None and until > time.monotonic()
+
+    def choose(self, client: str) -> Optional[Replica]:
+        """
+        Choose a replica for a client's read session.
+
+        Returns:
+            The next usable replica in rotation, or None to use the primary
+        """
+        if not self.replicas or self.is_pinned(client):
+            return None
+        usable = [replica for replica in self.replicas if replica.usable]
+        if not usable:
+            return None
+        return usable[next(self._next) % len(usable)]
+
+    def handle_error(self, replica: Replica, error: BaseException) -> None:
+        """Take a replica out of rotation if a request lost its connection."""
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            replica.mark_failed(error)
+        elif isinstance(error, (OSError, asyncio.TimeoutError)):
+            replica.mark_failed(error)
+
+    async def check_all(self) -> None:
+        """Check all replicas concurrently."""
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_all()
+            except Exception:
+                logger.exception("Checking read replicas failed")
+            await asyncio.sleep(settings.REPLICA_CHECK_INTERVAL)
+
+    def start(self) -> None:
+        """Start checking the replicas in the background."""
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background checks."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Get the state of each replica for the health check."""
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "usable": replica.usable,
+                "lag_seconds": replica.lag,
+                "checked_at": replica.checked_at,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
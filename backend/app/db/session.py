@@ -1,24 +1,85 @@
 """
 Database session management.
 """
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker, declarative_base
 from sqlalchemy.pool import NullPool
 
+from app.core.clients import client_key
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.db import slow_queries
+from app.db.replicas import Replica, ReplicaRouter
+
+
+def _create_engine(url: str):
+    engine = create_async_engine(
+        url,
+        echo=settings.APP_DEBUG,
+        pool_pre_ping=True,
+        poolclass=NullPool if settings.TESTING else None,
+    )
+    instrument_engine(engine.sync_engine)
+    slow_queries.install(engine)
+    return engine
+
 
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL if not settings.TESTING else settings.DATABASE_TEST_URL,
-    echo=settings.APP_DEBUG,
-    pool_pre_ping=True,
-    poolclass=NullPool if settings.TESTING else None,
+engine = _create_engine(
+    settings.DATABASE_URL if not settings.TESTING else settings.DATABASE_TEST_URL
 )
 
+# Read replicas, never used while testing
+replica_router = ReplicaRouter([
+    Replica(make_url(url).render_as_string(hide_password=True), _create_engine(url))
+    for url in ([] if settings.TESTING else settings.DATABASE_REPLICA_URLS)
+])
+
+
+
+class PrimarySession(Session):
+    """
+    Session on the primary that sets ``info["wrote"]`` once it committed a
+    transaction that may have written.
+    
+    Flushes and statements other than SELECT, including any textual SQL,
+    count as writes; a rollback forgets those of its transaction.
+    """
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _track_statement(state: ORMExecuteState) -> None:
+    if not state.is_select:
+        state.session.info["writing"] = True
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    session.info["writing"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _track_commit(session: Session) -> None:
+    if session.info.pop("writing", False):
+        session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _track_rollback(session: Session) -> None:
+    session.info.pop("writing", None)
+
+
 # Create async session factory
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
+    sync_session_class=PrimarySession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
@@ -28,9 +89,12 @@ AsyncSessionLocal = sessionmaker(
 Base = declarative_base()
 
 
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncSession:
     """
-    Dependency function that yields database sessions.
+    Dependency function that yields database sessions on the primary.
+
+    After a successful request that committed a write, the client's reads
+    are pinned to the primary for a while, see ``read_session``.
     
     Usage in FastAPI path operations:
     ```python
@@ -48,3 +112,37 @@ async def get_db() -> AsyncSession:
             raise
         finally:
             await session.close()
+        if session.info.get("wrote"):
+            replica_router.pin(client_key(request.scope))
+
+
+@asynccontextmanager
+async def read_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    Open a read-only session for a request.
+
+    The session is on a read replica when one is usable and the client did
+    not write recently, and on the primary otherwise. It is never committed,
+    and a replica whose connection fails is taken out of rotation.
+    """
+    replica = replica_router.choose(client_key(request.scope))
+    if replica is None:
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = replica.session_factory
+    async with session_factory() as session:
+        try:
+            yield session
+        except Exception as e:
+            if replica is not None:
+                replica_router.handle_error(replica, e)
+            raise
+        finally:
+            await session.rollback()
+            await session.close()
+
+
+async def get_read_db(request: Request) -> AsyncSession:
+    """Dependency function that yields read-only sessions, see ``read_session``."""
+    async with read_session(request) as session:
+        yield session
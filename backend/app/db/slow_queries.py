@@ -0,0 +1,258 @@
+"""
+Slow query log with sampled EXPLAIN plans.
+
+Statements that take longer than ``SLOW_QUERY_THRESHOLD_MS`` are kept in a
+bounded in-memory ring buffer with the shapes of their bound parameters
+(types and lengths, never values) and the service method that issued them.
+A sample of them, ``SLOW_QUERY_EXPLAIN_SAMPLE_RATE``, is explained in the
+background on a separate connection, in a transaction that is rolled back:
+
+- plain ``SELECT`` statements with ``EXPLAIN (ANALYZE, BUFFERS)``, which runs
+  them again,
+- anything else, including ``SELECT ... FOR UPDATE``, with plain ``EXPLAIN``,
+  which does not.
+
+At most one EXPLAIN runs at a time per worker process.
+"""
+import asyncio
+import itertools
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.metrics import current_service
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept per entry.
+MAX_STATEMENT_LENGTH = 10000
+# Most parameters whose shapes are kept per entry.
+MAX_PARAMETERS = 100
+
+_LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE
+)
+
+
+def parameter_shape(value: Any) -> str:
+    """Describe a bound value without revealing it, e.g. ``str[12]``."""
+    if value is None:
+        return "null"
+    name = type(value).__name__
+    if isinstance(value, (str, bytes, bytearray, list, tuple, dict)):
+        return f"{name}[{len(value)}]"
+    return name
+
+
+def parameters_shape(parameters: Any, executemany: bool) -> Any:
+    """
+    Describe the bound parameters of a statement.
+
+    Returns:
+        Shapes by name or position; for executemany, the number of rows and
+        the shape of the first
+    """
+    if executemany:
+        rows = list(parameters or ())
+        return {
+            "rows": len(rows),
+            "first": parameters_shape(rows[0], False) if rows else None,
+        }
+    if isinstance(parameters, dict):
+        return {
+            str(key): parameter_shape(value)
+            for key, value in itertools.islice(parameters.items(), MAX_PARAMETERS)
+        }
+    if isinstance(parameters, (list, tuple)):
+        return [parameter_shape(value) for value in parameters[:MAX_PARAMETERS]]
+    return parameter_shape(parameters)
+
+
+def can_analyze(statement: str) -> bool:
+    """Whether running a statement again for EXPLAIN ANALYZE is harmless."""
+    return (
+        statement.lstrip()[:6].upper() == "SELECT"
+        and not _LOCKING_CLAUSE.search(statement)
+    )
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements, newest last."""
+
+    def __init__(self, size: int):
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self.explaining = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        executemany: bool,
+        duration: float,
+        error: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Add a slow statement.
+
+        Returns:
+            The new entry
+        """
+        entry = {
+            "id": next(self._ids),
+            "recorded_at": datetime.now(timezone.utc),
+            "duration_ms": round(duration * 1000, 3),
+            "service": current_service.get(),
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "parameters": parameters_shape(parameters, executemany),
+            "executemany": executemany,
+            "error": error,
+            "explain": None,
+            "explain_analyzed": False,
+            "explain_error": None,
+        }
+        self.entries.append(entry)
+        return entry
+
+    def list(
+        self,
+        limit: int = 50,
+        service: Optional[str] = None,
+        min_duration_ms: float = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the slowest recent entries.
+
+        Args:
+            limit: Maximum number of entries
+            service: Only entries issued by this service method
+            min_duration_ms: Only entries at least this slow
+
+        Returns:
+            Entries, slowest first
+        """
+        entries = [
+            entry
+            for entry in self.entries
+            if (service is None or entry["service"] == service)
+            and entry["duration_ms"] >= min_duration_ms
+        ]
+        entries.sort(key=lambda entry: entry["duration_ms"], reverse=True)
+        return entries[:limit]
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self.entries.clear()
+
+    def schedule_explain(
+        self,
+        engine: AsyncEngine,
+        entry: Dict[str, Any],
+        statement: str,
+        parameters: Any,
+    ) -> None:
+        """Explain a statement in the background, unless one is running."""
+        if self.explaining:
+            entry["explain_error"] = "Skipped: another EXPLAIN was running"
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.explaining = True
+        task = loop.create_task(self._explain(engine, entry, statement, parameters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(
+        self,
+        engine: AsyncEngine,
+        entry: Dict[str, Any],
+        statement: str,
+        parameters: Any,
+    ) -> None:
+        analyze = can_analyze(statement)
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(slow_query_log=False)
+                transaction = await conn.begin()
+                try:
+                    await conn.exec_driver_sql(
+                        "SET LOCAL statement_timeout = "
+                        f"{int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}"
+                    )
+                    result = await conn.exec_driver_sql(
+                        f"EXPLAIN ({options}) {statement}", parameters
+                    )
+                    plan = result.scalar()
+                finally:
+                    await transaction.rollback()
+            entry["explain"] = orjson.loads(plan) if isinstance(plan, str) else plan
+            entry["explain_analyzed"] = analyze
+        except Exception as e:
+            logger.warning("EXPLAIN of slow query %s failed: %s", entry["id"], e)
+            entry["explain_error"] = str(e).splitlines()[0]
+        finally:
+            self.explaining = False
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
+
+
+def install(engine: AsyncEngine) -> None:
+    """
+    Record the slow statements of an engine.
+
+    Args:
+        engine: Async engine to hook
+    """
+    if not settings.SLOW_QUERY_LOG_ENABLED:
+        return
+    sync_engine = engine.sync_engine
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if duration < threshold:
+            return
+        if not conn.get_execution_options().get("slow_query_log", True):
+            return
+        entry = slow_query_log.record(statement, parameters, executemany, duration)
+        if not executemany and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            slow_query_log.schedule_explain(engine, entry, statement, parameters)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("slow_query_started") if conn is not None else None
+        if not stack:
+            return
+        if not conn.get_execution_options().get("slow_query_log", True):
+            stack.pop()
+            return
+        duration = time.perf_counter() - stack.pop()
+        # Statements cancelled by statement_timeout are the slowest of all.
+        if duration >= threshold and exception_context.statement is not None:
+            slow_query_log.record(
+                exception_context.statement,
+                exception_context.parameters,
+                bool(getattr(exception_context.execution_context, "executemany", False)),
+                duration,
+                error=str(exception_context.original_exception).splitlines()[0][:1000],
+            )
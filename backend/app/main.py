@@ -2,12 +2,16 @@
 Main FastAPI application module.
 """
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 
+from app.core.admission import AdmissionControlMiddleware
+from app.core import metrics, profiling
 from app.core.config import settings
 from app.api.v1.api import api_router as v1_router
+from app.db.session import replica_router
 
 # Create FastAPI app
 app = FastAPI(
@@ -34,7 +38,20 @@ of that solution.
 """,
 )
 
-# Set up CORS
+# Profile requests on demand (innermost, so only the request itself is timed)
+if profiling.enabled:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Shed load on expensive endpoints before it reaches a worker's routes
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
+# Record request metrics, including requests shed by admission control
+if metrics.enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Set up CORS (added last, so outermost: responses from the middleware
+# above, such as 429 and 503 from admission control, carry CORS headers too)
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
@@ -91,7 +108,38 @@ async def api_documentation():
     )
 
 # Mount API routes
-app.include_router(v1_router, prefix="/v1")
+app.include_router(v1_router, prefix=settings.API_V1_STR)
+
+
+@app.on_event("startup")
+async def start_search_indexer():
+    """Start draining the search outbox if enabled."""
+    if settings.SEARCH_INDEXER_ENABLED:
+        from app.services.search_index import SearchIndexer
+
+        app.state.search_indexer = SearchIndexer()
+        app.state.search_indexer.start()
+
+
+@app.on_event("startup")
+async def start_replica_checks():
+    """Start checking the lag of the read replicas, if any."""
+    replica_router.start()
+
+
+@app.on_event("shutdown")
+async def stop_search_indexer():
+    """Stop the search indexer, if running."""
+    indexer = getattr(app.state, "search_indexer", None)
+    if indexer is not None:
+        await indexer.stop()
+
+
+@app.on_event("shutdown")
+async def stop_replica_checks():
+    """Stop checking the read replicas."""
+    await replica_router.stop()
+
 
 # Health check endpoint
 @app.get("/health-check", tags=["System"])
@@ -99,8 +147,21 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "ok"}
 
-# Serve static files for API documentation
-app.mount("/api-docs", StaticFiles(directory="public/v1", html=True), name="api-docs")
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus metrics endpoint."""
+    body = metrics.render_latest()
+    if body is None:
+        return Response("Metrics are disabled\n", status_code=404, media_type="text/plain")
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
+# Serve static files for API documentation (if deployed next to the app;
+# a worker must start without them)
+app.mount(
+    "/api-docs",
+    StaticFiles(directory="public/v1", html=True, check_dir=False),
+    name="api-docs",
+)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,46 @@
+"""
+Pydantic schemas for admin endpoints.
+"""
+from datetime import datetime
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class SlowQuery(BaseModel):
+    """A statement that took longer than the slow query threshold."""
+    id: int = Field(..., description="Unique identifier of the entry")
+    recorded_at: datetime = Field(..., description="When the statement finished")
+    duration_ms: float = Field(..., description="Execution time in milliseconds")
+    service: str = Field(..., description="Service method that issued the statement")
+    statement: str = Field(..., description="SQL text, with parameter placeholders")
+    parameters: Any = Field(
+        None, description="Types and lengths of the bound parameters"
+    )
+    executemany: bool = Field(..., description="Whether it ran for many rows")
+    error: Optional[str] = Field(None, description="Error the statement raised")
+    explain: Any = Field(None, description="EXPLAIN output in JSON format, if sampled")
+    explain_analyzed: bool = Field(
+        ..., description="Whether the plan includes ANALYZE and BUFFERS timings"
+    )
+    explain_error: Optional[str] = Field(None, description="Why EXPLAIN failed")
+
+
+class SlowQueryLog(BaseModel):
+    """Recent slow statements of this worker process."""
+    threshold_ms: float = Field(..., description="Slow query threshold")
+    explain_sample_rate: float = Field(
+        ..., description="Fraction of slow statements explained"
+    )
+    items: List[SlowQuery] = Field(..., description="Entries, slowest first")
+
+
+class ProfileInfo(BaseModel):
+    """A stored request profile."""
+    id: str = Field(..., description="Profile ID, as sent in X-Profile-Id")
+    created_at: datetime = Field(..., description="When the request finished")
+    method: str = Field(..., description="HTTP method")
+    path: str = Field(..., description="Request path")
+    route: str = Field(..., description="Route template")
+    status: int = Field(..., description="Response status code")
+    duration_ms: float = Field(..., description="Request duration in milliseconds")
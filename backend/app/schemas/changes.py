@@ -0,0 +1,84 @@
+"""
+Pydantic schemas for the contribution change feed and history.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ChangeCursor(NamedTuple):
+    """
+    Position in the change feed: the last event's transaction and id.
+    
+    Written as ``<txid>-<id>``; ``0`` is the start of the feed. A plain id,
+    as cursors were before, has no transaction (``txid`` is None).
+    """
+    txid: Optional[int]
+    id: int
+    
+    @classmethod
+    def parse(cls, value: str) -> "ChangeCursor":
+        """
+        Parse a cursor.
+        
+        Raises:
+            ValueError: If the value is not a cursor
+        """
+        txid, dash, id = value.strip().rpartition("-")
+        if dash and not txid:
+            raise ValueError(f"Invalid cursor '{value}'")
+        cursor = cls(int(txid) if dash else None, int(id))
+        if cursor.id < 0 or (cursor.txid is not None and cursor.txid < 0):
+            raise ValueError(f"Invalid cursor '{value}'")
+        if cursor.id == 0 and cursor.txid is None:
+            return cls(0, 0)
+        return cursor
+    
+    def __str__(self) -> str:
+        if not self.id and not self.txid:
+            return "0"
+        if self.txid is None:
+            return str(self.id)
+        return f"{self.txid}-{self.id}"
+
+
+class ChangeEvent(BaseModel):
+    """A single change to a contribution."""
+    cursor: str = Field(..., description="Position of this event in the feed")
+    contribution_id: int = Field(..., description="ID of the changed contribution")
+    action: str = Field(..., description="What happened, e.g. create or update")
+    created_at: datetime = Field(..., description="When the change was made")
+
+    class Config:
+        orm_mode = True
+
+
+class ChangeFeed(BaseModel):
+    """A page of change events."""
+    events: List[ChangeEvent] = Field(..., description="Events after the cursor")
+    next_cursor: str = Field(
+        ..., description="Cursor to pass on the next request to resume"
+    )
+
+
+class HistoryEntry(BaseModel):
+    """A single entry of a contribution's history."""
+    id: int = Field(..., description="Unique identifier of the entry")
+    action: str = Field(..., description="What happened, e.g. create or update")
+    user_id: int = Field(..., description="ID of the user who made the change")
+    created_at: datetime = Field(..., description="When the change was made")
+    changes: Optional[Dict[str, Any]] = Field(
+        None, description="What changed, if requested"
+    )
+
+    class Config:
+        orm_mode = True
+
+
+class HistoryPage(BaseModel):
+    """A page of history entries, newest first."""
+    items: List[HistoryEntry] = Field(..., description="History entries")
+    total: int = Field(..., description="Total number of entries")
+    page: int = Field(..., description="Page number")
+    per_page: int = Field(..., description="Items per page")
@@ -12,6 +12,15 @@ class RepositoryEnum(str, Enum):
     MAGIC = "MagIC"
 
 
+class ContributionStatus(str, Enum):
+    """Status of a contribution."""
+    DRAFT = "draft"
+    SUBMITTED = "submitted"
+    PUBLISHED = "published"
+    REJECTED = "rejected"
+    ARCHIVED = "archived"
+
+
 class DataType(str, Enum):
     """Data types for contributions."""
     SAMPLE = "sample"
@@ -34,6 +43,9 @@ class DataCreate(BaseModel):
     metadata: Optional[Dict[str, Any]] = Field(
         None, description="Additional metadata"
     )
+    version_of: Optional[int] = Field(
+        None, description="ID of a contribution this is a new version of"
+    )
 
 
 class DataUpdate(BaseModel):
@@ -44,12 +56,21 @@ class DataUpdate(BaseModel):
     )
 
 
-class DataInDB(BaseModel):
-    """Schema for data in the database."""
+class DataEnvelope(BaseModel):
+    """Fields of data in the database, without the data document itself."""
     id: int = Field(..., description="Unique identifier")
     repository: str = Field(..., description="Repository name")
     data_type: str = Field(..., description="Type of the data")
-    data: Dict[str, Any] = Field(..., description="The actual data")
+    revision: int = Field(1, description="Revision, also sent as the ETag")
+    content_hash: Optional[str] = Field(
+        None, description="SHA-256 of the canonical data"
+    )
+    lineage_id: Optional[int] = Field(
+        None, description="ID of the first version of this data"
+    )
+    is_latest: bool = Field(
+        False, description="Whether this is the latest published version"
+    )
     metadata: Dict[str, Any] = Field(
         default_factory=dict, description="Additional metadata"
     )
@@ -65,15 +86,24 @@ class DataInDB(BaseModel):
         orm_mode = True
 
 
-class DataSearchResult(BaseModel):
-    """Schema for search results."""
+class DataInDB(DataEnvelope):
+    """Schema for data in the database."""
+    data: Dict[str, Any] = Field(..., description="The actual data")
+
+
+class DataSearchEnvelope(BaseModel):
+    """Fields of search results, without the items."""
     total: int = Field(..., description="Total number of results")
-    items: List[DataInDB] = Field(..., description="List of matching items")
     aggregations: Optional[Dict[str, Any]] = Field(
         None, description="Aggregation results if any"
     )
 
 
+class DataSearchResult(DataSearchEnvelope):
+    """Schema for search results."""
+    items: List[DataInDB] = Field(..., description="List of matching items")
+
+
 class DataValidationResult(BaseModel):
     """Schema for validation results."""
     valid: bool = Field(..., description="Whether the data is valid")
@@ -86,3 +116,69 @@ class DataValidationResult(BaseModel):
     data: Optional[Dict[str, Any]] = Field(
         None, description="Processed data if validation was successful"
     )
+
+
+class DataTableList(BaseModel):
+    """Schema for the columnar tables of published data."""
+    tables: List[str] = Field(..., description="Names of the tables")
+
+
+class DataTableEnvelope(BaseModel):
+    """Fields of a range of rows of a columnar table, without the rows."""
+    table: str = Field(..., description="Name of the table")
+    total: int = Field(..., description="Total number of rows")
+    offset: int = Field(..., description="Index of the first row returned")
+    columns: List[str] = Field(..., description="Names of the columns returned")
+
+
+class DataTablePage(DataTableEnvelope):
+    """Schema for a range of rows of a columnar table."""
+    rows: List[Dict[str, Any]] = Field(..., description="Rows, by column name")
+
+
+class BulkStatusMode(str, Enum):
+    """How a bulk status change treats contributions it cannot change."""
+    ATOMIC = "atomic"  # Change none of them
+    BEST_EFFORT = "best_effort"  # Change the others
+
+
+class BulkStatusItem(BaseModel):
+    """A contribution to change the status of."""
+    id: int = Field(..., description="ID of the contribution")
+    revision: Optional[int] = Field(
+        None, description="Revision the change is based on, if it must not have changed"
+    )
+
+
+class BulkStatusChange(BaseModel):
+    """Schema for changing the status of many contributions."""
+    status: ContributionStatus = Field(..., description="New status")
+    items: List[BulkStatusItem] = Field(..., description="Contributions to change")
+    comment: Optional[str] = Field(None, description="Comment for the history")
+    mode: BulkStatusMode = Field(
+        BulkStatusMode.ATOMIC,
+        description="Change all contributions or none (atomic), or all that can be "
+        "changed (best_effort)",
+    )
+
+
+class BulkStatusItemResult(BaseModel):
+    """Outcome of a bulk status change for one contribution."""
+    id: int = Field(..., description="ID of the contribution")
+    result: str = Field(
+        ...,
+        description="changed, unchanged (already in the status), not_found, "
+        "conflict (at another revision) or skipped (atomic change not applied)",
+    )
+    revision: Optional[int] = Field(None, description="Current revision")
+
+
+class BulkStatusResult(BaseModel):
+    """Schema for the outcome of a bulk status change."""
+    applied: bool = Field(
+        ..., description="False if an atomic change was rejected and nothing changed"
+    )
+    changed: int = Field(..., description="Number of contributions changed")
+    results: List[BulkStatusItemResult] = Field(
+        ..., description="Outcome per contribution, in request order"
+    )
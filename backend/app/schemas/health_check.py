@@ -1,7 +1,8 @@
 """
 Pydantic schemas for health check endpoints.
 """
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -18,3 +19,59 @@ class HealthCheckResponse(BaseModel):
                 "database": "connected"
             }
         }
+
+
+class SearchIndexStatus(BaseModel):
+    """Response model for the search index lag endpoint."""
+    status: str = Field(..., description="Status of the search indexer")
+    pending: int = Field(..., description="Outbox entries waiting to be indexed")
+    failed: int = Field(..., description="Outbox entries that exhausted their retries")
+    oldest_pending_at: Optional[datetime] = Field(
+        None, description="Creation time of the oldest pending entry"
+    )
+    lag_seconds: float = Field(..., description="Age of the oldest pending entry")
+
+
+class AdmissionClassStatus(BaseModel):
+    """Queue depth and counters of an endpoint class."""
+    active: int = Field(..., description="Requests running")
+    queued: int = Field(..., description="Requests waiting for a slot")
+    concurrency: int = Field(..., description="Requests allowed to run at once")
+    queue_size: int = Field(..., description="Requests allowed to wait")
+    users: int = Field(..., description="Clients with requests running or waiting")
+    admitted: int = Field(..., description="Requests admitted since startup")
+    rejected: Dict[str, int] = Field(
+        ..., description="Requests rejected since startup, by reason"
+    )
+    average_duration: float = Field(
+        ..., description="Moving average of request duration in seconds"
+    )
+
+
+class AdmissionStatus(BaseModel):
+    """Response model for the admission control endpoint."""
+    status: str = Field(..., description="Status of admission control")
+    classes: Dict[str, AdmissionClassStatus] = Field(
+        ..., description="Stats of this worker process by endpoint class"
+    )
+
+
+class ReplicaStatus(BaseModel):
+    """Health and lag of a read replica."""
+    name: str = Field(..., description="Replica URL without the password")
+    healthy: bool = Field(..., description="Whether the last check succeeded")
+    usable: bool = Field(
+        ..., description="Whether reads are routed to it (healthy and not lagging)"
+    )
+    lag_seconds: Optional[float] = Field(None, description="Replay lag at the last check")
+    checked_at: Optional[datetime] = Field(None, description="Time of the last check")
+    error: Optional[str] = Field(None, description="Error of the last failure")
+
+
+class ReplicasStatus(BaseModel):
+    """Response model for the read replicas endpoint."""
+    status: str = Field(..., description="Status of read routing")
+    max_lag_seconds: float = Field(
+        ..., description="Most replay lag before reads fall back to the primary"
+    )
+    replicas: List[ReplicaStatus] = Field(..., description="State of each replica")
@@ -0,0 +1,41 @@
+"""
+Pydantic schemas for the per-level search tables.
+"""
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class SearchRowEnvelope(BaseModel):
+    """Fields of a search row, without the row data itself."""
+    id: int = Field(..., description="Unique identifier of the search row")
+    contribution_id: int = Field(..., description="ID of the source contribution")
+    repository: str = Field(..., description="Repository name")
+    row_index: int = Field(..., description="Position of the row in its table")
+    is_latest: bool = Field(
+        False, description="Whether the contribution is the latest version"
+    )
+
+    class Config:
+        orm_mode = True
+
+
+class SearchRow(SearchRowEnvelope):
+    """A row of one search level."""
+    data: Dict[str, Any] = Field(..., description="The row data")
+
+
+class SearchRowPageEnvelope(BaseModel):
+    """Fields of a page of search rows, without the rows."""
+    total: Optional[int] = Field(
+        None, description="Total number of matching rows, if requested"
+    )
+    has_more: bool = Field(..., description="Whether more pages follow")
+    aggregations: Optional[Dict[str, Any]] = Field(
+        None, description="Aggregation results if any"
+    )
+
+
+class SearchRowResult(SearchRowPageEnvelope):
+    """Schema for search results at one level."""
+    items: List[SearchRow] = Field(..., description="List of matching rows")
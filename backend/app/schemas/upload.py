@@ -0,0 +1,29 @@
+"""
+Pydantic schemas for resumable uploads.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class UploadStatusResponse(BaseModel):
+    """State of a resumable upload."""
+    id: str = Field(..., description="Unique identifier of the upload")
+    status: str = Field(
+        ..., description="uploading, processing, completed or failed"
+    )
+    upload_length: int = Field(..., description="Total size of the file in bytes")
+    upload_offset: int = Field(
+        ..., description="Bytes received from the start of the file without gaps"
+    )
+    received: List[List[int]] = Field(
+        ..., description="Byte ranges received, as [start, end) pairs"
+    )
+    contribution_id: Optional[int] = Field(
+        None, description="ID of the contribution created from the upload"
+    )
+    error: Optional[str] = Field(None, description="Why processing failed")
+    expires_at: datetime = Field(
+        ..., description="When an unfinished upload is discarded"
+    )
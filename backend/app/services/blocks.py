@@ -0,0 +1,500 @@
+"""
+Service layer for content-addressed blocks of contribution documents.
+
+A block is a top-level table of a document, identified by its canonical
+SHA-256 (the per-table hashes of app.core.hashing). A new version of a
+contribution usually repeats most tables of the previous one byte for byte,
+so work is done once per block instead of once per document:
+
+- a block's summary (row count and columns) is computed when it is first
+  seen, and its validation messages when it is first validated; both are
+  kept in ``content_blocks``, where validating a new document adds its
+  blocks without references,
+- offloaded documents are stored block by block (see app.services.offload),
+  so a new version only compresses and uploads the tables that changed,
+- the columnar cache keeps one Arrow file per block (see
+  app.services.columnar).
+
+``ref_count`` is the number of references from contribution documents. It
+is changed in the transaction that changes a document's table hashes, so
+it matches the committed documents. Blocks that no document referred to
+for ``BLOCK_GC_GRACE_HOURS`` are deleted with their blobs by ``collect``.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import data_models
+from app.core.config import settings
+from app.core.hashing import canonical_json, content_hashes
+from app.core.storage import get_blob_store
+from app.db.models.block import ContentBlock
+from app.db.models.contribution import Contribution
+
+logger = logging.getLogger(__name__)
+
+# Blocks deleted per transaction by the collector
+COLLECT_BATCH_SIZE = 1000
+
+
+def table_columns(value: Any) -> Optional[List[str]]:
+    """
+    Get the columns of a document table.
+
+    Tables are non-empty lists of row dicts, or, for measurements,
+    ``{"columns": [...], "rows": [[...], ...]}``.
+
+    Returns:
+        Column names in order of appearance, None if the value is not a table
+    """
+    if isinstance(value, dict) and isinstance(value.get("columns"), list):
+        return [str(column) for column in value["columns"]]
+    if (
+        isinstance(value, list)
+        and value
+        and all(isinstance(row, dict) for row in value)
+    ):
+        return list(dict.fromkeys(str(key) for row in value for key in row))
+    return None
+
+
+def summarize(value: Any) -> Dict[str, Any]:
+    """Summarize a block: its row count and columns."""
+    if isinstance(value, dict) and isinstance(value.get("columns"), list):
+        rows = len(value.get("rows") or [])
+    elif isinstance(value, list):
+        rows = len(value)
+    else:
+        rows = 0
+    return {"rows": rows, "columns": table_columns(value)}
+
+
+def _new_block(block_hash: str, value: Any, ref_count: int) -> Dict[str, Any]:
+    return {
+        "hash": block_hash,
+        "ref_count": ref_count,
+        "size": len(canonical_json(value)),
+        "summary": summarize(value),
+    }
+
+
+async def _insert(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Insert blocks, adding to the count of any inserted concurrently."""
+    if not rows:
+        return
+    stmt = insert(ContentBlock).values(rows)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ContentBlock.hash],
+            set_={
+                "ref_count": ContentBlock.ref_count + stmt.excluded.ref_count,
+                "released_at": None,
+            },
+        )
+    )
+
+
+async def retain(
+    db: AsyncSession,
+    table_hashes: Optional[Mapping[str, str]],
+    values: Mapping[str, Any],
+    previous: Optional[Mapping[str, str]] = None,
+) -> None:
+    """
+    Move a document's block references from its previous tables to new ones.
+
+    Only the counts of blocks that changed are updated. Blocks seen for the
+    first time are summarized and added; known blocks are not looked at.
+    New blocks are added without references before any block is locked,
+    and the counts are then updated in hash order, so writers of the same
+    blocks wait for each other instead of deadlocking.
+
+    Args:
+        db: Database session, in the transaction that writes the document
+        table_hashes: New table hashes of the document, None if it has none
+        values: Tables of the new document, by name; must include every
+            table whose block may be new
+        previous: Table hashes the document had, None for a new document
+    """
+    deltas = Counter((table_hashes or {}).values())
+    deltas.subtract(Counter((previous or {}).values()))
+    deltas = {block: delta for block, delta in sorted(deltas.items()) if delta}
+    if not deltas:
+        return
+
+    names = {block: table for table, block in (table_hashes or {}).items()}
+    added = [block for block, delta in deltas.items() if delta > 0]
+    known = await summaries(db, added)
+    new_blocks = [
+        {**_new_block(block, values[names[block]], 0), "released_at": func.now()}
+        for block in added
+        if block not in known
+    ]
+    if new_blocks:
+        await db.execute(
+            insert(ContentBlock)
+            .values(new_blocks)
+            .on_conflict_do_nothing(index_elements=[ContentBlock.hash])
+        )
+
+    new_count = ContentBlock.ref_count + case(deltas, value=ContentBlock.hash)
+    # An UPDATE locks rows in scan order, which is not the same for every
+    # writer; the subquery locks them in hash order first
+    locked = (
+        select(ContentBlock.hash)
+        .where(ContentBlock.hash.in_(deltas))
+        .order_by(ContentBlock.hash)
+        .with_for_update()
+    )
+    updated = set(
+        (
+            await db.execute(
+                update(ContentBlock)
+                .where(ContentBlock.hash.in_(locked))
+                .values(
+                    ref_count=new_count,
+                    released_at=case(
+                        (
+                            new_count <= 0,
+                            func.coalesce(ContentBlock.released_at, func.now()),
+                        ),
+                        else_=None,
+                    ),
+                )
+                .returning(ContentBlock.hash)
+                .execution_options(synchronize_session=False)
+            )
+        ).scalars()
+    )
+
+    # Blocks collected since they were looked up are added anew
+    await _insert(
+        db,
+        [
+            _new_block(block, values[names[block]], deltas[block])
+            for block in added
+            if block not in updated
+        ],
+    )
+
+
+async def register(
+    db: AsyncSession, table_hashes: Mapping[str, str], values: Mapping[str, Any]
+) -> int:
+    """
+    Add blocks that are missing from the catalog, without references.
+
+    Used when catching up on documents written before blocks existed; their
+    references are counted by ``recount``.
+
+    Returns:
+        Number of blocks added
+    """
+    known = await summaries(db, table_hashes.values())
+    missing = set(table_hashes.values()) - set(known)
+    names = {block: table for table, block in table_hashes.items()}
+    await _insert(
+        db, [_new_block(block, values[names[block]], 0) for block in sorted(missing)]
+    )
+    return len(missing)
+
+
+async def recount(db: AsyncSession) -> int:
+    """
+    Recount the references of every block from the contribution documents.
+
+    Writers of documents wait while the catalog is locked, so run it off
+    hours, after ``register`` was called for every document.
+
+    Returns:
+        Number of blocks whose count was corrected
+    """
+    await db.execute(text("LOCK TABLE content_blocks IN EXCLUSIVE MODE"))
+    references = func.jsonb_each_text(Contribution.table_hashes).table_valued(
+        "key", "value"
+    )
+    counts = (
+        select(references.c.value.label("hash"), func.count().label("n"))
+        .select_from(Contribution, references)
+        .group_by(references.c.value)
+        .subquery()
+    )
+    counted = await db.execute(
+        update(ContentBlock)
+        .where(
+            ContentBlock.hash == counts.c.hash,
+            ContentBlock.ref_count != counts.c.n,
+        )
+        .values(ref_count=counts.c.n, released_at=None)
+        .returning(ContentBlock.id)
+        .execution_options(synchronize_session=False)
+    )
+    unreferenced = await db.execute(
+        update(ContentBlock)
+        .where(
+            ContentBlock.ref_count != 0,
+            ~select(counts.c.hash).where(counts.c.hash == ContentBlock.hash).exists(),
+        )
+        .values(ref_count=0, released_at=func.now())
+        .returning(ContentBlock.id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(counted.all()) + len(unreferenced.all())
+
+
+async def summaries(
+    db: AsyncSession, hashes: Iterable[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Get the summaries of known blocks, by hash."""
+    hashes = sorted(set(hashes))
+    if not hashes:
+        return {}
+    result = await db.execute(
+        select(ContentBlock.hash, ContentBlock.summary).where(
+            ContentBlock.hash.in_(hashes)
+        )
+    )
+    return dict(result.all())
+
+
+async def stored_keys(db: AsyncSession, hashes: Iterable[str]) -> Dict[str, str]:
+    """Get the blob keys of blocks that were stored, by hash."""
+    hashes = sorted(set(hashes))
+    if not hashes:
+        return {}
+    result = await db.execute(
+        select(ContentBlock.hash, ContentBlock.key).where(
+            ContentBlock.hash.in_(hashes), ContentBlock.key.is_not(None)
+        )
+    )
+    return dict(result.all())
+
+
+async def set_key(db: AsyncSession, block_hash: str, key: str) -> None:
+    """Record that a block was stored as a blob."""
+    await db.execute(
+        update(ContentBlock)
+        .where(ContentBlock.hash == block_hash)
+        .values(key=key)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _model_columns() -> Tuple[str, Dict[str, Set[str]]]:
+    """Get the latest data model version and the columns of its tables."""
+    try:
+        version = data_models.get_versions()[-1]
+        tables = data_models.get_data_model(version).get("tables") or {}
+    except (FileNotFoundError, IndexError):
+        # Without a snapshot only the structure of tables is checked
+        return "", {}
+    return version, {
+        table: set(definition.get("columns") or {})
+        for table, definition in tables.items()
+    }
+
+
+def validate_table(
+    table: str, value: Any, model_columns: Mapping[str, Set[str]]
+) -> Dict[str, List[str]]:
+    """
+    Validate one table of a document.
+
+    Args:
+        table: Table name
+        value: The table
+        model_columns: Columns of each data model table, empty to skip the
+            data model checks
+
+    Returns:
+        Dict of "errors" and "warnings" messages
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    columns = table_columns(value)
+    if value == [] or (columns is not None and not summarize(value)["rows"]):
+        warnings.append(f"No data values were found in the {table} table.")
+    elif columns is None:
+        errors.append(f"The {table} table is not a list of rows.")
+    if isinstance(value, dict) and columns is not None:
+        ragged = sum(
+            1
+            for row in value.get("rows") or []
+            if not isinstance(row, list) or len(row) != len(columns)
+        )
+        if ragged:
+            errors.append(
+                f"{ragged} rows of the {table} table do not have one value per column."
+            )
+    if model_columns:
+        if table not in model_columns:
+            warnings.append(f"The {table} table is not in the data model.")
+        elif columns:
+            known = model_columns[table]
+            unknown = [column for column in columns if column not in known]
+            if unknown:
+                warnings.append(
+                    f"Unknown columns in the {table} table: {', '.join(unknown)}."
+                )
+    return {"errors": errors, "warnings": warnings}
+
+
+Messages = Tuple[List[Dict[str, str]], List[Dict[str, str]]]
+
+NOT_AN_OBJECT: Messages = (
+    [{"table": "", "message": "The data is not an object of tables."}],
+    [],
+)
+
+
+def _flatten(by_table: Iterable[Tuple[str, Dict[str, List[str]]]]) -> Messages:
+    errors: List[Dict[str, str]] = []
+    warnings: List[Dict[str, str]] = []
+    for table, messages in by_table:
+        errors += [{"table": table, "message": text} for text in messages["errors"]]
+        warnings += [
+            {"table": table, "message": text} for text in messages["warnings"]
+        ]
+    return errors, warnings
+
+
+def validate_document(data: Any) -> Messages:
+    """
+    Validate every table of a document against the latest data model,
+    without the catalog.
+
+    Returns:
+        Tuple of (errors, warnings), each a list of ``{"table", "message"}``
+    """
+    if not isinstance(data, dict):
+        return NOT_AN_OBJECT
+    _, model_columns = _model_columns()
+    return _flatten(
+        (table, validate_table(table, data[table], model_columns))
+        for table in sorted(data)
+    )
+
+
+async def validate(db: AsyncSession, data: Any) -> Messages:
+    """
+    Validate a document table by table against the latest data model.
+
+    Messages of tables whose block was validated before are read from the
+    catalog; those of other tables are saved there for next time. Blocks
+    that are not in the catalog yet are added without references, like
+    released ones, so they are collected unless a document takes them up.
+
+    Args:
+        db: Database session; saved messages are committed by the caller
+        data: Contribution document
+
+    Returns:
+        Tuple of (errors, warnings), each a list of ``{"table", "message"}``
+    """
+    if not isinstance(data, dict):
+        return NOT_AN_OBJECT
+    _, table_hashes = content_hashes(data)
+    version, model_columns = _model_columns()
+    hashes = sorted(set(table_hashes.values()))
+    cached = dict(
+        (
+            await db.execute(
+                select(ContentBlock.hash, ContentBlock.validation).where(
+                    ContentBlock.hash.in_(hashes)
+                )
+            )
+        ).all()
+    )
+
+    by_table = []
+    # Newly validated messages by block, and a table of each new block
+    validated: Dict[str, Dict[str, Any]] = {}
+    new_tables: Dict[str, str] = {}
+    for table, block in sorted(table_hashes.items()):
+        entry = f"{table}@{version}"
+        messages = (cached.get(block) or {}).get(entry)
+        if messages is None:
+            messages = validate_table(table, data[table], model_columns)
+            validated.setdefault(block, {})[entry] = messages
+            if block not in cached:
+                new_tables.setdefault(block, table)
+        by_table.append((table, messages))
+
+    merged = func.coalesce(ContentBlock.validation, func.jsonb_build_object())
+    for block, entries in validated.items():
+        if block in cached:
+            await db.execute(
+                update(ContentBlock)
+                .where(ContentBlock.hash == block)
+                .values(validation=merged.op("||")(literal(entries, JSONB)))
+                .execution_options(synchronize_session=False)
+            )
+    if new_tables:
+        stmt = insert(ContentBlock).values(
+            [
+                {
+                    **_new_block(block, data[table], 0),
+                    "released_at": func.now(),
+                    "validation": validated[block],
+                }
+                for block, table in sorted(new_tables.items())
+            ]
+        )
+        # A block added concurrently keeps its count; only messages are added
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ContentBlock.hash],
+                set_={"validation": merged.op("||")(stmt.excluded.validation)},
+            )
+        )
+    return _flatten(by_table)
+
+
+async def collect(db: AsyncSession, dry_run: bool = False) -> int:
+    """
+    Delete blocks that no document referred to for ``BLOCK_GC_GRACE_HOURS``,
+    with their blobs.
+
+    Blocks are locked while their blobs are deleted, so a writer that takes
+    up a block again either gets to it first or waits and then adds it anew,
+    storing its blob again if needed.
+
+    Returns:
+        Number of blocks deleted (or that would be, on a dry run)
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.BLOCK_GC_GRACE_HOURS)
+    collectable = (ContentBlock.ref_count <= 0, ContentBlock.released_at < cutoff)
+    if dry_run:
+        return (
+            await db.execute(select(func.count(ContentBlock.id)).where(*collectable))
+        ).scalar_one()
+
+    blobs = get_blob_store()
+    deleted = 0
+    while True:
+        batch = (
+            await db.execute(
+                select(ContentBlock.id, ContentBlock.key)
+                .where(*collectable)
+                .order_by(ContentBlock.id)
+                .limit(COLLECT_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not batch:
+            break
+        for _, key in batch:
+            if key is not None:
+                await blobs.delete(key)
+        await db.execute(
+            delete(ContentBlock).where(ContentBlock.id.in_([id for id, _ in batch]))
+        )
+        await db.commit()
+        deleted += len(batch)
+        logger.info("Collected %d unreferenced blocks", len(batch))
+    return deleted
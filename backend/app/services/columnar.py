@@ -0,0 +1,319 @@
+"""
+Service layer for the columnar cache of published contribution tables.
+
+Each table of a published contribution is materialized once as an Arrow IPC
+file (Feather V2), named after the table's content hash (see
+app.services.blocks): ``COLUMNAR_CACHE_DIR/<ab>/<table hash>.arrow``. A new
+version of a contribution reuses the files of the tables it shares with the
+previous one. Readers memory-map the files: selecting columns and slicing
+rows only moves pointers into the mapping, and nothing is decoded into
+Python objects unless a client asks for JSON. The same files are offered
+for download, and load directly with ``pandas.read_feather`` or
+``pyarrow.feather.read_table``.
+
+Tables are materialized when a contribution is published, and on the first
+read of a table that is missing, e.g. on a new host. Documents without
+table hashes have no tables. Requires pyarrow (the ``arrow`` extra), which
+is imported on first use.
+"""
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.core.config import settings
+from app.db.models.contribution import Contribution
+from app.db.session import AsyncSessionLocal
+from app.services import blocks, offload
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_open_tables: "OrderedDict[Path, pa.Table]" = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """Whether the columnar cache is enabled and pyarrow is installed."""
+    return COLUMNAR_AVAILABLE and settings.COLUMNAR_CACHE_ENABLED
+
+
+def table_path(block_hash: str) -> Path:
+    """Get the file of a table, by its content hash."""
+    return Path(settings.COLUMNAR_CACHE_DIR) / block_hash[:2] / f"{block_hash}.arrow"
+
+
+def list_tables(contribution: Contribution) -> List[str]:
+    """List the materialized tables of a contribution."""
+    return sorted(
+        table
+        for table, block in (contribution.table_hashes or {}).items()
+        if table_path(block).is_file()
+    )
+
+
+async def needs_materializing(db: AsyncSession, contribution: Contribution) -> bool:
+    """
+    Whether a table of a contribution may be missing its file.
+
+    Block summaries tell which values are tables; values whose block is not
+    in the catalog may be, so they are looked for too.
+    """
+    table_hashes = contribution.table_hashes or {}
+    known = await blocks.summaries(db, table_hashes.values())
+    return any(
+        not table_path(block).is_file()
+        for block in table_hashes.values()
+        if block not in known or known[block].get("columns") is not None
+    )
+
+
+def _column(values: List[Any]) -> "pa.Array":
+    """Build a column, as text if its values have no common Arrow type."""
+    import pyarrow as pa
+
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(
+            [
+                None if value is None
+                else value if isinstance(value, str)
+                else json.dumps(value)
+                for value in values
+            ],
+            type=pa.string(),
+        )
+
+
+def _to_arrow(value: Any) -> Optional["pa.Table"]:
+    """Convert a document table to Arrow, None if it is not a table."""
+    import pyarrow as pa
+
+    columns = blocks.table_columns(value)
+    if columns is None:
+        return None
+    if isinstance(value, dict):
+        # Columns and rows, as measurements may be stored
+        rows = value.get("rows") or []
+        cells = [
+            [row[index] if index < len(row) else None for row in rows]
+            for index in range(len(columns))
+        ]
+    else:
+        cells = [[row.get(column) for row in value] for column in columns]
+    # Empty strings mean "no value" in MagIC text files
+    cells = [[None if cell == "" else cell for cell in column] for column in cells]
+    return pa.table({name: _column(column) for name, column in zip(columns, cells)})
+
+
+def write_table(block_hash: str, value: Any) -> bool:
+    """
+    Write a table as an Arrow IPC file, unless it already was.
+
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partial file.
+
+    Args:
+        block_hash: Content hash of the table
+        value: The table
+
+    Returns:
+        Whether the value is a table (and so has a file)
+    """
+    import pyarrow as pa
+
+    target = table_path(block_hash)
+    if target.is_file():
+        return True
+    table = _to_arrow(value)
+    if table is None:
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, partial = tempfile.mkstemp(prefix=f".{block_hash}.", dir=target.parent)
+    os.close(fd)
+    try:
+        with pa.OSFile(partial, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
+    return True
+
+
+def write_tables(data: Dict[str, Any], table_hashes: Dict[str, str]) -> List[str]:
+    """
+    Write the tables of a document that were not written before.
+
+    Returns:
+        Names of the document's tables
+    """
+    return sorted(
+        table
+        for table, block in table_hashes.items()
+        if write_table(block, data.get(table))
+    )
+
+
+async def materialize(contribution: Contribution, data: Any) -> List[str]:
+    """
+    Write the tables of a contribution, unless they already were.
+
+    Args:
+        contribution: Published contribution
+        data: Its document
+
+    Returns:
+        Names of the tables
+    """
+    if not contribution.table_hashes or not isinstance(data, dict):
+        return []
+    return await asyncio.to_thread(write_tables, data, contribution.table_hashes)
+
+
+async def publish(contribution: Contribution) -> None:
+    """
+    Materialize the tables of a contribution that was just published.
+
+    A failure is logged rather than raised, since the status change was
+    already committed; the tables are then written on first read.
+    """
+    if not enabled():
+        return
+    try:
+        await materialize(contribution, await offload.load_data(contribution))
+    except Exception:
+        logger.exception(
+            "Could not materialize the tables of contribution %s", contribution.id
+        )
+
+
+async def publish_many(repository: str, contribution_ids: List[int]) -> None:
+    """
+    Materialize the tables of contributions that were published together.
+
+    Runs after the response, with its own database session. Documents are
+    only read for contributions with tables missing their files.
+
+    Args:
+        repository: Repository of the contributions
+        contribution_ids: IDs of the contributions
+    """
+    if not enabled():
+        return
+    async with AsyncSessionLocal() as db:
+        for contribution_id in contribution_ids:
+            contribution = (
+                await db.execute(
+                    select(Contribution)
+                    .options(defer(Contribution.data))
+                    .where(
+                        Contribution.id == contribution_id,
+                        Contribution.repository == repository,
+                    )
+                )
+            ).scalar_one_or_none()
+            if contribution is None or not await needs_materializing(db, contribution):
+                continue
+            await db.refresh(contribution, ["data"])
+            await publish(contribution)
+            db.expunge(contribution)
+
+
+def open_table(path: Path) -> "pa.Table":
+    """
+    Memory-map a table file.
+
+    The last ``COLUMNAR_OPEN_TABLES`` tables stay mapped; a table's buffers
+    point into its mapping, which is unmapped once nothing uses them.
+
+    Raises:
+        FileNotFoundError: If the table was not materialized
+    """
+    import pyarrow as pa
+
+    with _open_lock:
+        table = _open_tables.get(path)
+        if table is not None:
+            _open_tables.move_to_end(path)
+            return table
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    with _open_lock:
+        _open_tables[path] = table
+        while len(_open_tables) > settings.COLUMNAR_OPEN_TABLES:
+            _open_tables.popitem(last=False)
+    return table
+
+
+def select(
+    table: "pa.Table",
+    columns: Optional[List[str]] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> "pa.Table":
+    """
+    Select columns and a range of rows of a table without copying.
+
+    Raises:
+        KeyError: If a column does not exist
+    """
+    if columns:
+        missing = [column for column in columns if column not in table.column_names]
+        if missing:
+            raise KeyError(", ".join(missing))
+        table = table.select(columns)
+    return table.slice(offset, limit)
+
+
+def to_ipc_stream(table: "pa.Table") -> bytes:
+    """Serialize a table in the Arrow IPC stream format."""
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def prune(keep: Iterable[str]) -> int:
+    """
+    Delete the tables no published contribution has any more.
+
+    Args:
+        keep: Content hashes of the tables to keep
+
+    Returns:
+        Number of tables deleted
+    """
+    root = Path(settings.COLUMNAR_CACHE_DIR)
+    if not root.is_dir():
+        return 0
+    keep = set(keep)
+    pruned = 0
+    for path in root.glob("*/*.arrow"):
+        if path.stem not in keep:
+            path.unlink(missing_ok=True)
+            pruned += 1
+    with _open_lock:
+        _open_tables.clear()
+    return pruned
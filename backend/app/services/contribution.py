@@ -2,25 +2,80 @@
 Service layer for contribution-related operations.
 """
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Collection, Dict, List, Optional, Set, Tuple, Union
 
-from sqlalchemy import and_, or_, select
+from sqlalchemy import (
+    BigInteger,
+    Text,
+    and_,
+    case,
+    cast,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, defer
+from sqlalchemy.orm.exc import StaleDataError
 
+from app.core import hashing
+from app.core.metrics import instrument_service
 from app.db.models.contribution import (
     Contribution,
     ContributionHistory,
     ContributionStatus,
 )
-from app.schemas.data import DataCreate, DataUpdate, DataValidationResult
+from app.schemas.changes import ChangeCursor
+from app.schemas.data import (
+    BulkStatusItem,
+    BulkStatusItemResult,
+    BulkStatusMode,
+    BulkStatusResult,
+    DataCreate,
+    DataUpdate,
+    DataValidationResult,
+)
 from app.schemas.token import UserResponse
+from app.services import (
+    blocks,
+    columnar,
+    history_archive,
+    offload,
+    patch,
+    search_index,
+    search_tables,
+)
+from app.services.projection import Projection
+
+
+class RevisionMismatchError(Exception):
+    """Raised when a write expects a different contribution revision."""
+    
+    def __init__(self, current_revision: Optional[int]):
+        super().__init__(f"Contribution is at revision {current_revision}")
+        self.current_revision = current_revision
+
+
+class LineageNotFoundError(Exception):
+    """Raised when a new version names a contribution the user cannot extend."""
+    
+    def __init__(self, contribution_id: int):
+        super().__init__(f"Contribution {contribution_id} not found")
+        self.contribution_id = contribution_id
 
 
 class ContributionService:
     """Service class for contribution operations."""
     
     @classmethod
+    @instrument_service
     async def create_contribution(
         cls,
         db: AsyncSession,
@@ -39,41 +94,76 @@ class ContributionService:
             
         Returns:
             Created contribution
+            
+        Raises:
+            LineageNotFoundError: If ``data_in.version_of`` is not a
+                contribution of the repository the user may change
         """
+        lineage_id = None
+        if data_in.version_of is not None:
+            lineage_id = await cls._lineage_of(
+                db, data_in.version_of, repository, user
+            )
+        
+        content_hash, table_hashes = hashing.content_hashes(data_in.data)
         contribution = Contribution(
             repository=repository,
             data_type=data_in.data_type.value,
-            data=data_in.data,
+            lineage_id=lineage_id,
+            content_hash=content_hash,
+            table_hashes=table_hashes,
             metadata=data_in.metadata or {},
             created_by=user.id,
             status=ContributionStatus.DRAFT,
             is_public=False,
         )
+        await blocks.retain(db, table_hashes, data_in.data)
+        await offload.store(db, contribution, data_in.data)
         
         db.add(contribution)
         await db.flush()
+        if lineage_id is None:
+            # A first version starts its own lineage; set without bumping
+            # the revision
+            await db.execute(
+                update(Contribution)
+                .where(
+                    Contribution.id == contribution.id,
+                    Contribution.repository == repository,
+                )
+                .values(lineage_id=contribution.id)
+                .execution_options(synchronize_session=False)
+            )
+            set_committed_value(contribution, "lineage_id", contribution.id)
         
         # Create history entry
         history = ContributionHistory(
             contribution_id=contribution.id,
+            repository=contribution.repository,
             action="create",
             changes={"status": [None, ContributionStatus.DRAFT.value]},
             user_id=user.id,
         )
         db.add(history)
+        search_index.enqueue(db, contribution)
+        await search_tables.refresh(db, contribution, data=data_in.data)
         
         await db.commit()
         await db.refresh(contribution)
+        await offload.attach(contribution, data_in.data)
         
         return contribution
     
     @classmethod
+    @instrument_service
     async def update_contribution(
         cls,
         db: AsyncSession,
         contribution_id: int,
         data_in: Union[DataUpdate, Dict[str, Any]],
         user: UserResponse,
+        expected_revision: Optional[int] = None,
+        repository: Optional[str] = None,
     ) -> Optional[Contribution]:
         """
         Update an existing contribution.
@@ -83,30 +173,47 @@ class ContributionService:
             contribution_id: ID of the contribution to update
             data_in: Updated data
             user: User making the update
+            expected_revision: Revision the caller last saw, if any
+            repository: Repository of the contribution, to read only its
+                partition
             
         Returns:
             Updated contribution if found, None otherwise
+            
+        Raises:
+            RevisionMismatchError: If the contribution is not at the expected
+                revision or was changed concurrently
         """
-        # Get the contribution with relationships loaded
+        # History is appended to, never loaded, and the document is only
+        # compared by hash
         stmt = (
             select(Contribution)
-            .options(selectinload(Contribution.history))
-            .where(Contribution.id == contribution_id)
+            .options(defer(Contribution.data))
+            .where(
+                Contribution.id == contribution_id,
+                *cls._in_repository(Contribution, repository),
+            )
         )
+        editable = cls._editable_by(user)
+        if editable is not None:
+            stmt = stmt.where(editable)
         result = await db.execute(stmt)
         contribution = result.scalar_one_or_none()
         
         if not contribution:
             return None
         
+        cls._check_revision(contribution, expected_revision)
+        
         # Track changes
         changes = {}
+        document = None
         
         # Update data if provided
         if isinstance(data_in, DataUpdate):
-            if data_in.data is not None and data_in.data != contribution.data:
-                changes["data"] = [contribution.data, data_in.data]
-                contribution.data = data_in.data
+            if data_in.data is not None:
+                document = data_in.data
+                await cls._set_data(db, contribution, document, changes)
             
             if data_in.metadata is not None and data_in.metadata != contribution.metadata:
                 changes["metadata"] = [contribution.metadata, data_in.metadata]
@@ -114,34 +221,306 @@ class ContributionService:
         elif isinstance(data_in, dict):
             # Handle dictionary updates
             for key, value in data_in.items():
-                if hasattr(contribution, key) and getattr(contribution, key) != value:
+                if key == "data":
+                    document = value
+                    await cls._set_data(db, contribution, document, changes)
+                elif hasattr(contribution, key) and getattr(contribution, key) != value:
                     changes[key] = [getattr(contribution, key), value]
                     setattr(contribution, key, value)
         
-        # Update timestamps and user
-        contribution.updated_by = user.id
-        
-        # Create history entry if there are changes
+        # Create history entry and record the editor if there are changes;
+        # a no-op update leaves the revision (and so the ETag) untouched.
         if changes:
+            contribution.updated_by = user.id
             history = ContributionHistory(
                 contribution_id=contribution.id,
+                repository=contribution.repository,
                 action="update",
                 changes=changes,
                 user_id=user.id,
             )
             db.add(history)
+            search_index.enqueue(db, contribution)
+            
+            if "data" in changes:
+                await search_tables.refresh(
+                    db,
+                    contribution,
+                    search_tables.levels_for_tables(changes["data"].get("tables")),
+                    data=document,
+                )
+            if "is_public" in changes:
+                await search_tables.set_public(
+                    db, [contribution.id], contribution.is_public
+                )
         
-        await db.commit()
+        await cls._commit_revision(db, contribution)
         await db.refresh(contribution)
+        if offload.is_offloaded(contribution):
+            await offload.attach(contribution, document)
+        elif document is not None:
+            # The row now holds what was sent, so skip reading it back
+            set_committed_value(contribution, "data", document)
+        else:
+            await db.refresh(contribution, attribute_names=["data"])
         
         return contribution
     
     @classmethod
+    @instrument_service
+    async def patch_contribution(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        operations: List[patch.Operation],
+        changes: Dict[str, Any],
+        user: UserResponse,
+        expected_revision: Optional[int] = None,
+        repository: Optional[str] = None,
+    ) -> Optional[Contribution]:
+        """
+        Apply patch operations to a contribution's data inside the database.
+        
+        The document is not loaded: only the tables the patch touched are
+        read back, to update the content hashes. A patch that leaves the
+        content hash unchanged is rolled back as a no-op. Otherwise only the
+        search levels built from the changed tables are refreshed, and
+        history records the patch rather than the old and new documents.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution to patch
+            operations: Operations from the patch service
+            changes: What to record in history, e.g. {"patch": [...]}
+            user: User making the change
+            expected_revision: Revision the caller last saw, if any
+            repository: Repository of the contribution, to read only its
+                partition
+            
+        Returns:
+            Patched contribution with its data deferred if found, None otherwise
+            
+        Raises:
+            RevisionMismatchError: If the contribution is not at the expected
+                revision
+            PatchConflictError: If a test failed or a path does not exist
+        """
+        # Lock the row so the revision cannot move between check and update
+        stmt = (
+            select(
+                Contribution.id,
+                Contribution.repository,
+                Contribution.revision,
+                Contribution.content_hash,
+                Contribution.table_hashes,
+                Contribution.data_ref,
+                Contribution.data_checksum,
+                Contribution.data_size,
+            )
+            .where(
+                Contribution.id == contribution_id,
+                *cls._in_repository(Contribution, repository),
+            )
+            .with_for_update()
+        )
+        editable = cls._editable_by(user)
+        if editable is not None:
+            stmt = stmt.where(editable)
+        current = (await db.execute(stmt)).one_or_none()
+        
+        if current is None:
+            return None
+        
+        if expected_revision is not None and current.revision != expected_revision:
+            raise RevisionMismatchError(current.revision)
+        # From here on the repository is known, so only its partition is read
+        this_row = (
+            Contribution.id == contribution_id,
+            Contribution.repository == current.repository,
+        )
+        
+        offloaded = offload.is_offloaded(current)
+        if offloaded:
+            # Patch the document inline; it is offloaded again below
+            await db.execute(
+                update(Contribution)
+                .where(*this_row)
+                .values(data=await offload.load_data(current))
+                .execution_options(synchronize_session=False)
+            )
+        
+        # Read back only the tables the patch touched, to re-hash them
+        touched = patch.touched_tables(operations)
+        if current.table_hashes is None or offloaded:
+            touched = None
+        tables = sorted(touched) if touched is not None else []
+        if touched is None:
+            returned = [Contribution.data]
+        else:
+            returned = [Contribution.data.has_key(table) for table in tables]
+            returned += [
+                Contribution.data.op("->", return_type=JSONB)(table)
+                for table in tables
+            ]
+        
+        source = Contribution.__table__.alias("source")
+        base = (
+            select(source.c.data.label("d"), true().label("ok"))
+            .where(
+                source.c.id == contribution_id,
+                source.c.repository == current.repository,
+            )
+            .subquery()
+        )
+        patched = patch.compile_patch(base, operations)
+        result = await db.execute(
+            update(Contribution)
+            .where(*this_row, patched.c.ok)
+            .values(
+                data=patched.c.d,
+                revision=Contribution.revision + 1,
+                updated_by=user.id,
+            )
+            .returning(Contribution.id, *returned)
+            .execution_options(synchronize_session=False)
+        )
+        patched_row = result.one_or_none()
+        if patched_row is None:
+            await db.rollback()
+            raise patch.PatchConflictError("The patch cannot be applied to this data")
+        
+        if touched is None:
+            content_hash, table_hashes = hashing.content_hashes(patched_row[1])
+            patched_tables = patched_row[1]
+        else:
+            table_hashes = dict(current.table_hashes)
+            present = patched_row[1:1 + len(tables)]
+            values = patched_row[1 + len(tables):]
+            for table, has_table, value in zip(tables, present, values):
+                if has_table:
+                    table_hashes[table] = hashing.value_hash(value)
+                else:
+                    table_hashes.pop(table, None)
+            content_hash = hashing.combine_hashes(table_hashes)
+            patched_tables = {
+                table: value
+                for table, has_table, value in zip(tables, present, values)
+                if has_table
+            }
+        
+        if content_hash == current.content_hash:
+            # Nothing changed (e.g. only tests, or values set to themselves):
+            # keep the revision and history as they were.
+            await db.rollback()
+        else:
+            await db.execute(
+                update(Contribution)
+                .where(*this_row)
+                .values(content_hash=content_hash, table_hashes=table_hashes)
+                .execution_options(synchronize_session=False)
+            )
+            await blocks.retain(
+                db, table_hashes, patched_tables, previous=current.table_hashes
+            )
+            await cls._record_patch(
+                db,
+                current,
+                changes,
+                user,
+                hashing.changed_tables(current.table_hashes, table_hashes),
+            )
+            if offloaded:
+                await db.execute(
+                    update(Contribution)
+                    .where(*this_row)
+                    .values(
+                        **await offload.stored_values(
+                            db, patched_row[1], content_hash, table_hashes
+                        )
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+        
+        stmt = (
+            select(Contribution)
+            .options(defer(Contribution.data))
+            .where(*this_row)
+            .execution_options(populate_existing=True)
+        )
+        return (await db.execute(stmt)).scalar_one()
+    
+    @classmethod
+    async def _record_patch(
+        cls,
+        db: AsyncSession,
+        current: Any,
+        changes: Dict[str, Any],
+        user: UserResponse,
+        tables: Optional[Set[str]],
+    ) -> None:
+        """Add history, outbox and search rows for an applied patch."""
+        history = ContributionHistory(
+            contribution_id=current.id,
+            repository=current.repository,
+            action="patch",
+            changes=changes,
+            user_id=user.id,
+        )
+        db.add(history)
+        search_index.enqueue(db, current)
+        await search_tables.refresh_from_db(
+            db, current.id, search_tables.levels_for_tables(tables)
+        )
+    
+    @classmethod
+    async def _set_data(
+        cls,
+        db: AsyncSession,
+        contribution: Contribution,
+        data: Any,
+        changes: Dict[str, Any],
+    ) -> None:
+        """
+        Replace a contribution's data if its content hash differs.
+        
+        The stored document is not read unless it predates content hashes.
+        The change is recorded in ``changes`` with the hashes and the new
+        values of the changed tables only.
+        """
+        content_hash, table_hashes = hashing.content_hashes(data)
+        old_hash, old_tables = contribution.content_hash, contribution.table_hashes
+        # Blocks are only referenced from documents with table hashes
+        referenced = old_tables
+        if old_hash is None:
+            # Written before content hashes existed: hash the stored copy once
+            await db.refresh(contribution, attribute_names=["data"])
+            old_hash, old_tables = hashing.content_hashes(contribution.data)
+        
+        if content_hash == old_hash:
+            return
+        
+        tables = hashing.changed_tables(old_tables, table_hashes)
+        if tables is None:
+            changes["data"] = {"content_hash": [old_hash, content_hash], "document": data}
+        else:
+            changes["data"] = {
+                "content_hash": [old_hash, content_hash],
+                "tables": {table: data.get(table) for table in sorted(tables)},
+            }
+        await blocks.retain(db, table_hashes, data, previous=referenced)
+        contribution.content_hash = content_hash
+        contribution.table_hashes = table_hashes
+        await offload.store(db, contribution, data)
+    
+    @classmethod
+    @instrument_service
     async def get_contribution(
         cls,
         db: AsyncSession,
         contribution_id: int,
         include_private: bool = False,
+        repository: Optional[str] = None,
     ) -> Optional[Contribution]:
         """
         Get a contribution by ID.
@@ -150,19 +529,77 @@ class ContributionService:
             db: Database session
             contribution_id: ID of the contribution to retrieve
             include_private: Whether to include private contributions
+            repository: Only find the contribution in this repository
             
         Returns:
             Contribution if found and accessible, None otherwise
         """
-        stmt = select(Contribution).where(Contribution.id == contribution_id)
+        stmt = select(Contribution).where(
+            Contribution.id == contribution_id,
+            *cls._in_repository(Contribution, repository),
+        )
         
         if not include_private:
             stmt = stmt.where(Contribution.is_public == True)
         
         result = await db.execute(stmt)
-        return result.scalar_one_or_none()
+        contribution = result.scalar_one_or_none()
+        if contribution is not None:
+            await offload.attach(contribution)
+        return contribution
+    
+    @classmethod
+    @instrument_service
+    async def get_contribution_json(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        include_private: bool = False,
+        projection: Optional[Projection] = None,
+        repository: Optional[str] = None,
+    ) -> Optional[Tuple[Contribution, str]]:
+        """
+        Get a contribution with its data rendered as JSON text.
+        
+        The data column is deferred and cast to text in the database, so the
+        document is never decoded into Python objects; responses splice the
+        text in as-is. An offloaded document is not fetched unless it has to
+        be projected; stream it with ``offload.stream_json``.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution to retrieve
+            include_private: Whether to include private contributions
+            projection: Subtrees of the data to return, applied in SQL
+            repository: Only find the contribution in this repository
+            
+        Returns:
+            Tuple of (contribution without data, data JSON, or None if the
+            document is offloaded and not projected) if found and accessible,
+            None otherwise
+        """
+        stmt = (
+            select(Contribution, cls._data_json(projection))
+            .options(defer(Contribution.data))
+            .where(
+                Contribution.id == contribution_id,
+                *cls._in_repository(Contribution, repository),
+            )
+        )
+        
+        if not include_private:
+            stmt = stmt.where(Contribution.is_public == True)
+        
+        row = (await db.execute(stmt)).one_or_none()
+        if row is None:
+            return None
+        contribution, data_json = row
+        if offload.is_offloaded(contribution) and projection:
+            data_json = await offload.project_json(db, contribution, projection)
+        return contribution, data_json
     
     @classmethod
+    @instrument_service
     async def search_contributions(
         cls,
         db: AsyncSession,
@@ -173,6 +610,7 @@ class ContributionService:
         created_by: Optional[int] = None,
         page: int = 1,
         per_page: int = 10,
+        only_latest: bool = False,
     ) -> Tuple[List[Contribution], int]:
         """
         Search for contributions with filtering and pagination.
@@ -186,6 +624,7 @@ class ContributionService:
             created_by: Filter by creator ID
             page: Page number (1-based)
             per_page: Items per page
+            only_latest: Only the latest published version of each lineage
             
         Returns:
             Tuple of (list of contributions, total count)
@@ -195,6 +634,91 @@ class ContributionService:
         count_stmt = select(func.count(Contribution.id))
         
         # Apply filters
+        conditions = cls._search_conditions(
+            repository, data_type, status, is_public, created_by, only_latest
+        )
+        
+        if conditions:
+            stmt = stmt.where(and_(*conditions))
+            count_stmt = count_stmt.where(and_(*conditions))
+        
+        # Apply pagination
+        offset = (page - 1) * per_page
+        stmt = stmt.offset(offset).limit(per_page)
+        
+        # Execute queries
+        result = await db.execute(stmt)
+        count_result = await db.execute(count_stmt)
+        
+        contributions = result.scalars().all()
+        for contribution in contributions:
+            await offload.attach(contribution)
+        return contributions, count_result.scalar_one()
+    
+    @classmethod
+    @instrument_service
+    async def search_contributions_json(
+        cls,
+        db: AsyncSession,
+        repository: Optional[str] = None,
+        data_type: Optional[str] = None,
+        status: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        created_by: Optional[int] = None,
+        page: int = 1,
+        per_page: int = 10,
+        projection: Optional[Projection] = None,
+        only_latest: bool = False,
+    ) -> Tuple[List[Tuple[Contribution, str]], int]:
+        """
+        Search for contributions, returning their data as JSON text.
+        
+        Takes the same filters as search_contributions. The data column is
+        rendered to text by the database and never decoded into Python
+        objects; a projection trims it before it leaves the database.
+        Offloaded documents are fetched and projected the same way.
+        
+        Returns:
+            Tuple of (list of (contribution without data, data JSON), total count)
+        """
+        stmt = (
+            select(Contribution, cls._data_json(projection))
+            .options(defer(Contribution.data))
+            .order_by(Contribution.id)
+        )
+        count_stmt = select(func.count(Contribution.id))
+        
+        conditions = cls._search_conditions(
+            repository, data_type, status, is_public, created_by, only_latest
+        )
+        if conditions:
+            stmt = stmt.where(and_(*conditions))
+            count_stmt = count_stmt.where(and_(*conditions))
+        
+        offset = (page - 1) * per_page
+        stmt = stmt.offset(offset).limit(per_page)
+        
+        result = await db.execute(stmt)
+        count_result = await db.execute(count_stmt)
+        
+        rows = []
+        for contribution, data_json in result.all():
+            if offload.is_offloaded(contribution):
+                data_json = await offload.project_json(db, contribution, projection)
+            rows.append((contribution, data_json))
+        return rows, count_result.scalar_one()
+    
+    @classmethod
+    def _search_conditions(
+        cls,
+        repository: Optional[str] = None,
+        data_type: Optional[str] = None,
+        status: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        created_by: Optional[int] = None,
+        only_latest: bool = False,
+    ) -> list:
+        """Build the filter conditions shared by the search methods."""
         conditions = []
         
         if repository is not None:
@@ -212,21 +736,19 @@ class ContributionService:
         if created_by is not None:
             conditions.append(Contribution.created_by == created_by)
         
-        if conditions:
-            stmt = stmt.where(and_(*conditions))
-            count_stmt = count_stmt.where(and_(*conditions))
+        if only_latest:
+            conditions.append(Contribution.is_latest == True)
         
-        # Apply pagination
-        offset = (page - 1) * per_page
-        stmt = stmt.offset(offset).limit(per_page)
-        
-        # Execute queries
-        result = await db.execute(stmt)
-        count_result = await db.execute(count_stmt)
-        
-        return result.scalars().all(), count_result.scalar_one()
+        return conditions
     
     @classmethod
+    def _data_json(cls, projection: Optional[Projection] = None):
+        """Column expression for the (projected) data rendered as JSON text."""
+        data = projection.apply(Contribution.data) if projection else Contribution.data
+        return cast(data, Text).label("data_json")
+    
+    @classmethod
+    @instrument_service
     async def validate_contribution_data(
         cls,
         db: AsyncSession,
@@ -234,39 +756,31 @@ class ContributionService:
         repository: str,
     ) -> DataValidationResult:
         """
-        Validate contribution data against the schema.
+        Validate contribution data table by table against the data model.
         
-        This is a placeholder implementation that should be replaced with
-        actual validation logic based on the repository and data type.
+        Tables that are the same as in a contribution validated before are
+        not validated again (see app.services.blocks).
         
         Args:
-            db: Database session
+            db: Database session; messages of newly validated tables are
+                kept for next time when the caller commits
             data_in: Data to validate
             repository: Repository name
             
         Returns:
             Validation result
         """
-        # TODO: Implement actual validation based on repository and data type
-        # This is a simplified example
-        errors = []
-        
-        # Example validation: Check required fields
-        required_fields = ["id", "name"]
-        for field in required_fields:
-            if field not in data_in.data:
-                errors.append({
-                    "field": field,
-                    "message": f"Field '{field}' is required",
-                })
+        errors, warnings = await blocks.validate(db, data_in.data)
         
         return DataValidationResult(
             valid=len(errors) == 0,
             errors=errors if errors else None,
+            warnings=warnings if warnings else None,
             data=data_in.data,
         )
     
     @classmethod
+    @instrument_service
     async def change_contribution_status(
         cls,
         db: AsyncSession,
@@ -274,6 +788,8 @@ class ContributionService:
         new_status: str,
         user: UserResponse,
         comment: Optional[str] = None,
+        expected_revision: Optional[int] = None,
+        repository: Optional[str] = None,
     ) -> Optional[Contribution]:
         """
         Change the status of a contribution.
@@ -284,25 +800,49 @@ class ContributionService:
             new_status: New status
             user: User making the change
             comment: Optional comment for the status change
+            expected_revision: Revision the caller last saw, if any
+            repository: Repository of the contribution, to read only its
+                partition
             
         Returns:
             Updated contribution if found, None otherwise
+            
+        Raises:
+            RevisionMismatchError: If the contribution is not at the expected
+                revision or was changed concurrently
         """
-        # Get the contribution with relationships loaded
-        stmt = (
-            select(Contribution)
-            .options(selectinload(Contribution.history))
-            .where(Contribution.id == contribution_id)
+        # History is appended to, never loaded
+        stmt = select(Contribution).where(
+            Contribution.id == contribution_id,
+            *cls._in_repository(Contribution, repository),
         )
+        editable = cls._editable_by(user)
+        if editable is not None:
+            stmt = stmt.where(editable)
         result = await db.execute(stmt)
         contribution = result.scalar_one_or_none()
         
         if not contribution:
             return None
         
+        cls._check_revision(contribution, expected_revision)
+        
         # Update status
+        status = ContributionStatus(new_status)
+        new_status = status.value
         old_status = contribution.status.value if contribution.status else None
-        contribution.status = new_status
+        was_public = contribution.is_public
+        # Publishing or withdrawing a version can move its lineage's latest
+        lineage_changes = (
+            contribution.lineage_id is not None
+            and ContributionStatus.PUBLISHED in (old_status, new_status)
+            and old_status != new_status
+        )
+        if lineage_changes:
+            await cls._lock_lineage(
+                db, contribution.repository, contribution.lineage_id
+            )
+        contribution.status = status
         
         # Update timestamps for specific status changes
         if new_status == ContributionStatus.PUBLISHED:
@@ -316,13 +856,674 @@ class ContributionService:
         
         history = ContributionHistory(
             contribution_id=contribution.id,
+            repository=contribution.repository,
             action=f"status_change_to_{new_status}",
             changes=changes,
             user_id=user.id,
         )
         db.add(history)
+        search_index.enqueue(db, contribution)
+        if contribution.is_public != was_public:
+            await search_tables.set_public(
+                db, [contribution.id], contribution.is_public
+            )
+        if lineage_changes:
+            await cls._flush_revision(db)
+            changed = await cls.refresh_latest(
+                db,
+                contribution.repository,
+                [contribution.lineage_id],
+                revised=[contribution.id],
+            )
+            search_index.enqueue_many(
+                db,
+                contribution.repository,
+                [other for other in changed if other != contribution.id],
+            )
         
-        await db.commit()
+        await cls._commit_revision(db, contribution)
         await db.refresh(contribution)
+        if new_status == ContributionStatus.PUBLISHED:
+            await columnar.publish(contribution)
         
         return contribution
+    
+    @classmethod
+    @instrument_service
+    async def change_contributions_status(
+        cls,
+        db: AsyncSession,
+        items: List[BulkStatusItem],
+        new_status: ContributionStatus,
+        user: UserResponse,
+        repository: str,
+        comment: Optional[str] = None,
+        mode: BulkStatusMode = BulkStatusMode.ATOMIC,
+    ) -> BulkStatusResult:
+        """
+        Change the status of many contributions at once.
+        
+        The contributions and the other versions of their lineages are
+        locked by one SELECT, in id order; the change itself is one
+        UPDATE ... RETURNING and one INSERT of the history entries, however
+        many contributions there are. Contributions the user may not change
+        are reported as not found, and those not at the expected revision as
+        conflicts. In atomic mode nothing is changed if there are any; in
+        best-effort mode the other contributions are changed.
+        
+        Args:
+            db: Database session
+            items: Contributions to change, with distinct ids
+            new_status: New status
+            user: User making the change
+            repository: Repository of the contributions
+            comment: Optional comment for the history entries
+            mode: Whether to change all contributions or none
+            
+        Returns:
+            Outcome per contribution, in the order of ``items``
+        """
+        ids = [item.id for item in items]
+        targets = [Contribution.repository == repository, Contribution.id.in_(ids)]
+        editable = cls._editable_by(user)
+        if editable is not None:
+            targets.append(editable)
+        lineages = select(Contribution.lineage_id).where(
+            *targets, Contribution.lineage_id.is_not(None)
+        )
+        is_target = and_(*targets[1:]).label("is_target")
+        stmt = (
+            select(
+                Contribution.id,
+                Contribution.lineage_id,
+                Contribution.status,
+                Contribution.is_public,
+                Contribution.revision,
+                is_target,
+            )
+            .where(
+                Contribution.repository == repository,
+                or_(and_(*targets[1:]), Contribution.lineage_id.in_(lineages)),
+            )
+            .order_by(Contribution.id)
+            .with_for_update()
+        )
+        found = {
+            row.id: row for row in (await db.execute(stmt)).all() if row.is_target
+        }
+        
+        results = []
+        to_change = []
+        for item in items:
+            row = found.get(item.id)
+            if row is None:
+                outcome = "not_found"
+            elif item.revision is not None and item.revision != row.revision:
+                outcome = "conflict"
+            elif row.status == new_status:
+                outcome = "unchanged"
+            else:
+                outcome = "changed"
+                to_change.append(row)
+            results.append(
+                BulkStatusItemResult(
+                    id=item.id,
+                    result=outcome,
+                    revision=row.revision if row is not None else None,
+                )
+            )
+        
+        rejected = mode == BulkStatusMode.ATOMIC and any(
+            result.result in ("not_found", "conflict") for result in results
+        )
+        if rejected or not to_change:
+            # Nothing to write; release the locks
+            await db.rollback()
+            for result in results:
+                if result.result == "changed":
+                    result.result = "skipped"
+            return BulkStatusResult(applied=not rejected, changed=0, results=results)
+        
+        publishing = new_status == ContributionStatus.PUBLISHED
+        values = {
+            "status": new_status,
+            "revision": Contribution.revision + 1,
+        }
+        if publishing:
+            values["published_at"] = func.now()
+            values["is_public"] = True
+        revisions = dict(
+            (
+                await db.execute(
+                    update(Contribution)
+                    .where(
+                        Contribution.repository == repository,
+                        Contribution.id.in_([row.id for row in to_change]),
+                    )
+                    .values(**values)
+                    .returning(Contribution.id, Contribution.revision)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+        )
+        
+        entries = []
+        for row in to_change:
+            old_status = row.status.value if row.status else None
+            changes = {"status": [old_status, new_status.value]}
+            if comment:
+                changes["comment"] = comment
+            entries.append(
+                {
+                    "contribution_id": row.id,
+                    "repository": repository,
+                    "action": f"status_change_to_{new_status.value}",
+                    "changes": changes,
+                    "user_id": user.id,
+                }
+            )
+        await db.execute(insert(ContributionHistory), entries)
+        
+        changed_ids = [row.id for row in to_change]
+        search_index.enqueue_many(db, repository, changed_ids)
+        if publishing:
+            await search_tables.set_public(
+                db, [row.id for row in to_change if not row.is_public], True
+            )
+        moved = {
+            row.lineage_id
+            for row in to_change
+            if row.lineage_id is not None
+            and ContributionStatus.PUBLISHED in (row.status, new_status)
+        }
+        if moved:
+            flagged = await cls.refresh_latest(
+                db, repository, sorted(moved), revised=changed_ids
+            )
+            search_index.enqueue_many(
+                db, repository, set(flagged).difference(changed_ids)
+            )
+            # Other versions of the lineages may have new revisions too
+            revisions.update(flagged)
+        await db.commit()
+        
+        for result in results:
+            if result.id in revisions:
+                result.revision = revisions[result.id]
+        return BulkStatusResult(
+            applied=True, changed=len(to_change), results=results
+        )
+    
+    @classmethod
+    @instrument_service
+    async def get_published_tables(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        repository: Optional[str] = None,
+    ) -> Optional[Tuple[Contribution, List[str]]]:
+        """
+        Get the columnar tables of a published contribution.
+        
+        Tables that were not materialized yet, e.g. on a new host, are
+        written first; otherwise the data document is not read. Tables
+        shared with other contributions share their files.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution
+            repository: Repository of the contribution, to read only its
+                partition
+            
+        Returns:
+            Tuple of (contribution, table names) if the contribution is
+            published, None otherwise
+        """
+        stmt = (
+            select(Contribution)
+            .options(defer(Contribution.data))
+            .where(
+                Contribution.id == contribution_id,
+                Contribution.status == ContributionStatus.PUBLISHED,
+                Contribution.is_public == True,
+                *cls._in_repository(Contribution, repository),
+            )
+        )
+        contribution = (await db.execute(stmt)).scalar_one_or_none()
+        if contribution is None:
+            return None
+        
+        if await columnar.needs_materializing(db, contribution):
+            # Deferred columns cannot be lazy loaded in async sessions
+            await db.refresh(contribution, ["data"])
+            await columnar.materialize(
+                contribution, await offload.load_data(contribution)
+            )
+        return contribution, columnar.list_tables(contribution)
+    
+    @classmethod
+    @instrument_service
+    async def get_contribution_revision(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        include_private: bool = False,
+        repository: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        Get the current revision of a contribution without loading its data.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution
+            include_private: Whether to include private contributions
+            repository: Only find the contribution in this repository
+            
+        Returns:
+            Revision if found and accessible, None otherwise
+        """
+        stmt = select(Contribution.revision).where(
+            Contribution.id == contribution_id,
+            *cls._in_repository(Contribution, repository),
+        )
+        
+        if not include_private:
+            stmt = stmt.where(Contribution.is_public == True)
+        
+        result = await db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    @classmethod
+    def _check_revision(
+        cls, contribution: Contribution, expected_revision: Optional[int]
+    ) -> None:
+        """Raise if the contribution is not at the expected revision."""
+        if expected_revision is not None and contribution.revision != expected_revision:
+            raise RevisionMismatchError(contribution.revision)
+    
+    @classmethod
+    async def _commit_revision(cls, db: AsyncSession, contribution: Contribution) -> None:
+        """
+        Commit, turning a lost optimistic-concurrency race into an error.
+        
+        The mapper's version counter makes the UPDATE match only the revision
+        that was loaded, so a concurrent writer causes a StaleDataError.
+        """
+        try:
+            await db.commit()
+        except StaleDataError as e:
+            await db.rollback()
+            raise RevisionMismatchError(None) from e
+    
+    @classmethod
+    async def _flush_revision(cls, db: AsyncSession) -> None:
+        """Flush, turning a lost optimistic-concurrency race into an error."""
+        try:
+            await db.flush()
+        except StaleDataError as e:
+            await db.rollback()
+            raise RevisionMismatchError(None) from e
+    
+    @classmethod
+    async def _lineage_of(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        repository: str,
+        user: UserResponse,
+    ) -> int:
+        """
+        Get the lineage a new version of a contribution belongs to.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution being versioned
+            repository: Repository name
+            user: User creating the new version
+            
+        Returns:
+            Lineage ID
+            
+        Raises:
+            LineageNotFoundError: If the user may not change the contribution
+        """
+        stmt = select(Contribution.id, Contribution.lineage_id).where(
+            Contribution.id == contribution_id,
+            Contribution.repository == repository,
+        )
+        editable = cls._editable_by(user)
+        if editable is not None:
+            stmt = stmt.where(editable)
+        row = (await db.execute(stmt)).one_or_none()
+        if row is None:
+            raise LineageNotFoundError(contribution_id)
+        return row.lineage_id or row.id
+    
+    @classmethod
+    async def _lock_lineage(
+        cls, db: AsyncSession, repository: str, lineage_id: int
+    ) -> None:
+        """
+        Lock the versions of a lineage before its latest version moves.
+        
+        Rows are locked in id order, so concurrent status changes within a
+        lineage queue up instead of both flagging a version as the latest.
+        """
+        await db.execute(
+            select(Contribution.id)
+            .where(
+                Contribution.repository == repository,
+                Contribution.lineage_id == lineage_id,
+            )
+            .order_by(Contribution.id)
+            .with_for_update()
+        )
+    
+    @classmethod
+    @instrument_service
+    async def refresh_latest(
+        cls,
+        db: AsyncSession,
+        repository: str,
+        lineage_ids: Optional[List[int]] = None,
+        revised: Collection[int] = (),
+    ) -> Dict[int, int]:
+        """
+        Flag the newest published version of each lineage as the latest.
+        
+        Only versions whose flag changes are written, and their search rows
+        are updated to match. The flag is part of the representation, so
+        each of them gets a new revision (and ETag), unless the caller
+        already gave it one in this transaction; versions loaded in the
+        session are brought up to date. Lineages without a published
+        version have no latest version.
+        
+        Args:
+            db: Database session
+            repository: Repository of the lineages
+            lineage_ids: Lineages whose versions changed status, all
+                lineages of the repository by default
+            revised: Contributions whose status change in this transaction
+                already bumped their revision
+            
+        Returns:
+            Current revisions of the contributions whose flag changed, by ID
+        """
+        newest = aliased(Contribution)
+        newest_published = (
+            select(func.max(newest.id))
+            .where(
+                newest.repository == repository,
+                newest.lineage_id == Contribution.lineage_id,
+                newest.status == ContributionStatus.PUBLISHED,
+            )
+            .scalar_subquery()
+        )
+        is_latest = func.coalesce(Contribution.id == newest_published, False)
+        conditions = [
+            Contribution.repository == repository,
+            Contribution.lineage_id.is_not(None),
+            Contribution.is_latest.is_distinct_from(is_latest),
+        ]
+        if lineage_ids is not None:
+            conditions.append(Contribution.lineage_id.in_(lineage_ids))
+        revision = Contribution.revision + 1
+        if revised:
+            revision = case(
+                (Contribution.id.in_(list(revised)), Contribution.revision),
+                else_=revision,
+            )
+        stmt = (
+            update(Contribution)
+            .where(*conditions)
+            .values(is_latest=is_latest, revision=revision)
+            .returning(Contribution.id, Contribution.is_latest, Contribution.revision)
+            .execution_options(synchronize_session=False)
+        )
+        changed = {row.id: row for row in (await db.execute(stmt)).all()}
+        for flag in (True, False):
+            await search_tables.set_latest(
+                db, [row.id for row in changed.values() if row.is_latest == flag], flag
+            )
+        # Keep the version counter of loaded versions in step with the row
+        for loaded in list(db.identity_map.values()):
+            row = changed.get(getattr(loaded, "id", None))
+            if isinstance(loaded, Contribution) and row is not None:
+                set_committed_value(loaded, "is_latest", row.is_latest)
+                set_committed_value(loaded, "revision", row.revision)
+        return {row.id: row.revision for row in changed.values()}
+    
+    @classmethod
+    def _in_repository(cls, model: Any, repository: Optional[str]) -> List[Any]:
+        """
+        Build the filter that confines a query to one repository's partition.
+        
+        Args:
+            model: Contribution or ContributionHistory
+            repository: Repository name, or None to search all partitions
+            
+        Returns:
+            SQL conditions to add to the WHERE clause
+        """
+        if repository is None:
+            return []
+        return [model.repository == repository]
+    
+    @classmethod
+    def _editable_by(cls, user: UserResponse):
+        """
+        Build a filter for the contributions a user may change.
+        
+        Args:
+            user: Authenticated user
+            
+        Returns:
+            SQL condition on Contribution, or None if everything is editable
+        """
+        if user.is_superuser:
+            return None
+        return Contribution.created_by == user.id
+    
+    @classmethod
+    def _visible_to(cls, user: Optional[UserResponse]):
+        """
+        Build a filter for the contributions a caller may see.
+        
+        Args:
+            user: Authenticated user, or None for anonymous callers
+            
+        Returns:
+            SQL condition on Contribution, or None if everything is visible
+        """
+        if user is None:
+            return Contribution.is_public == True
+        if user.is_superuser:
+            return None
+        return or_(Contribution.is_public == True, Contribution.created_by == user.id)
+    
+    @classmethod
+    @instrument_service
+    async def get_changes(
+        cls,
+        db: AsyncSession,
+        repository: str,
+        cursor: ChangeCursor = ChangeCursor(0, 0),
+        limit: int = 100,
+        user: Optional[UserResponse] = None,
+    ) -> Tuple[List[ContributionHistory], ChangeCursor]:
+        """
+        Get change events after a cursor, in an order that never skips any.
+        
+        History ids are taken when rows are inserted, but rows only become
+        visible when their transaction commits, so a plain id cursor could
+        move past the rows of a transaction still running. Events are
+        therefore ordered by (transaction, id) and only served for
+        transactions older than the oldest one still running
+        (``pg_snapshot_xmin``), which are all finished; later transactions
+        always sort after them. This holds on read replicas too. Reads go
+        through the (repository, txid, id) index, so the cost depends on the
+        page size and not on how much history exists. Archived months are
+        not replayed.
+        
+        The cursor moves over every row read, also those of contributions
+        the caller cannot see, so they are not read again on the next poll.
+        
+        Args:
+            db: Database session
+            repository: Repository name
+            cursor: Return events after this position
+            limit: Maximum number of rows to read
+            user: Caller, used to hide private contributions
+            
+        Returns:
+            Tuple of (history entries without change bodies, next cursor)
+            
+        Raises:
+            HistoryArchivedError: If events after the cursor were archived
+        """
+        await history_archive.check_cursor(db, repository, cursor.id)
+        if cursor.txid is None:
+            # A plain id, as cursors were before transactions were recorded
+            cursor = ChangeCursor(
+                (
+                    await db.execute(
+                        select(ContributionHistory.txid).where(
+                            ContributionHistory.repository == repository,
+                            ContributionHistory.id == cursor.id,
+                        )
+                    )
+                ).scalar_one_or_none()
+                or 0,
+                cursor.id,
+            )
+        
+        finished_before = cast(
+            cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text),
+            BigInteger,
+        )
+        visible = cls._visible_to(user)
+        stmt = (
+            select(
+                ContributionHistory,
+                (visible if visible is not None else true()).label("visible"),
+            )
+            .join(
+                Contribution,
+                and_(
+                    Contribution.id == ContributionHistory.contribution_id,
+                    Contribution.repository == ContributionHistory.repository,
+                ),
+            )
+            .options(defer(ContributionHistory.changes))
+            .where(
+                ContributionHistory.repository == repository,
+                Contribution.repository == repository,
+                tuple_(ContributionHistory.txid, ContributionHistory.id)
+                > tuple_(literal(cursor.txid, BigInteger), literal(cursor.id)),
+                ContributionHistory.txid < finished_before,
+            )
+            .order_by(ContributionHistory.txid, ContributionHistory.id)
+            .limit(limit)
+        )
+        
+        events = []
+        for history, is_visible in (await db.execute(stmt)).all():
+            if is_visible:
+                events.append(history)
+            cursor = ChangeCursor(history.txid, history.id)
+        return events, cursor
+    
+    @classmethod
+    @instrument_service
+    async def get_history(
+        cls,
+        db: AsyncSession,
+        contribution_id: int,
+        user: Optional[UserResponse] = None,
+        page: int = 1,
+        per_page: int = 20,
+        include_changes: bool = False,
+        repository: Optional[str] = None,
+    ) -> Optional[Tuple[List[Any], int]]:
+        """
+        Get a page of a contribution's history, newest first.
+        
+        Only the requested page is read, through the (contribution_id, id)
+        index; change bodies, which may hold whole documents, are only read
+        when asked for. Pages past the history still in the database continue
+        into the archived months, of which only this contribution's entries
+        are fetched.
+        
+        Args:
+            db: Database session
+            contribution_id: ID of the contribution
+            user: Caller, used to hide private contributions
+            page: Page number (1-based)
+            per_page: Items per page
+            include_changes: Whether to read the change bodies
+            repository: Only find the contribution in this repository
+            
+        Returns:
+            Tuple of (history rows, total count) if the contribution is
+            accessible, None otherwise
+            
+        Raises:
+            FileNotFoundError: If an archive is missing from the blob store
+        """
+        exists_stmt = select(Contribution.repository).where(
+            Contribution.id == contribution_id,
+            *cls._in_repository(Contribution, repository),
+        )
+        visible = cls._visible_to(user)
+        if visible is not None:
+            exists_stmt = exists_stmt.where(visible)
+        repository = (await db.execute(exists_stmt)).scalar_one_or_none()
+        if repository is None:
+            return None
+        in_history = (
+            ContributionHistory.contribution_id == contribution_id,
+            ContributionHistory.repository == repository,
+        )
+        
+        columns = [
+            ContributionHistory.id,
+            ContributionHistory.action,
+            ContributionHistory.user_id,
+            ContributionHistory.created_at,
+        ]
+        if include_changes:
+            columns.append(ContributionHistory.changes)
+        
+        offset = (page - 1) * per_page
+        count_stmt = select(func.count(ContributionHistory.id)).where(*in_history)
+        # Counting first holds a lock on the history table that archiving
+        # waits for, so no month moves to the archive before it is read.
+        hot_total = (await db.execute(count_stmt)).scalar_one()
+        spans = await history_archive.archived_spans(db, repository, contribution_id)
+        total = hot_total + sum(span.entries for span in spans)
+        
+        entries: List[Any] = []
+        if offset < hot_total:
+            stmt = (
+                select(*columns)
+                .where(*in_history)
+                .order_by(ContributionHistory.id.desc())
+                .offset(offset)
+                .limit(per_page)
+            )
+            entries.extend((await db.execute(stmt)).all())
+        
+        # Archived months are older than any in the database, newest first.
+        skip = max(offset - hot_total, 0)
+        for span in spans:
+            wanted = per_page - len(entries)
+            if wanted <= 0:
+                break
+            if skip >= span.entries:
+                skip -= span.entries
+                continue
+            archived = await history_archive.read_entries(span, include_changes)
+            entries.extend(archived[skip:skip + wanted])
+            skip = 0
+        
+        return entries, total
@@ -0,0 +1,300 @@
+"""
+Service layer for archiving old contribution history.
+
+History is partitioned by repository and month (see app.db.partitions).
+Months older than ``HISTORY_HOT_MONTHS`` are archived by
+``scripts/archive_history.py``:
+
+1. the month partition is read in (contribution_id, id) order and written to
+   a gzip blob, one gzip member per contribution,
+2. the blob is stored in the blob store (see app.core.storage),
+3. in one transaction, a ``HistoryArchive`` row indexing the blob is added
+   and the partition is detached and dropped.
+
+Readers therefore see each month either in the database or in the archive,
+never both. ``ContributionService.get_history`` reads archived entries of a
+contribution on demand, fetching only its member of each month's blob. The
+change feed cannot replay archived months, so cursors into them are refused
+with ``HistoryArchivedError``.
+"""
+import asyncio
+import gzip
+import logging
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import orjson
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+from app.core.storage import get_blob_store
+from app.db.models.history_archive import HistoryArchive
+from app.db.partitions import (
+    HISTORY_TABLE,
+    add_months,
+    history_partition_name,
+    month_start,
+    parse_history_partition_name,
+    partition_name,
+)
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Columns of contribution_history kept in archives.
+ARCHIVED_COLUMNS = (
+    "id",
+    "contribution_id",
+    "action",
+    "changes",
+    "user_id",
+    "created_at",
+    "updated_at",
+)
+
+
+class HistoryArchivedError(Exception):
+    """Raised when a change feed cursor points into archived history."""
+
+    def __init__(self, archived_until: int):
+        super().__init__(f"Changes up to {archived_until} have been archived")
+        self.archived_until = archived_until
+
+
+class ArchivedEntry(NamedTuple):
+    """A history entry read from an archive."""
+    id: int
+    contribution_id: int
+    action: str
+    user_id: int
+    created_at: datetime
+    changes: Optional[Dict[str, Any]]
+
+
+class ArchiveSpan(NamedTuple):
+    """Where a contribution's entries of one month are in its archive."""
+    key: str
+    offset: int
+    length: int
+    entries: int
+
+
+def archive_key(repository: str, month: datetime) -> str:
+    """Get the blob key of a month of a repository's history."""
+    return f"history/{repository.lower()}/{month:%Y-%m}.jsonl.gz"
+
+
+async def archived_spans(
+    db: AsyncSession, repository: str, contribution_id: int
+) -> List[ArchiveSpan]:
+    """
+    Find a contribution's entries in the archives, newest month first.
+
+    Args:
+        db: Database session
+        repository: Repository of the contribution
+        contribution_id: ID of the contribution
+
+    Returns:
+        One span per archived month with entries of the contribution
+    """
+    contribution = str(contribution_id)
+    stmt = (
+        select(HistoryArchive.key, HistoryArchive.contributions[contribution])
+        .where(
+            HistoryArchive.repository == repository,
+            HistoryArchive.contributions.has_key(contribution),
+        )
+        .order_by(HistoryArchive.period_start.desc())
+    )
+    return [
+        ArchiveSpan(key, *span) for key, span in (await db.execute(stmt)).all()
+    ]
+
+
+def _decode_entries(data: bytes, include_changes: bool) -> List[ArchivedEntry]:
+    entries = []
+    for line in gzip.decompress(data).splitlines():
+        row = orjson.loads(line)
+        entries.append(
+            ArchivedEntry(
+                id=row["id"],
+                contribution_id=row["contribution_id"],
+                action=row["action"],
+                user_id=row["user_id"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+                changes=row["changes"] if include_changes else None,
+            )
+        )
+    entries.reverse()
+    return entries
+
+
+async def read_entries(
+    span: ArchiveSpan, include_changes: bool = False
+) -> List[ArchivedEntry]:
+    """
+    Read a contribution's archived entries of one month, newest first.
+
+    Args:
+        span: Where the entries are, from ``archived_spans``
+        include_changes: Whether to keep the change bodies
+
+    Raises:
+        FileNotFoundError: If the archive is missing from the blob store
+    """
+    data = await get_blob_store().get(span.key, span.offset, span.length)
+    return await asyncio.to_thread(_decode_entries, data, include_changes)
+
+
+async def check_cursor(db: AsyncSession, repository: str, cursor: int) -> None:
+    """
+    Refuse a change feed cursor whose next events were archived.
+
+    Cursor 0 starts at the oldest event still in the database.
+
+    Raises:
+        HistoryArchivedError: If events after the cursor were archived
+    """
+    if cursor <= 0:
+        return
+    archived_until = (
+        await db.execute(
+            select(func.max(HistoryArchive.max_history_id)).where(
+                HistoryArchive.repository == repository
+            )
+        )
+    ).scalar_one()
+    if archived_until is not None and cursor < archived_until:
+        raise HistoryArchivedError(archived_until)
+
+
+async def archivable_months(
+    conn: AsyncConnection, repository: str, before: datetime
+) -> List[datetime]:
+    """
+    List the month partitions of a repository that end before a moment.
+
+    Args:
+        conn: Database connection
+        repository: Repository name
+        before: Only months that end at or before this
+
+    Returns:
+        Starts of the months, oldest first
+    """
+    parent = partition_name(HISTORY_TABLE, repository)
+    names = await conn.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": parent},
+    )
+    months = [parse_history_partition_name(repository, name) for name in names]
+    return sorted(
+        month
+        for month in months
+        if month is not None and add_months(month, 1) <= before
+    )
+
+
+async def _export_month(
+    conn: AsyncConnection, partition: str, spool: Any
+) -> Dict[str, Any]:
+    """Write a month partition to a spool file; return its index."""
+    columns = ", ".join(ARCHIVED_COLUMNS)
+    result = await conn.stream(
+        text(f"SELECT {columns} FROM {partition} ORDER BY contribution_id, id")
+    )
+    contributions: Dict[str, List[int]] = {}
+    stats = {"entries": 0, "min_history_id": None, "max_history_id": None}
+    lines: List[bytes] = []
+    current = None
+
+    def flush() -> None:
+        member = gzip.compress(
+            b"".join(lines), compresslevel=settings.ARCHIVE_GZIP_LEVEL
+        )
+        contributions[str(current)] = [spool.tell(), len(member), len(lines)]
+        spool.write(member)
+        lines.clear()
+
+    async for row in result.mappings():
+        if row["contribution_id"] != current and lines:
+            flush()
+        current = row["contribution_id"]
+        lines.append(orjson.dumps(dict(row)) + b"\n")
+        stats["entries"] += 1
+        if stats["min_history_id"] is None or row["id"] < stats["min_history_id"]:
+            stats["min_history_id"] = row["id"]
+        if stats["max_history_id"] is None or row["id"] > stats["max_history_id"]:
+            stats["max_history_id"] = row["id"]
+    if lines:
+        flush()
+    return {**stats, "contributions": contributions, "size": spool.tell()}
+
+
+async def archive_month(repository: str, month: datetime) -> Optional[HistoryArchive]:
+    """
+    Move a month of a repository's history to the archive.
+
+    Args:
+        repository: Repository name
+        month: Start of the month
+
+    Returns:
+        The archive, or None if the month was empty and only dropped
+    """
+    partition = history_partition_name(repository, month)
+    parent = partition_name(HISTORY_TABLE, repository)
+    key = archive_key(repository, month)
+
+    archive = None
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spool_path = Path(spool_dir) / "archive.jsonl.gz"
+        with open(spool_path, "wb") as spool:
+            async with engine.connect() as conn:
+                index = await _export_month(conn, partition, spool)
+        if index["entries"]:
+            await get_blob_store().put_file(key, spool_path)
+            archive = HistoryArchive(
+                repository=repository,
+                period_start=month,
+                period_end=add_months(month, 1),
+                key=key,
+                **index,
+            )
+
+    async with engine.begin() as conn:
+        # Detaching waits for readers of the whole table; give up rather than
+        # queue every history request behind it.
+        await conn.exec_driver_sql("SET LOCAL lock_timeout = '10s'")
+        if archive is not None:
+            values = {
+                column.key: getattr(archive, column.key)
+                for column in HistoryArchive.__table__.columns
+                if getattr(archive, column.key) is not None
+            }
+            await conn.execute(HistoryArchive.__table__.insert().values(**values))
+        await conn.exec_driver_sql(f"ALTER TABLE {parent} DETACH PARTITION {partition}")
+        await conn.exec_driver_sql(f"DROP TABLE {partition}")
+
+    if archive is None:
+        logger.info("Dropped empty history partition %s", partition)
+    else:
+        logger.info(
+            "Archived %d entries of %s to %s (%d bytes)",
+            archive.entries, partition, key, archive.size,
+        )
+    return archive
+
+
+def hot_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Get the start of the oldest month kept in the database."""
+    now = now or datetime.now(timezone.utc)
+    return add_months(month_start(now), -settings.HISTORY_HOT_MONTHS)
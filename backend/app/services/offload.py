@@ -0,0 +1,371 @@
+"""
+Service layer for documents stored outside the contributions table.
+
+A document whose JSON is at least ``DATA_OFFLOAD_THRESHOLD`` bytes is stored
+zstd-compressed in the blob store (see app.core.storage) rather than in the
+``data`` column, which is then NULL. Documents that are objects are stored
+table by table, as content blocks (see app.services.blocks) named after the
+table hashes: a new version of a document only uploads the tables that
+changed, and the document is put together from its ``table_hashes`` when it
+is read. The row keeps:
+
+- ``data_ref``: ``blocks:<content hash>`` for documents stored as blocks,
+  otherwise the key of a blob of the whole document, named after the
+  SHA-256 of its bytes, so identical documents share a blob and a blob
+  never changes,
+- ``data_checksum``: the content hash, or that SHA-256, checked on every
+  read,
+- ``data_size``: length of the uncompressed JSON.
+
+Smaller documents, and every document when ``zstandard`` is not installed,
+stay inline. Offloaded documents are only fetched when a reader needs them,
+and streamed to clients without being decoded. Patches are applied in the
+database, so an offloaded document is written back inline for a patch and
+offloaded again after it; a document that grows past the threshold through
+patches stays inline until it is next replaced. Whole-document blobs that
+no row refers to any more are removed by ``sweep``, and blocks by
+``blocks.collect``.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import orjson
+from sqlalchemy import Text, bindparam, cast, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core import hashing
+from app.core.config import settings
+from app.core.storage import get_blob_store
+from app.db.models.contribution import Contribution
+from app.services import blocks
+from app.services.projection import Projection
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "contributions/"
+BLOCK_KEY_PREFIX = "blocks/"
+BLOCKS_REF = "blocks:"
+
+
+class ChecksumMismatchError(Exception):
+    """Raised when an offloaded document does not match its checksum."""
+
+    def __init__(self, key: str):
+        super().__init__(f"Offloaded document {key} does not match its checksum")
+        self.key = key
+
+
+def is_offloaded(contribution: Contribution) -> bool:
+    """Whether a contribution's document is in the blob store."""
+    return contribution.data_ref is not None
+
+
+def is_stored_as_blocks(contribution: Contribution) -> bool:
+    """Whether an offloaded document is stored as content blocks."""
+    return contribution.data_ref is not None and contribution.data_ref.startswith(
+        BLOCKS_REF
+    )
+
+
+def block_key(block_hash: str) -> str:
+    """Get the blob key of a content block."""
+    return f"{BLOCK_KEY_PREFIX}{block_hash[:2]}/{block_hash}.json.zst"
+
+
+def should_offload(size: int) -> bool:
+    """Whether a document of this many bytes of JSON is offloaded."""
+    threshold = settings.DATA_OFFLOAD_THRESHOLD
+    return zstandard is not None and threshold > 0 and size >= threshold
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise RuntimeError(
+            "Reading offloaded documents requires zstandard "
+            "(pip install .[offload])"
+        )
+
+
+def _compress(encoded: bytes) -> bytes:
+    compressor = zstandard.ZstdCompressor(level=settings.DATA_OFFLOAD_ZSTD_LEVEL)
+    return compressor.compress(encoded)
+
+
+async def stored_values(
+    db: AsyncSession,
+    data: Any,
+    content_hash: Optional[str] = None,
+    table_hashes: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    Get the column values that store a document, offloading it if it is
+    large enough.
+
+    Blobs are written before the row, so a committed ``data_ref`` always
+    names stored blobs. Blocks that were stored before are not compressed
+    or uploaded again; the blocks of the document must be in the catalog
+    (see ``blocks.retain``) to be recorded as stored.
+
+    Args:
+        db: Database session, in the transaction that writes the row
+        data: The document
+        content_hash: Content hash of the document
+        table_hashes: Its per-table hashes, to store it as blocks; None to
+            store it as one blob
+
+    Returns:
+        Values of ``data``, ``data_ref``, ``data_checksum`` and ``data_size``
+    """
+    encoded = orjson.dumps(data)
+    if not should_offload(len(encoded)):
+        return {"data": data, "data_ref": None, "data_checksum": None, "data_size": None}
+
+    if table_hashes is not None and content_hash is not None:
+        await _store_blocks(db, data, table_hashes)
+        return {
+            "data": None,
+            "data_ref": f"{BLOCKS_REF}{content_hash}",
+            "data_checksum": content_hash,
+            "data_size": len(encoded),
+        }
+
+    compressed = await asyncio.to_thread(_compress, encoded)
+    checksum = hashlib.sha256(compressed).hexdigest()
+    key = f"{KEY_PREFIX}{checksum}.json.zst"
+    await get_blob_store().put(key, compressed)
+    return {
+        "data": None,
+        "data_ref": key,
+        "data_checksum": checksum,
+        "data_size": len(encoded),
+    }
+
+
+async def _store_blocks(
+    db: AsyncSession, data: Dict[str, Any], table_hashes: Dict[str, str]
+) -> None:
+    """Upload the blocks of a document that were not stored before."""
+    stored = await blocks.stored_keys(db, table_hashes.values())
+    for table, block in sorted(table_hashes.items()):
+        if block in stored:
+            continue
+        encoded = hashing.canonical_json(data[table])
+        compressed = await asyncio.to_thread(_compress, encoded)
+        key = block_key(block)
+        await get_blob_store().put(key, compressed)
+        await blocks.set_key(db, block, key)
+        stored[block] = key
+
+
+async def store(db: AsyncSession, contribution: Contribution, data: Any) -> None:
+    """
+    Set a contribution's document, offloading it if it is large enough.
+
+    Called instead of assigning ``contribution.data``, once its content
+    hashes are set. Once the contribution was reloaded, ``attach`` puts an
+    offloaded document back.
+
+    Args:
+        db: Database session
+        contribution: Contribution to update (not yet flushed)
+        data: New document
+    """
+    values = await stored_values(
+        db, data, contribution.content_hash, contribution.table_hashes
+    )
+    for column, value in values.items():
+        setattr(contribution, column, value)
+
+
+async def attach(contribution: Contribution, data: Any = None) -> None:
+    """
+    Make an offloaded document available as ``contribution.data``.
+
+    Offloaded contributions load with ``data`` None. Nothing is written back
+    to the row, and inline documents are left alone.
+
+    Args:
+        contribution: Loaded contribution
+        data: The document, if the caller has it; fetched otherwise
+    """
+    if is_offloaded(contribution):
+        if data is None:
+            data = await load_data(contribution)
+        set_committed_value(contribution, "data", data)
+
+
+async def _load_block(block_hash: str) -> bytes:
+    compressed = await get_blob_store().get(block_key(block_hash))
+    decompress = zstandard.ZstdDecompressor().decompress
+    encoded = await asyncio.to_thread(decompress, compressed)
+    if hashlib.sha256(encoded).hexdigest() != block_hash:
+        raise ChecksumMismatchError(block_key(block_hash))
+    return encoded
+
+
+def _document_tables(contribution: Contribution) -> List[Tuple[str, str]]:
+    """Get the (table, block hash) pairs of a document stored as blocks."""
+    table_hashes = contribution.table_hashes or {}
+    if hashing.combine_hashes(table_hashes) != contribution.data_checksum:
+        raise ChecksumMismatchError(contribution.data_ref)
+    return sorted(table_hashes.items())
+
+
+async def load_json(contribution: Contribution) -> bytes:
+    """
+    Read an offloaded document as JSON bytes.
+
+    Raises:
+        ChecksumMismatchError: If a blob was corrupted
+        FileNotFoundError: If a blob is missing
+    """
+    _require_zstandard()
+    if is_stored_as_blocks(contribution):
+        members = [
+            orjson.dumps(table) + b":" + await _load_block(block)
+            for table, block in _document_tables(contribution)
+        ]
+        return b"{" + b",".join(members) + b"}"
+
+    compressed = await get_blob_store().get(contribution.data_ref)
+    if hashlib.sha256(compressed).hexdigest() != contribution.data_checksum:
+        raise ChecksumMismatchError(contribution.data_ref)
+    return await asyncio.to_thread(
+        zstandard.ZstdDecompressor().decompress,
+        compressed,
+        max_output_size=contribution.data_size or 0,
+    )
+
+
+async def load_data(contribution: Contribution) -> Any:
+    """
+    Get a contribution's document, fetching it if it is offloaded.
+
+    Raises:
+        ChecksumMismatchError: If a blob was corrupted
+        FileNotFoundError: If a blob is missing
+    """
+    if not is_offloaded(contribution):
+        return contribution.data
+    return orjson.loads(await load_json(contribution))
+
+
+async def stream_json(contribution: Contribution) -> AsyncIterator[bytes]:
+    """
+    Stream an offloaded document as JSON bytes, decompressing as it goes.
+
+    A checksum can only be checked once a whole blob was read, so a
+    corrupted blob ends the stream with an error after its bytes were sent.
+
+    Raises:
+        ChecksumMismatchError: If a blob was corrupted
+        FileNotFoundError: If a blob is missing
+    """
+    _require_zstandard()
+    if not is_stored_as_blocks(contribution):
+        async for chunk in _stream_blob(
+            contribution.data_ref, contribution.data_checksum, compressed=True
+        ):
+            yield chunk
+        return
+
+    separator = b"{"
+    for table, block in _document_tables(contribution):
+        yield separator + orjson.dumps(table) + b":"
+        separator = b","
+        async for chunk in _stream_blob(block_key(block), block, compressed=False):
+            yield chunk
+    yield b"}" if separator == b"," else b"{}"
+
+
+async def _stream_blob(
+    key: str, checksum: str, compressed: bool
+) -> AsyncIterator[bytes]:
+    """Stream a zstd blob, checking the SHA-256 of its (de)compressed bytes."""
+    digest = hashlib.sha256()
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    async for chunk in get_blob_store().iter_bytes(key):
+        decompressed = decompressor.decompress(chunk)
+        digest.update(chunk if compressed else decompressed)
+        if decompressed:
+            yield decompressed
+    if digest.hexdigest() != checksum:
+        logger.error("Offloaded document %s is corrupted", key)
+        raise ChecksumMismatchError(key)
+
+
+async def project_json(
+    db: AsyncSession,
+    contribution: Contribution,
+    projection: Optional[Projection],
+) -> Union[bytes, str]:
+    """
+    Render an offloaded document as JSON, trimmed by a projection.
+
+    The projection is applied by the database, as for inline documents, to
+    the fetched document passed in as a parameter.
+
+    Returns:
+        JSON text of the (projected) document
+    """
+    document = await load_json(contribution)
+    if not projection:
+        return document
+    # Parsed once, rather than wherever the projection refers to it
+    parameter = bindparam("document", document.decode(), type_=Text)
+    source = (
+        select(cast(parameter, JSONB).label("d"))
+        .cte("document")
+        .prefix_with("MATERIALIZED")
+    )
+    return (
+        await db.execute(select(cast(projection.apply(source.c.d), Text)))
+    ).scalar_one()
+
+
+async def sweep(db: AsyncSession, dry_run: bool = False) -> int:
+    """
+    Delete whole-document blobs that no contribution refers to.
+
+    Blobs younger than ``DATA_OFFLOAD_SWEEP_GRACE_HOURS`` are kept, as a
+    transaction that stored one may not have committed yet.
+
+    Returns:
+        Number of blobs deleted (or that would be, on a dry run)
+    """
+    blobs = get_blob_store()
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        hours=settings.DATA_OFFLOAD_SWEEP_GRACE_HOURS
+    )
+    candidates = [
+        key for key, stored_at in await blobs.list(KEY_PREFIX) if stored_at < cutoff
+    ]
+    deleted = 0
+    for start in range(0, len(candidates), 1000):
+        batch = candidates[start:start + 1000]
+        referenced = set(
+            (
+                await db.execute(
+                    select(Contribution.data_ref)
+                    .where(Contribution.data_ref.in_(batch))
+                    .distinct()
+                )
+            ).scalars()
+        )
+        for key in batch:
+            if key in referenced:
+                continue
+            if not dry_run:
+                await blobs.delete(key)
+            deleted += 1
+    return deleted
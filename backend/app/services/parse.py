@@ -0,0 +1,191 @@
+"""
+Streaming parser for MagIC text files.
+
+Ported from the old backend's parse_contribution.js. Lines are consumed one
+at a time, so a file can be parsed straight from disk without reading it
+into memory first; only the resulting document is held.
+"""
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+MEASUREMENT_TABLES = {"measurements", "magic_measurements"}
+
+_TABLE_END = re.compile(r"^>+$")
+_TAB_DELIMITED = re.compile(r"^tab( delimited)?(\s|$)", re.IGNORECASE)
+
+
+class MagICParser:
+    """
+    Incremental parser for tab-delimited MagIC text.
+
+    Each table starts with a ``tab<TAB>table_name`` line (``magic`` format
+    only), followed by a line of column names and then rows, and ends with a
+    line of ``>`` characters. Measurements are stored as
+    ``{"columns": [...], "rows": [[...], ...]}``; other tables as lists of
+    row dicts without empty values.
+    """
+
+    def __init__(self, format: str = "magic"):
+        self.format = format
+        self.json: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.table = None
+        self.columns: List[str] = []
+        self.skip_table = False
+        self.table_line_number = 0
+        self.line_number = 0
+
+    def parse_lines(self, lines: Iterable[str]) -> "MagICParser":
+        """
+        Parse lines and finish the document.
+
+        Args:
+            lines: Lines of text, with or without line endings
+
+        Returns:
+            The parser, with ``json``, ``errors`` and ``warnings`` filled in
+        """
+        empty = True
+        for line in lines:
+            empty = False
+            self.feed_line(line)
+        if empty:
+            self.warnings.append("Contribution text is empty.")
+        self.finish()
+        return self
+
+    def finish(self) -> None:
+        """Warn about tables without any rows."""
+        for table, value in self.json.items():
+            rows = value["rows"] if isinstance(value, dict) else value
+            if len(rows) == 0:
+                self.warnings.append(f"No data values were found in the {table} table.")
+
+    def feed_line(self, line: str) -> None:
+        """Parse one line."""
+        line = line.rstrip("\r\n")
+
+        # Skip empty lines.
+        if line.strip() == "":
+            return
+
+        # A table separator ends any table, including one being skipped.
+        if _TABLE_END.match(line.strip()):
+            self.line_number += 1
+            self.table = None
+            self.columns = []
+            self.table_line_number = 0
+            self.skip_table = False
+            return
+
+        if self.skip_table:
+            return
+
+        self.line_number += 1
+        self.table_line_number += 1
+
+        if self.format == "magic" and self.table_line_number == 1:
+            self._parse_table_definition(line)
+        elif (self.format == "magic" and self.table_line_number == 2) or (
+            self.format == "tsv" and self.table_line_number == 1
+        ):
+            self._parse_columns(line)
+        else:
+            self._parse_row(line)
+
+    def _is_measurements(self) -> bool:
+        return (
+            self.format == "magic"
+            and self.table is not None
+            and self.table.lower() in MEASUREMENT_TABLES
+        )
+
+    def _parse_table_definition(self, line: str) -> None:
+        definition = [value.strip() for value in line.split("\t")]
+
+        if len(definition) < 2:
+            self.errors.append(
+                f"Invalid table definition on line {self.line_number}. "
+                'Expected something like "tab[tab]measurements[new line]".'
+            )
+            self.skip_table = True
+        elif not _TAB_DELIMITED.match(definition[0]):
+            self.errors.append(
+                f'Invalid table definition column delimiter "{definition[0]}" '
+                f'on line {self.line_number}. Expected "tab" or "tab delimited".'
+            )
+            self.skip_table = True
+        elif not definition[1]:
+            self.errors.append(
+                f"No table name following tab delimiter on line {self.line_number}."
+            )
+            self.skip_table = True
+        else:
+            self.table = definition[1].lower()
+            self.json.setdefault(self.table, [])
+
+    def _parse_columns(self, line: str) -> None:
+        self.columns = [value.strip().lower() for value in line.split("\t")]
+
+        if "" in self.columns:
+            self.errors.append(
+                f"Empty column names are not allowed on line {self.line_number}."
+            )
+            self.skip_table = True
+        elif len(self.columns) != len(set(self.columns)):
+            self.errors.append(
+                f"Found duplicate column names on line {self.line_number}."
+            )
+            self.skip_table = True
+        elif self._is_measurements():
+            self.json[self.table] = {"columns": self.columns, "rows": []}
+
+    def _parse_row(self, line: str) -> None:
+        values = line.split("\t")
+
+        if len(values) > len(self.columns):
+            self.errors.append(
+                f"More values found than columns on line {self.line_number}: {line}"
+            )
+            self.skip_table = True
+            return
+
+        values = [value.strip() for value in values]
+
+        # Use a default table of 'unknown' for non MagIC text files.
+        if self.table is None:
+            if self.format == "magic":
+                self.errors.append("No table name defined.")
+            self.table = "unknown"
+            self.json.setdefault(self.table, [])
+
+        if self._is_measurements():
+            self.json[self.table]["rows"].append(values)
+        else:
+            self.json[self.table].append(
+                {
+                    column: value
+                    for column, value in zip(self.columns, values)
+                    if value != ""
+                }
+            )
+
+
+def parse_file(
+    path: Union[str, Path], format: str = "magic"
+) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    """
+    Parse a MagIC text file line by line.
+
+    Args:
+        path: File to parse
+        format: "magic" for MagIC text files, "tsv" for a single table
+
+    Returns:
+        Tuple of (document, errors, warnings)
+    """
+    with open(path, "r", encoding="utf-8", errors="replace", newline=None) as file:
+        parser = MagICParser(format).parse_lines(file)
+    return parser.json, parser.errors, parser.warnings
@@ -0,0 +1,349 @@
+"""
+JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7386) applied in Postgres.
+
+Patches are compiled into one chain of subqueries, one per operation, each
+rewriting the document of the previous step with ``jsonb_set``,
+``jsonb_insert`` and ``#-``. The document never leaves the database, and the
+``ok`` column of the last step is false if a ``test`` failed or a path an
+operation needed did not exist, in which case the whole patch is skipped.
+"""
+import re
+from typing import Any, List, NamedTuple, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy import Text, and_, case, cast, func, literal, or_, select, true
+from sqlalchemy.dialects.postgresql import JSONB, array
+
+Pointer = Tuple[str, ...]
+
+JSON_PATCH_OPS = {"add", "remove", "replace", "move", "copy", "test"}
+
+# Array indexes have no leading zeros or sign (RFC 6901, section 4)
+ARRAY_INDEX = re.compile(r"0|[1-9][0-9]*")
+
+
+class PatchError(ValueError):
+    """Raised when a patch document is malformed."""
+
+
+class PatchConflictError(Exception):
+    """Raised when a well-formed patch cannot be applied to the document."""
+
+
+class Operation(NamedTuple):
+    """A single patch operation on a parsed path."""
+    op: str
+    path: Pointer
+    value: Any = None
+    from_path: Optional[Pointer] = None
+
+
+def parse_pointer(pointer: Any) -> Pointer:
+    """
+    Parse a JSON Pointer (RFC 6901) into its reference tokens.
+
+    Args:
+        pointer: Pointer string, e.g. ``"/sites/0/lat"``
+
+    Returns:
+        Tuple of unescaped tokens, empty for the whole document
+
+    Raises:
+        PatchError: If the pointer is not a string or does not start with "/"
+    """
+    if not isinstance(pointer, str):
+        raise PatchError("JSON Pointer must be a string")
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON Pointer '{pointer}'")
+    return tuple(
+        token.replace("~1", "/").replace("~0", "~")
+        for token in pointer[1:].split("/")
+    )
+
+
+def parse_json_patch(document: Any, max_operations: int) -> List[Operation]:
+    """
+    Validate an RFC 6902 patch document.
+
+    Args:
+        document: Decoded request body
+        max_operations: Maximum number of operations allowed
+
+    Returns:
+        Parsed operations
+
+    Raises:
+        PatchError: If the document is not a valid JSON Patch
+    """
+    if not isinstance(document, list):
+        raise PatchError("JSON Patch must be an array of operations")
+    if len(document) > max_operations:
+        raise PatchError(f"At most {max_operations} patch operations are allowed")
+
+    operations = []
+    for index, item in enumerate(document):
+        if not isinstance(item, dict) or item.get("op") not in JSON_PATCH_OPS:
+            raise PatchError(f"Operation {index} has no valid 'op'")
+        if "path" not in item:
+            raise PatchError(f"Operation {index} has no 'path'")
+        op = item["op"]
+        path = parse_pointer(item["path"])
+        if op in ("add", "replace", "test") and "value" not in item:
+            raise PatchError(f"Operation {index} ({op}) has no 'value'")
+        from_path = None
+        if op in ("move", "copy"):
+            if "from" not in item:
+                raise PatchError(f"Operation {index} ({op}) has no 'from'")
+            from_path = parse_pointer(item["from"])
+            if op == "move" and path[:len(from_path)] == from_path and path != from_path:
+                raise PatchError(f"Operation {index} moves a value into itself")
+        if op == "remove" and not path:
+            raise PatchError(f"Operation {index} removes the whole document")
+        operations.append(Operation(op, path, item.get("value"), from_path))
+    return operations
+
+
+def merge_patch_operations(
+    patch: Any, max_operations: int, path: Pointer = ()
+) -> List[Operation]:
+    """
+    Translate an RFC 7386 merge patch into internal operations.
+
+    Objects are merged key by key, ``null`` removes a key, and any other
+    value replaces the target. Besides ``discard`` and ``set`` the result
+    uses ``ensure_object``, which turns a missing or non-object target into
+    an empty object before its keys are merged.
+
+    Args:
+        patch: Decoded request body
+        max_operations: Maximum number of operations allowed
+        path: Location of ``patch`` within the document
+
+    Returns:
+        Operations in application order
+
+    Raises:
+        PatchError: If the patch expands to too many operations
+    """
+    if not isinstance(patch, dict):
+        return [Operation("set", path, patch)]
+    operations = [Operation("ensure_object", path)]
+    for key, value in patch.items():
+        if value is None:
+            operations.append(Operation("discard", path + (key,)))
+        elif isinstance(value, dict):
+            operations.extend(
+                merge_patch_operations(value, max_operations, path + (key,))
+            )
+        else:
+            operations.append(Operation("set", path + (key,), value))
+        if len(operations) > max_operations:
+            raise PatchError(f"At most {max_operations} patch operations are allowed")
+    return operations
+
+
+def touched_tables(operations: List[Operation]) -> Optional[Set[str]]:
+    """
+    Get the top-level keys (MagIC tables) a patch reads or writes.
+
+    Returns:
+        Set of table names, or None if an operation targets the whole document
+    """
+    tables = set()
+    for operation in operations:
+        for path in (operation.path, operation.from_path):
+            if path is None:
+                continue
+            if not path:
+                return None
+            tables.add(path[0])
+    return tables
+
+
+def _pointer(path: Pointer):
+    return array(list(path), type_=Text)
+
+
+def _at(document, path: Pointer):
+    if not path:
+        return document
+    return document.op("#>", return_type=JSONB)(_pointer(path))
+
+
+def _indexes_ok(document, path: Pointer):
+    """
+    Check that the tokens of a path that select array elements are indexes.
+
+    Postgres also reads "-1" from the end and "01" as 1, which RFC 6901
+    does not allow.
+    """
+    conditions = [
+        func.coalesce(
+            func.jsonb_typeof(_at(document, path[:position])) != "array", True
+        )
+        for position, token in enumerate(path)
+        if not ARRAY_INDEX.fullmatch(token)
+    ]
+    return and_(true(), *conditions)
+
+
+def _exists(document, path: Pointer):
+    return and_(_at(document, path).isnot(None), _indexes_ok(document, path))
+
+
+def _json(value: Any):
+    return cast(literal(orjson.dumps(value).decode()), JSONB)
+
+
+def _add(document, path: Pointer, value):
+    """RFC 6902 ``add``: insert into arrays, set on objects."""
+    if not path:
+        return value, true()
+    parent = _at(document, path[:-1])
+    key = path[-1]
+    in_array = func.jsonb_typeof(parent) == "array"
+    in_object = and_(
+        func.jsonb_typeof(parent) == "object", _indexes_ok(document, path[:-1])
+    )
+    set_key = func.jsonb_set(document, _pointer(path), value, True, type_=JSONB)
+    if key == "-":
+        append = func.jsonb_insert(
+            document, _pointer(path[:-1] + ("-1",)), value, True, type_=JSONB
+        )
+        return case((in_array, append), else_=set_key), or_(
+            and_(in_array, _indexes_ok(document, path[:-1])), in_object
+        )
+    insert = func.jsonb_insert(document, _pointer(path), value, type_=JSONB)
+    if ARRAY_INDEX.fullmatch(key):
+        # Inserting at the length of an array appends; beyond it is an error.
+        index_ok = and_(
+            in_array,
+            func.jsonb_array_length(parent) >= int(key),
+            _indexes_ok(document, path[:-1]),
+        )
+    else:
+        index_ok = literal(False)
+    return case((in_array, insert), else_=set_key), or_(index_ok, in_object)
+
+
+def _step(document, carried, operation: Operation):
+    """
+    Compile one operation.
+
+    Returns:
+        Tuple of (new document, condition, value carried to the next step)
+    """
+    op, path = operation.op, operation.path
+
+    if op == "add":
+        document_out, condition = _add(document, path, _json(operation.value))
+        return document_out, condition, None
+    if op == "remove":
+        return (
+            document.op("#-", return_type=JSONB)(_pointer(path)),
+            _exists(document, path),
+            None,
+        )
+    if op == "replace":
+        if not path:
+            return _json(operation.value), true(), None
+        return (
+            func.jsonb_set(
+                document, _pointer(path), _json(operation.value), False, type_=JSONB
+            ),
+            _exists(document, path),
+            None,
+        )
+    if op == "copy":
+        document_out, condition = _add(
+            document, path, _at(document, operation.from_path)
+        )
+        return (
+            document_out,
+            and_(_exists(document, operation.from_path), condition),
+            None,
+        )
+    if op == "move_out":
+        # First half of a move: take the value out and carry it along.
+        return (
+            document.op("#-", return_type=JSONB)(_pointer(operation.from_path)),
+            _exists(document, operation.from_path),
+            _at(document, operation.from_path),
+        )
+    if op == "move_in":
+        document_out, condition = _add(document, path, carried)
+        return document_out, condition, None
+    if op == "test":
+        matches = func.coalesce(_at(document, path) == _json(operation.value), False)
+        return document, and_(matches, _indexes_ok(document, path)), None
+    if op == "ensure_object":
+        target = _at(document, path)
+        as_object = case(
+            (func.jsonb_typeof(target) == "object", target),
+            else_=_json({}),
+        )
+        if not path:
+            return as_object, true(), None
+        return (
+            func.jsonb_set(document, _pointer(path), as_object, True, type_=JSONB),
+            true(),
+            None,
+        )
+    if op == "discard":
+        return document.op("#-", return_type=JSONB)(_pointer(path)), true(), None
+    if op == "set":
+        if not path:
+            return _json(operation.value), true(), None
+        return (
+            func.jsonb_set(
+                document, _pointer(path), _json(operation.value), True, type_=JSONB
+            ),
+            true(),
+            None,
+        )
+    raise PatchError(f"Unsupported operation '{op}'")
+
+
+def compile_patch(base, operations: List[Operation]):
+    """
+    Compile operations into a chain of subqueries over a document.
+
+    Each step selects from the previous one, so every operation refers to a
+    column and not to the expression of the steps before it, and both the
+    SQL and the work grow linearly with the number of operations.
+
+    Args:
+        base: Subquery with a JSONB column ``d`` and a boolean column ``ok``
+        operations: Operations from parse_json_patch or merge_patch_operations
+
+    Returns:
+        Subquery with the patched document as ``d`` and ``ok`` false if the
+        patch cannot be applied
+    """
+    steps: List[Operation] = []
+    for operation in operations:
+        if operation.op == "move":
+            if operation.from_path == operation.path:
+                continue
+            steps.append(operation._replace(op="move_out"))
+            steps.append(operation._replace(op="move_in"))
+        else:
+            steps.append(operation)
+
+    current = base
+    carried_column = None
+    for operation in steps:
+        document, condition, carried = _step(current.c.d, carried_column, operation)
+        columns = [
+            document.label("d"),
+            and_(current.c.ok, condition).label("ok"),
+        ]
+        if carried is not None:
+            columns.append(carried.label("v"))
+        # OFFSET 0 keeps the planner from flattening the chain, which would
+        # inline each step's document expression everywhere it is used.
+        current = select(*columns).offset(0).subquery()
+        carried_column = current.c.v if carried is not None else None
+    return current
@@ -0,0 +1,281 @@
+"""
+Server-side field projection of JSONB documents.
+
+Projections are compiled into SQL so that only the requested subtrees of a
+document leave the database. Paths are dotted key paths (``sites.lat``).
+When a path crosses an array, it applies to every element, the way source
+``includes``/``excludes`` filtering works in Elasticsearch; this is what
+makes ``sites.lat`` pick one column from every row of the sites table.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Text, case, cast, column, func, literal, null, select
+from sqlalchemy.dialects.postgresql import JSONB, array
+
+Path = Tuple[str, ...]
+
+MAX_PATHS = 100
+MAX_DEPTH = 8
+
+# Named views per search level, adapted from the old search_levels.js source
+# filters to the MagIC document layout (one list of rows per table). Paths for
+# the "contributions" level apply to whole contribution documents and to
+# contributions search rows, which keep the same "contribution" and
+# "locations" keys; paths for the other levels apply to the rows of that level.
+VIEWS: Dict[str, Dict[str, Dict[str, List[str]]]] = {
+    "contributions": {
+        "summaries": {"fields": ["contribution"], "exclude": []},
+        "map": {
+            "fields": [
+                "contribution.id",
+                "contribution.version",
+                "contribution.contributor",
+                "contribution.reference",
+                "locations.location",
+                "locations.lat_n",
+                "locations.lat_s",
+                "locations.lon_e",
+                "locations.lon_w",
+            ],
+            "exclude": [],
+        },
+        "rows": {"fields": [], "exclude": ["measurements"]},
+    },
+    "locations": {
+        "summaries": {"fields": [], "exclude": []},
+        "map": {
+            "fields": ["location", "lat_n", "lat_s", "lon_e", "lon_w"],
+            "exclude": [],
+        },
+        "rows": {"fields": [], "exclude": []},
+    },
+    "sites": {
+        "summaries": {"fields": [], "exclude": []},
+        "map": {"fields": ["site", "location", "lat", "lon"], "exclude": []},
+        "rows": {"fields": [], "exclude": []},
+    },
+    "samples": {
+        "summaries": {"fields": [], "exclude": []},
+        "map": {"fields": ["sample", "site", "lat", "lon"], "exclude": []},
+        "rows": {"fields": [], "exclude": []},
+    },
+    "specimens": {
+        "summaries": {"fields": [], "exclude": []},
+        "rows": {"fields": [], "exclude": []},
+    },
+    "experiments": {
+        "summaries": {"fields": [], "exclude": []},
+        "rows": {"fields": [], "exclude": []},
+    },
+    "measurements": {
+        "rows": {"fields": [], "exclude": []},
+    },
+}
+
+_EMPTY_OBJECT = cast(literal("{}"), JSONB)
+_EMPTY_ARRAY = cast(literal("[]"), JSONB)
+_JSON_NULL = cast(literal("null"), JSONB)
+
+
+def parse_paths(value: Optional[str]) -> List[Path]:
+    """
+    Parse a comma-separated list of dotted paths.
+
+    Args:
+        value: Query parameter value, e.g. ``"contribution,sites.lat"``
+
+    Returns:
+        List of key paths
+
+    Raises:
+        ValueError: If a path is empty, too deep, or there are too many
+    """
+    if not value:
+        return []
+    paths = []
+    for raw in value.split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        path = tuple(raw.split("."))
+        if any(not key for key in path):
+            raise ValueError(f"Invalid field path '{raw}'")
+        if len(path) > MAX_DEPTH:
+            raise ValueError(f"Field path '{raw}' is deeper than {MAX_DEPTH} levels")
+        paths.append(path)
+    if len(paths) > MAX_PATHS:
+        raise ValueError(f"At most {MAX_PATHS} field paths are allowed")
+    return paths
+
+
+def _path_tree(paths: Iterable[Path]) -> Dict:
+    """
+    Merge paths into a tree of dicts; ``None`` marks a whole subtree.
+
+    A path whose ancestor is already in the tree is redundant and dropped.
+    """
+    tree: Dict = {}
+    for path in sorted(set(paths), key=len):
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if node is None:
+                break
+        else:
+            node[path[-1]] = None
+    return tree
+
+
+def _get(expr, key: str):
+    """``expr -> key``, spelled out so it works before Postgres 14 subscripts."""
+    return expr.op("->", return_type=JSONB)(key)
+
+
+def _each_element(expr, build):
+    """Apply ``build`` to every element of a JSONB array expression."""
+    elements = (
+        func.jsonb_array_elements(expr).table_valued(column("value", JSONB)).alias()
+    )
+    return (
+        select(func.coalesce(func.jsonb_agg(build(elements.c.value)), _EMPTY_ARRAY))
+        .select_from(elements)
+        .scalar_subquery()
+    )
+
+
+def _per_element(expr, build, default):
+    """Apply ``build`` to an object, or to every object in an array."""
+    return case(
+        (func.jsonb_typeof(expr) == "object", build(expr)),
+        (func.jsonb_typeof(expr) == "array", _each_element(expr, build)),
+        else_=default,
+    )
+
+
+def _include_object(expr, tree: Dict, excluded: Optional[Dict] = None):
+    """
+    Keep only the paths in ``tree``, minus the paths in ``excluded``.
+
+    Exclusions are pushed down into the included subtrees, so every
+    sub-expression refers to the source document and the SQL grows linearly
+    with the number of paths.
+    """
+    excluded = excluded or {}
+    result = _EMPTY_OBJECT
+    for key, child in tree.items():
+        if key in excluded and excluded[key] is None:
+            continue
+        sub_excluded = excluded.get(key)
+        if child is None:
+            value = _get(expr, key)
+            if sub_excluded:
+                value = _per_element(
+                    value,
+                    lambda element, ex=sub_excluded: _exclude_object(element, ex),
+                    value,
+                )
+        else:
+            value = _per_element(
+                _get(expr, key),
+                lambda element, t=child, ex=sub_excluded: _include_object(
+                    element, t, ex
+                ),
+                null(),
+            )
+        # Keys missing from the document are left out, not set to null.
+        result = result.op("||", return_type=JSONB)(
+            case(
+                (expr.has_key(key), func.jsonb_build_object(key, value)),
+                else_=_EMPTY_OBJECT,
+            )
+        )
+    return result
+
+
+def _exclude_object(expr, tree: Dict):
+    """Remove the paths in ``tree`` from an object."""
+    leaves = [key for key, child in tree.items() if child is None]
+    result = expr
+    if leaves:
+        result = result.op("-", return_type=JSONB)(array(leaves, type_=Text))
+    for key, child in tree.items():
+        if child is not None:
+            value = _get(expr, key)
+            # create_if_missing=false leaves absent keys absent.
+            result = func.jsonb_set(
+                result,
+                array([key], type_=Text),
+                func.coalesce(
+                    _per_element(
+                        value,
+                        lambda element, t=child: _exclude_object(element, t),
+                        value,
+                    ),
+                    _JSON_NULL,
+                ),
+                False,
+                type_=JSONB,
+            )
+    return result
+
+
+class Projection:
+    """Requested includes and excludes for a JSONB document."""
+
+    def __init__(
+        self,
+        fields: Optional[List[Path]] = None,
+        exclude: Optional[List[Path]] = None,
+    ):
+        self.fields = fields or []
+        self.exclude = exclude or []
+
+    @classmethod
+    def from_query(
+        cls,
+        level: str,
+        fields: Optional[str] = None,
+        exclude: Optional[str] = None,
+        view: Optional[str] = None,
+    ) -> "Projection":
+        """
+        Build a projection from query parameters and an optional view preset.
+
+        Args:
+            level: Search level the view presets are looked up in
+            fields: Comma-separated paths to include
+            exclude: Comma-separated paths to exclude
+            view: Name of a view preset for the level
+
+        Raises:
+            ValueError: If a path is invalid or the view is unknown
+        """
+        include_paths = parse_paths(fields)
+        exclude_paths = parse_paths(exclude)
+        if view:
+            preset = VIEWS.get(level.lower(), {}).get(view.lower())
+            if preset is None:
+                raise ValueError(f"Unknown view '{view}' for {level}")
+            include_paths += parse_paths(",".join(preset["fields"]))
+            exclude_paths += parse_paths(",".join(preset["exclude"]))
+        return cls(include_paths, exclude_paths)
+
+    def __bool__(self) -> bool:
+        return bool(self.fields or self.exclude)
+
+    def apply(self, expr):
+        """
+        Compile the projection onto a JSONB column expression.
+
+        Args:
+            expr: JSONB column or expression holding an object
+
+        Returns:
+            JSONB expression with only the requested subtrees
+        """
+        excluded = _path_tree(self.exclude)
+        if self.fields:
+            return _include_object(expr, _path_tree(self.fields), excluded)
+        if excluded:
+            return _exclude_object(expr, excluded)
+        return expr
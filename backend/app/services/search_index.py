@@ -0,0 +1,408 @@
+"""
+Service layer for keeping the search cluster in sync with contributions.
+
+Write paths in ``ContributionService`` add a ``SearchOutbox`` row in the same
+transaction as the change. ``SearchIndexer`` drains the outbox with
+Elasticsearch/OpenSearch ``_bulk`` requests. Only the plain HTTP bulk API is
+used, so any local HTTP server that answers ``POST /_bulk`` can stand in for
+the cluster in tests.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import instrument_service
+from app.db.models.contribution import Contribution, ContributionStatus
+from app.db.models.outbox import SearchOutbox, SearchOutboxAction
+from app.db.session import AsyncSessionLocal
+from app.services import offload
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Bulk item statuses that mean "slow down and try again later".
+BACKPRESSURE_STATUSES = {429, 503}
+
+
+def index_name(repository: str) -> str:
+    """
+    Get the search index name for a repository.
+
+    Args:
+        repository: Repository name
+
+    Returns:
+        Index name, e.g. ``fiesta_magic``
+    """
+    return f"{settings.ELASTICSEARCH_INDEX_PREFIX}_{repository.lower()}"
+
+
+def enqueue(
+    db: AsyncSession,
+    contribution: Contribution,
+    action: SearchOutboxAction = SearchOutboxAction.INDEX,
+) -> SearchOutbox:
+    """
+    Add a search outbox entry for a contribution to the current transaction.
+
+    Args:
+        db: Database session
+        contribution: Contribution that changed
+        action: Index operation to apply
+
+    Returns:
+        The pending outbox entry
+    """
+    entry = SearchOutbox(
+        contribution_id=contribution.id,
+        repository=contribution.repository,
+        action=action,
+    )
+    db.add(entry)
+    return entry
+
+
+def enqueue_many(
+    db: AsyncSession,
+    repository: str,
+    contribution_ids: Iterable[int],
+    action: SearchOutboxAction = SearchOutboxAction.INDEX,
+) -> None:
+    """
+    Add search outbox entries for contributions that were changed in SQL.
+
+    Args:
+        db: Database session
+        repository: Repository of the contributions
+        contribution_ids: IDs of the contributions
+        action: Index operation to apply
+    """
+    db.add_all(
+        SearchOutbox(
+            contribution_id=contribution_id,
+            repository=repository,
+            action=action,
+        )
+        for contribution_id in contribution_ids
+    )
+
+
+@instrument_service
+async def get_index_lag(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Summarize how far the search index is behind the database.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Pending and failed entry counts and the age in seconds of the oldest
+        pending entry
+    """
+    pending_stmt = select(
+        func.count(SearchOutbox.id), func.min(SearchOutbox.created_at)
+    ).where(SearchOutbox.processed_at.is_(None))
+    failed_stmt = select(func.count(SearchOutbox.id)).where(
+        SearchOutbox.processed_at.is_not(None)
+    )
+
+    pending, oldest = (await db.execute(pending_stmt)).one()
+    failed = (await db.execute(failed_stmt)).scalar_one()
+
+    lag_seconds = 0.0
+    if oldest is not None:
+        lag_seconds = (datetime.now(timezone.utc) - oldest).total_seconds()
+
+    return {
+        "pending": pending,
+        "failed": failed,
+        "oldest_pending_at": oldest,
+        "lag_seconds": max(lag_seconds, 0.0),
+    }
+
+
+class SearchIndexer:
+    """
+    Background worker that drains the search outbox into the search cluster.
+
+    Several indexers may run at once (one per API worker or a dedicated
+    process); rows are claimed with ``FOR UPDATE SKIP LOCKED``. Repeated
+    entries for one contribution within a batch are collapsed to the newest.
+    Failed entries are retried with exponential backoff, and the batch size
+    is halved whenever the cluster pushes back with 429/503, then grows again
+    as requests succeed.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        client: Optional["httpx.AsyncClient"] = None,
+        batch_size: int = settings.SEARCH_INDEXER_BATCH_SIZE,
+        max_bulk_bytes: int = settings.SEARCH_INDEXER_MAX_BULK_BYTES,
+        poll_interval: float = settings.SEARCH_INDEXER_POLL_INTERVAL,
+        max_attempts: int = settings.SEARCH_INDEXER_MAX_ATTEMPTS,
+        max_backoff: float = settings.SEARCH_INDEXER_MAX_BACKOFF,
+    ):
+        # httpx is only imported by processes that run an indexer.
+        import httpx
+
+        self.session_factory = session_factory
+        self.client = client or httpx.AsyncClient(
+            base_url=settings.ELASTICSEARCH_HOST,
+            timeout=settings.SEARCH_INDEXER_TIMEOUT,
+        )
+        self.max_batch_size = batch_size
+        self.batch_size = batch_size
+        self.max_bulk_bytes = max_bulk_bytes
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._throttle_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        """Start draining the outbox in a background task."""
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the background task and close the HTTP client."""
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.client.aclose()
+
+    async def run(self) -> None:
+        """Drain the outbox until ``stop`` is called."""
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            delay = self._throttle_until - loop.time()
+            if delay <= 0:
+                try:
+                    if await self.drain_once():
+                        continue
+                except Exception:
+                    logger.exception("Search indexer batch failed")
+                delay = self.poll_interval
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    @instrument_service
+    async def drain_once(self) -> int:
+        """
+        Claim one batch of due outbox entries and send it to the cluster.
+
+        Returns:
+            Number of outbox entries claimed
+        """
+        async with self.session_factory() as db:
+            stmt = (
+                select(SearchOutbox)
+                .where(
+                    SearchOutbox.processed_at.is_(None),
+                    SearchOutbox.available_at <= func.now(),
+                )
+                .order_by(SearchOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            entries = (await db.execute(stmt)).scalars().all()
+            if not entries:
+                return 0
+
+            # Collapse to the newest entry per contribution; older ones are
+            # superseded and resolve together with it.
+            latest: Dict[int, SearchOutbox] = {}
+            for entry in entries:
+                latest[entry.contribution_id] = entry
+
+            actions = await self._build_actions(db, list(latest.values()))
+            results = await self._send(actions)
+            succeeded, retry = self._resolve(entries, latest, results)
+
+            if succeeded:
+                await db.execute(
+                    delete(SearchOutbox).where(SearchOutbox.id.in_(succeeded))
+                )
+            for entry, status, error in retry.values():
+                self._schedule_retry(entry, error or f"HTTP {status}")
+
+            self._adjust_batch_size(
+                any(status in BACKPRESSURE_STATUSES for _, status, _ in retry.values())
+            )
+            await db.commit()
+            return len(entries)
+
+    def _resolve(
+        self,
+        entries: List[SearchOutbox],
+        latest: Dict[int, SearchOutbox],
+        results: Dict[int, Tuple[int, Optional[str]]],
+    ) -> Tuple[List[int], Dict[int, Tuple[SearchOutbox, int, Optional[str]]]]:
+        """
+        Split claimed entries into resolved ones and ones to retry.
+
+        Every entry shares the outcome of the newest entry of its
+        contribution, judged by the action that was sent for it: deleting a
+        document the cluster does not have succeeds too.
+
+        Returns:
+            IDs of resolved entries, and (entry, status, error) by entry id
+            for the rest
+        """
+        succeeded, retry = [], {}
+        for entry in entries:
+            sent = latest[entry.contribution_id]
+            status, error = results[sent.id]
+            if 200 <= status < 300 or (
+                status == 404 and sent.action == SearchOutboxAction.DELETE
+            ):
+                succeeded.append(entry.id)
+            else:
+                retry[entry.id] = (entry, status, error)
+        return succeeded, retry
+
+    async def _build_actions(
+        self, db: AsyncSession, entries: List[SearchOutbox]
+    ) -> List[Tuple[int, bytes]]:
+        """
+        Serialize outbox entries into bulk API action lines.
+
+        Only published, public contributions are indexed. Those that no
+        longer exist, or are drafts or private, are turned into delete
+        actions, so the cluster never holds what searches must not show.
+
+        Returns:
+            List of (outbox entry id, NDJSON action bytes)
+        """
+        index_ids = [
+            entry.contribution_id
+            for entry in entries
+            if entry.action == SearchOutboxAction.INDEX
+        ]
+        documents = {}
+        if index_ids:
+            result = await db.execute(
+                select(Contribution).where(
+                    Contribution.id.in_(index_ids),
+                    Contribution.status == ContributionStatus.PUBLISHED,
+                    Contribution.is_public == True,
+                )
+            )
+            documents = {c.id: c for c in result.scalars().all()}
+
+        actions = []
+        for entry in entries:
+            meta = {"_index": index_name(entry.repository), "_id": str(entry.contribution_id)}
+            contribution = documents.get(entry.contribution_id)
+            if contribution is None:
+                entry.action = SearchOutboxAction.DELETE
+                lines = [json.dumps({"delete": meta})]
+            else:
+                document = contribution.to_dict()
+                if offload.is_offloaded(contribution):
+                    document["data"] = await offload.load_data(contribution)
+                lines = [
+                    json.dumps({"index": meta}),
+                    json.dumps(document, default=str),
+                ]
+            actions.append((entry.id, ("\n".join(lines) + "\n").encode()))
+        return actions
+
+    async def _send(
+        self, actions: List[Tuple[int, bytes]]
+    ) -> Dict[int, Tuple[int, Optional[str]]]:
+        """
+        Send actions in bulk requests no larger than ``max_bulk_bytes``.
+
+        Returns:
+            Mapping of outbox entry id to (HTTP status, error message)
+        """
+        results: Dict[int, Tuple[int, Optional[str]]] = {}
+        chunk: List[Tuple[int, bytes]] = []
+        size = 0
+        for action in actions:
+            if chunk and size + len(action[1]) > self.max_bulk_bytes:
+                results.update(await self._send_chunk(chunk))
+                chunk, size = [], 0
+            chunk.append(action)
+            size += len(action[1])
+        if chunk:
+            results.update(await self._send_chunk(chunk))
+        return results
+
+    async def _send_chunk(
+        self, chunk: List[Tuple[int, bytes]]
+    ) -> Dict[int, Tuple[int, Optional[str]]]:
+        """Send one bulk request and map per-item results back to entries."""
+        import httpx
+
+        try:
+            response = await self.client.post(
+                "/_bulk",
+                content=b"".join(body for _, body in chunk),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+        except httpx.HTTPError as e:
+            return {entry_id: (503, str(e)) for entry_id, _ in chunk}
+
+        if response.status_code >= 300:
+            error = response.text[:1000]
+            return {entry_id: (response.status_code, error) for entry_id, _ in chunk}
+
+        items = response.json().get("items", [])
+        results = {}
+        for (entry_id, _), item in zip(chunk, items):
+            outcome = next(iter(item.values()))
+            error = outcome.get("error")
+            results[entry_id] = (
+                outcome.get("status", 500),
+                json.dumps(error) if error else None,
+            )
+        for entry_id, _ in chunk[len(items):]:
+            results[entry_id] = (500, "Missing item in bulk response")
+        return results
+
+    def _schedule_retry(self, entry: SearchOutbox, error: str) -> None:
+        """Back off an entry, or park it as a dead letter after max attempts."""
+        entry.attempts += 1
+        entry.last_error = error[:4000]
+        if entry.attempts >= self.max_attempts:
+            entry.processed_at = datetime.now(timezone.utc)
+            logger.error(
+                "Giving up indexing contribution %s after %s attempts: %s",
+                entry.contribution_id,
+                entry.attempts,
+                error,
+            )
+            return
+        backoff = min(self.max_backoff, self.poll_interval * 2 ** entry.attempts)
+        entry.available_at = datetime.now(timezone.utc) + timedelta(seconds=backoff)
+
+    def _adjust_batch_size(self, throttled: bool) -> None:
+        """Halve the batch size under backpressure, grow it back otherwise."""
+        if throttled:
+            self.batch_size = max(1, self.batch_size // 2)
+            loop = asyncio.get_running_loop()
+            self._throttle_until = loop.time() + min(
+                self.max_backoff,
+                self.poll_interval * self.max_batch_size / self.batch_size,
+            )
+            logger.warning(
+                "Search cluster is pushing back, batch size now %s", self.batch_size
+            )
+        elif self.batch_size < self.max_batch_size:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
@@ -0,0 +1,453 @@
+"""
+Service layer for the per-level search tables.
+
+Write paths in ``ContributionService`` refresh the search rows of a
+contribution in the same transaction as the change, so the tables are never
+behind the contributions they were copied from. Only the levels whose source
+tables changed are rewritten; a visibility change only flips ``is_public``.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    Text,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.core.metrics import instrument_service
+from app.db.models.contribution import Contribution
+from app.db.models.search import SEARCH_TABLES, SearchLevel
+from app.schemas.token import UserResponse
+from app.services import offload
+from app.services.projection import Projection
+
+# Rows per INSERT statement when a level is rewritten.
+INSERT_BATCH_SIZE = 5000
+
+# Document tables each level is built from.
+LEVEL_SOURCES: Dict[SearchLevel, Tuple[str, ...]] = {
+    SearchLevel.CONTRIBUTIONS: ("contribution", "locations"),
+    SearchLevel.LOCATIONS: ("locations",),
+    SearchLevel.SITES: ("sites",),
+    SearchLevel.SAMPLES: ("samples",),
+    SearchLevel.SPECIMENS: ("specimens",),
+    SearchLevel.EXPERIMENTS: ("measurements",),
+    SearchLevel.MEASUREMENTS: ("measurements",),
+}
+
+# Tables counted on the contributions level rows.
+COUNTED_TABLES = ("locations", "sites", "samples", "specimens", "measurements")
+
+
+def table_rows(data: Dict[str, Any], table: str) -> List[Dict[str, Any]]:
+    """
+    Get the rows of a table in a contribution document as dicts.
+
+    Tables are lists of row dicts, except measurements, which may be stored
+    as ``{"columns": [...], "rows": [[...], ...]}``.
+
+    Args:
+        data: Contribution document
+        table: Table name
+
+    Returns:
+        List of rows, empty if the table is missing
+    """
+    value = data.get(table) if isinstance(data, dict) else None
+    if isinstance(value, list):
+        return [row for row in value if isinstance(row, dict)]
+    if isinstance(value, dict) and isinstance(value.get("columns"), list):
+        columns = value["columns"]
+        return [
+            {
+                column: cell
+                for column, cell in zip(columns, row)
+                if cell is not None and cell != ""
+            }
+            for row in value.get("rows") or []
+        ]
+    return []
+
+
+def _experiment_rows(measurements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group measurement rows into one row per experiment and specimen."""
+    experiments: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for row in measurements:
+        name = row.get("experiment")
+        if not name:
+            continue
+        key = (name, row.get("specimen"))
+        experiment = experiments.get(key)
+        if experiment is None:
+            experiment = experiments[key] = {
+                "experiment": name,
+                "specimen": row.get("specimen"),
+                "method_codes": [],
+                "_n_measurements": 0,
+            }
+        experiment["_n_measurements"] += 1
+        for code in str(row.get("method_codes") or "").split(":"):
+            code = code.strip()
+            if code and code not in experiment["method_codes"]:
+                experiment["method_codes"].append(code)
+    for experiment in experiments.values():
+        experiment["method_codes"] = ":".join(experiment["method_codes"])
+    return list(experiments.values())
+
+
+def level_rows(
+    data: Dict[str, Any],
+    level: SearchLevel,
+    counts: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the search rows of one level from a contribution document.
+
+    Args:
+        data: Contribution document, or just the tables the level is built from
+        level: Search level
+        counts: Row counts of COUNTED_TABLES, counted in ``data`` if omitted
+
+    Returns:
+        Search rows in document order
+    """
+    if level == SearchLevel.CONTRIBUTIONS:
+        contribution = table_rows(data, "contribution")
+        row = {
+            "contribution": contribution[0] if contribution else {},
+            "locations": table_rows(data, "locations"),
+        }
+        for table in COUNTED_TABLES:
+            row[f"_n_{table}"] = (
+                counts[table] if counts is not None else len(table_rows(data, table))
+            )
+        return [row]
+    if level == SearchLevel.EXPERIMENTS:
+        return _experiment_rows(table_rows(data, "measurements"))
+    return table_rows(data, level.value)
+
+
+def levels_for_tables(tables: Optional[Iterable[str]]) -> Set[SearchLevel]:
+    """
+    Get the levels built from any of the given document tables.
+
+    Args:
+        tables: Changed table names, None if the whole document was replaced
+
+    Returns:
+        Levels that need to be rewritten
+    """
+    if tables is None:
+        return set(SearchLevel)
+    tables = set(tables)
+    levels = {
+        level
+        for level, sources in LEVEL_SOURCES.items()
+        if tables.intersection(sources)
+    }
+    # Row counts on the contributions level cover the other tables too.
+    if tables.intersection(COUNTED_TABLES):
+        levels.add(SearchLevel.CONTRIBUTIONS)
+    return levels
+
+
+def _batches(rows: List[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+@instrument_service
+async def refresh(
+    db: AsyncSession,
+    contribution: Contribution,
+    levels: Optional[Iterable[SearchLevel]] = None,
+    data: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Rewrite the search rows of a contribution in the current transaction.
+
+    Args:
+        db: Database session
+        contribution: Contribution whose document changed (flushed, with id)
+        levels: Levels to rewrite, all levels by default
+        data: The document, if the caller has it; read from the
+            contribution otherwise, fetching it if it is offloaded
+    """
+    if data is None:
+        data = await offload.load_data(contribution)
+    await _write_levels(
+        db,
+        contribution.id,
+        contribution.repository,
+        bool(contribution.is_public),
+        bool(contribution.is_latest),
+        data,
+        SearchLevel if levels is None else levels,
+    )
+
+
+@instrument_service
+async def refresh_from_db(
+    db: AsyncSession, contribution_id: int, levels: Iterable[SearchLevel]
+) -> None:
+    """
+    Rewrite search rows from the stored document, reading only what they need.
+
+    Used after the document was changed inside the database: only the
+    tables the levels are built from are read back, and row counts for the
+    contributions level are taken in SQL.
+
+    Args:
+        db: Database session
+        contribution_id: ID of the contribution
+        levels: Levels to rewrite
+    """
+    levels = list(levels)
+    if not levels:
+        return
+    tables = sorted({table for level in levels for table in LEVEL_SOURCES[level]})
+    data = Contribution.data
+    columns = [Contribution.repository, Contribution.is_public, Contribution.is_latest]
+    columns += [data.op("->", return_type=JSONB)(table).label(table) for table in tables]
+    with_counts = SearchLevel.CONTRIBUTIONS in levels
+    if with_counts:
+        columns += [
+            _row_count(data, table).label(f"_n_{table}") for table in COUNTED_TABLES
+        ]
+    row = (
+        await db.execute(select(*columns).where(Contribution.id == contribution_id))
+    ).one_or_none()
+    if row is None:
+        return
+    found = row._mapping
+    counts = (
+        {table: found[f"_n_{table}"] for table in COUNTED_TABLES}
+        if with_counts
+        else None
+    )
+    await _write_levels(
+        db,
+        contribution_id,
+        found["repository"],
+        bool(found["is_public"]),
+        bool(found["is_latest"]),
+        {table: found[table] for table in tables if found[table] is not None},
+        levels,
+        counts,
+    )
+
+
+def _row_count(document, table: str):
+    """SQL row count of a table stored as a list or as columns and rows."""
+    value = document.op("->", return_type=JSONB)(table)
+    rows = value.op("->", return_type=JSONB)("rows")
+    return case(
+        (func.jsonb_typeof(value) == "array", func.jsonb_array_length(value)),
+        (func.jsonb_typeof(rows) == "array", func.jsonb_array_length(rows)),
+        else_=0,
+    )
+
+
+async def _write_levels(
+    db: AsyncSession,
+    contribution_id: int,
+    repository: str,
+    is_public: bool,
+    is_latest: bool,
+    data: Dict[str, Any],
+    levels: Iterable[SearchLevel],
+    counts: Optional[Dict[str, int]] = None,
+) -> None:
+    for level in levels:
+        model = SEARCH_TABLES[level]
+        await db.execute(
+            delete(model).where(model.contribution_id == contribution_id)
+        )
+        rows = [
+            {
+                "contribution_id": contribution_id,
+                "repository": repository,
+                "is_public": is_public,
+                "is_latest": is_latest,
+                "row_index": index,
+                "row": row,
+            }
+            for index, row in enumerate(level_rows(data, level, counts))
+        ]
+        for batch in _batches(rows, INSERT_BATCH_SIZE):
+            await db.execute(insert(model), batch)
+
+
+@instrument_service
+async def set_public(
+    db: AsyncSession, contribution_ids: List[int], is_public: bool
+) -> None:
+    """
+    Update the visibility of the search rows of contributions.
+
+    Args:
+        db: Database session
+        contribution_ids: IDs of the contributions
+        is_public: New visibility
+    """
+    if not contribution_ids:
+        return
+    for model in SEARCH_TABLES.values():
+        await db.execute(
+            update(model)
+            .where(model.contribution_id.in_(contribution_ids))
+            .values(is_public=is_public)
+        )
+
+
+@instrument_service
+async def set_latest(
+    db: AsyncSession, contribution_ids: List[int], is_latest: bool
+) -> None:
+    """
+    Update whether the search rows of contributions are of a latest version.
+
+    Args:
+        db: Database session
+        contribution_ids: IDs of the contributions
+        is_latest: Whether they are the latest version of their lineage
+    """
+    if not contribution_ids:
+        return
+    for model in SEARCH_TABLES.values():
+        await db.execute(
+            update(model)
+            .where(model.contribution_id.in_(contribution_ids))
+            .values(is_latest=is_latest)
+        )
+
+
+def parse_filters(filters: Optional[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Parse ``field:value`` filters into JSONB containment documents.
+
+    Dotted fields filter nested objects (``contribution.id:5``). A value that
+    reads as a JSON number or boolean also matches that typed value, since
+    MagIC rows mix both.
+
+    Args:
+        filters: Filter conditions, e.g. ``"site:site1,method_codes:LP-DIR-AF"``
+
+    Returns:
+        For each filter, a list of alternative documents to contain
+
+    Raises:
+        ValueError: If a filter is not in ``field:value`` form
+    """
+    conditions = []
+    for part in (filters or "").split(","):
+        if not part.strip():
+            continue
+        field, separator, value = part.partition(":")
+        field = field.strip()
+        if not separator or not field:
+            raise ValueError(f"Invalid filter '{part}', expected field:value")
+        values: List[Any] = [value]
+        try:
+            typed = json.loads(value)
+        except ValueError:
+            typed = None
+        if isinstance(typed, (bool, int, float)):
+            values.append(typed)
+        alternatives = []
+        for candidate in values:
+            document: Any = candidate
+            for key in reversed(field.split(".")):
+                document = {key: document}
+            alternatives.append(document)
+        conditions.append(alternatives)
+    return conditions
+
+
+@instrument_service
+async def search_rows(
+    db: AsyncSession,
+    level: SearchLevel,
+    repository: str,
+    filters: Optional[List[List[Dict[str, Any]]]] = None,
+    user: Optional[UserResponse] = None,
+    sort: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 10,
+    projection: Optional[Projection] = None,
+    only_latest: bool = False,
+    with_total: bool = False,
+) -> Tuple[List[Tuple[Any, str]], Optional[int], bool]:
+    """
+    Search the rows of one level, returning each row as JSON text.
+
+    Counting every match scans the whole filtered table, so the total is
+    only computed on request; whether more pages follow is known from
+    reading one row past the page.
+
+    Args:
+        db: Database session
+        level: Search level
+        repository: Repository name
+        filters: Containment alternatives from parse_filters
+        user: User whose private rows are included, None for public rows only
+        sort: Sort field and direction, e.g. ``"lat:desc"``
+        page: Page number (1-based)
+        per_page: Items per page
+        projection: Subtrees of the rows to return, applied in SQL
+        only_latest: Only search the latest version of each contribution
+        with_total: Also count all matching rows
+
+    Returns:
+        Tuple of (list of (search row without row data, row JSON), total count
+        or None, whether more rows follow)
+    """
+    model = SEARCH_TABLES[level]
+    conditions = [model.repository == repository]
+
+    if user is None:
+        conditions.append(model.is_public == True)
+    elif not user.is_superuser:
+        own = select(Contribution.id).where(Contribution.created_by == user.id)
+        conditions.append(or_(model.is_public == True, model.contribution_id.in_(own)))
+
+    if only_latest:
+        conditions.append(model.is_latest == True)
+
+    for alternatives in filters or []:
+        conditions.append(or_(*(model.row.contains(doc) for doc in alternatives)))
+
+    row = projection.apply(model.row) if projection else model.row
+    stmt = (
+        select(model, cast(row, Text).label("row_json"))
+        .options(defer(model.row))
+        .where(and_(*conditions))
+    )
+    if sort:
+        field, _, direction = sort.partition(":")
+        key = model.row.op("->", return_type=JSONB)(field.strip())
+        stmt = stmt.order_by(key.desc() if direction.lower() == "desc" else key.asc())
+    stmt = stmt.order_by(model.contribution_id, model.row_index)
+
+    offset = (page - 1) * per_page
+    stmt = stmt.offset(offset).limit(per_page + 1)
+
+    rows = [tuple(found) for found in (await db.execute(stmt)).all()]
+    has_more = len(rows) > per_page
+    total = None
+    if with_total:
+        count_stmt = select(func.count(model.id)).where(and_(*conditions))
+        total = (await db.execute(count_stmt)).scalar_one()
+
+    return rows[:per_page], total, has_more
@@ -0,0 +1,428 @@
+"""
+Service layer for resumable, chunked contribution uploads.
+
+The protocol follows tus (https://tus.io): a session is created with the
+total ``Upload-Length``, chunks are sent with ``PATCH`` and an
+``Upload-Offset``, and ``HEAD`` tells a client where to resume. Unlike tus
+core, chunks may arrive out of order and in parallel: each chunk is verified,
+then written into a sparse spool file at its offset and the session records
+the byte ranges received. When they cover the file it is parsed in the
+background, line by line, and stored as a contribution.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import instrument_service
+from app.db.models.upload import UploadSession, UploadStatus
+from app.db.session import AsyncSessionLocal
+from app.schemas.data import DataCreate, DataType
+from app.schemas.token import UserResponse
+from app.services import parse
+from app.services.contribution import ContributionService
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_ALGORITHMS = {"md5", "sha1", "sha256"}
+
+
+class UploadError(Exception):
+    """Raised when a chunk cannot be accepted."""
+
+
+class UploadOffsetError(UploadError):
+    """Raised when a chunk does not fit in the upload."""
+
+
+class ChecksumMismatchError(UploadError):
+    """Raised when a chunk does not match its Upload-Checksum."""
+
+
+class UploadStateError(UploadError):
+    """Raised when an upload no longer accepts chunks."""
+
+
+def spool_path(upload_id: str) -> Path:
+    """Get the spool file of an upload session."""
+    return Path(settings.UPLOAD_DIR) / f"{upload_id}.part"
+
+
+def parse_metadata(header: Optional[str]) -> Dict[str, str]:
+    """
+    Decode a tus ``Upload-Metadata`` header.
+
+    Args:
+        header: Comma-separated ``key base64value`` pairs
+
+    Returns:
+        Decoded metadata
+
+    Raises:
+        UploadError: If a value is not valid base64
+    """
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError) as e:
+            raise UploadError(f"Invalid Upload-Metadata value for '{key}'") from e
+    return metadata
+
+
+def parse_checksum(header: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """
+    Decode a tus ``Upload-Checksum`` header.
+
+    Args:
+        header: ``algorithm base64digest``, e.g. ``sha256 n4bQgYhMfWWaL...``
+
+    Returns:
+        Tuple of (algorithm, digest), or None without a header
+
+    Raises:
+        UploadError: If the algorithm is unsupported or the digest malformed
+    """
+    if not header:
+        return None
+    algorithm, _, digest = header.strip().partition(" ")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm '{algorithm}'")
+    try:
+        return algorithm, base64.b64decode(digest, validate=True)
+    except binascii.Error as e:
+        raise UploadError("Invalid Upload-Checksum digest") from e
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """
+    Add a ``[start, end)`` byte range to a sorted list of disjoint ranges.
+
+    Returns:
+        Sorted, merged ranges
+    """
+    merged: List[List[int]] = []
+    for low, high in sorted([*ranges, [start, end]]):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def contiguous_offset(ranges: List[List[int]]) -> int:
+    """Get the number of bytes received from the start without gaps."""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+@instrument_service
+async def create_session(
+    db: AsyncSession,
+    repository: str,
+    upload_length: int,
+    metadata: Dict[str, str],
+    user: UserResponse,
+) -> UploadSession:
+    """
+    Create an upload session and its spool file.
+
+    Args:
+        db: Database session
+        repository: Repository name
+        upload_length: Total size of the file in bytes
+        metadata: Decoded Upload-Metadata; ``data_type`` is required,
+            ``format`` and ``filename`` are optional
+        user: User uploading the file
+
+    Returns:
+        Created upload session
+
+    Raises:
+        UploadError: If the length or metadata are invalid
+    """
+    if upload_length < 0 or upload_length > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"Upload-Length must be at most {settings.UPLOAD_MAX_SIZE}")
+    if metadata.get("data_type") not in {data_type.value for data_type in DataType}:
+        raise UploadError("Upload-Metadata must include a valid data_type")
+    upload_format = metadata.get("format", "magic")
+    if upload_format not in ("magic", "tsv"):
+        raise UploadError("Upload-Metadata format must be magic or tsv")
+
+    await expire_sessions(db)
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        repository=repository,
+        data_type=metadata["data_type"],
+        format=upload_format,
+        filename=metadata.get("filename"),
+        upload_length=upload_length,
+        received=[],
+        status=UploadStatus.UPLOADING,
+        expires_at=datetime.now(timezone.utc)
+        + timedelta(hours=settings.UPLOAD_EXPIRE_HOURS),
+        created_by=user.id,
+    )
+    await asyncio.to_thread(_create_spool_file, spool_path(upload.id), upload_length)
+    db.add(upload)
+    await db.commit()
+    return upload
+
+
+def _create_spool_file(path: Path, length: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as file:
+        # Sparse: disk space is only used as chunks arrive.
+        file.truncate(length)
+
+
+@instrument_service
+async def get_session(
+    db: AsyncSession,
+    upload_id: str,
+    user: UserResponse,
+    for_update: bool = False,
+) -> Optional[UploadSession]:
+    """
+    Get an upload session of a user.
+
+    Args:
+        db: Database session
+        upload_id: ID of the upload session
+        user: User who created it (superusers see all sessions)
+        for_update: Lock the session row until the transaction ends
+
+    Returns:
+        Upload session if found, None otherwise
+    """
+    stmt = select(UploadSession).where(UploadSession.id == upload_id)
+    if not user.is_superuser:
+        stmt = stmt.where(UploadSession.created_by == user.id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+async def read_chunk(
+    upload: UploadSession,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    checksum: Optional[Tuple[str, bytes]] = None,
+) -> bytes:
+    """
+    Read a chunk from a request stream and verify it.
+
+    The chunk is held in memory (at most UPLOAD_MAX_CHUNK_SIZE) so that
+    nothing reaches the spool file before it matches its checksum.
+
+    Args:
+        upload: Upload session
+        offset: Byte offset of the chunk
+        chunks: Request body stream
+        checksum: Expected (algorithm, digest) of the chunk
+
+    Returns:
+        Chunk bytes
+
+    Raises:
+        UploadStateError: If the upload no longer accepts chunks
+        UploadOffsetError: If the chunk does not fit in the upload
+        ChecksumMismatchError: If the chunk does not match its checksum
+    """
+    if upload.status != UploadStatus.UPLOADING:
+        raise UploadStateError(f"Upload is {upload.status.value}")
+    if offset < 0 or offset > upload.upload_length:
+        raise UploadOffsetError("Upload-Offset is outside the upload")
+    limit = min(upload.upload_length - offset, settings.UPLOAD_MAX_CHUNK_SIZE)
+    digest = hashlib.new(checksum[0]) if checksum else None
+
+    buffer = bytearray()
+    async for chunk in chunks:
+        if len(buffer) + len(chunk) > limit:
+            raise UploadOffsetError(
+                "Chunk is larger than the rest of the upload or the chunk size limit"
+            )
+        buffer += chunk
+        if digest is not None:
+            digest.update(chunk)
+
+    if digest is not None and digest.digest() != checksum[1]:
+        raise ChecksumMismatchError("Chunk does not match Upload-Checksum")
+    return bytes(buffer)
+
+
+def overlaps(ranges: List[List[int]], start: int, end: int) -> bool:
+    """Check whether a ``[start, end)`` byte range overlaps received ranges."""
+    return any(low < end and start < high for low, high in ranges)
+
+
+@instrument_service
+async def write_chunk(
+    db: AsyncSession,
+    upload_id: str,
+    user: UserResponse,
+    offset: int,
+    chunk: bytes,
+) -> Tuple[Optional[UploadSession], bool]:
+    """
+    Write a verified chunk into the spool file and record its byte range.
+
+    The session row is locked while the chunk is written, so chunks are
+    serialized against each other and against the upload completing: a
+    chunk is only written while the upload is still receiving, and never
+    over bytes already received.
+
+    Args:
+        db: Database session
+        upload_id: ID of the upload session
+        user: User who created it
+        offset: Byte offset of the chunk
+        chunk: Chunk bytes, from read_chunk
+
+    Returns:
+        Tuple of (upload session, whether this chunk completed the upload)
+
+    Raises:
+        UploadStateError: If the upload no longer accepts chunks
+        UploadOffsetError: If the chunk overlaps bytes already received
+    """
+    upload = await get_session(db, upload_id, user, for_update=True)
+    if upload is None:
+        return None, False
+    start, end = offset, offset + len(chunk)
+    try:
+        if upload.status != UploadStatus.UPLOADING:
+            raise UploadStateError(f"Upload is {upload.status.value}")
+        if end > start and overlaps(upload.received or [], start, end):
+            raise UploadOffsetError("Chunk overlaps bytes already received")
+    except UploadError:
+        await db.rollback()
+        raise
+
+    completed = False
+    if end > start:
+        await asyncio.to_thread(_write_spool_file, spool_path(upload.id), chunk, start)
+        upload.received = merge_range(upload.received or [], start, end)
+        if contiguous_offset(upload.received) >= upload.upload_length:
+            upload.status = UploadStatus.PROCESSING
+            completed = True
+    await db.commit()
+    return upload, completed
+
+
+def _write_spool_file(path: Path, chunk: bytes, offset: int) -> None:
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        written = 0
+        while written < len(chunk):
+            written += os.pwrite(fd, chunk[written:], offset + written)
+    finally:
+        os.close(fd)
+
+
+@instrument_service
+async def process_upload(upload_id: str, user: UserResponse) -> None:
+    """
+    Parse a completed upload and store it as a contribution.
+
+    Runs after the response to the final chunk, with its own database
+    session. Parse errors are stored on the session.
+
+    Args:
+        upload_id: ID of the completed upload session
+        user: User who created it
+    """
+    async with AsyncSessionLocal() as db:
+        upload = await get_session(db, upload_id, user)
+        if upload is None or upload.status != UploadStatus.PROCESSING:
+            return
+        path = spool_path(upload.id)
+        try:
+            data, errors, warnings = await asyncio.to_thread(
+                parse.parse_file, path, upload.format
+            )
+            if errors:
+                upload.status = UploadStatus.FAILED
+                upload.error = "\n".join(errors)
+                await db.commit()
+                return
+            contribution = await ContributionService.create_contribution(
+                db,
+                DataCreate(
+                    data=data,
+                    data_type=upload.data_type,
+                    metadata={
+                        "filename": upload.filename,
+                        "upload_id": upload.id,
+                        "warnings": warnings,
+                    },
+                ),
+                upload.repository,
+                user,
+            )
+            upload.contribution_id = contribution.id
+            upload.status = UploadStatus.COMPLETED
+            await db.commit()
+            await asyncio.to_thread(path.unlink, True)
+        except Exception as e:
+            logger.exception("Processing upload %s failed", upload_id)
+            await db.rollback()
+            upload = await get_session(db, upload_id, user)
+            if upload is not None:
+                upload.status = UploadStatus.FAILED
+                upload.error = str(e)
+                await db.commit()
+
+
+@instrument_service
+async def delete_session(db: AsyncSession, upload: UploadSession) -> None:
+    """
+    Delete an upload session and its spool file.
+
+    Args:
+        db: Database session
+        upload: Upload session
+    """
+    await asyncio.to_thread(spool_path(upload.id).unlink, True)
+    await db.delete(upload)
+    await db.commit()
+
+
+@instrument_service
+async def expire_sessions(db: AsyncSession) -> int:
+    """
+    Delete unfinished upload sessions past their expiry and their files.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of sessions deleted
+    """
+    result = await db.execute(
+        delete(UploadSession)
+        .where(
+            UploadSession.expires_at < datetime.now(timezone.utc),
+            UploadSession.status == UploadStatus.UPLOADING,
+        )
+        .returning(UploadSession.id)
+    )
+    expired = result.scalars().all()
+    for upload_id in expired:
+        await asyncio.to_thread(spool_path(upload_id).unlink, True)
+    return len(expired)
@@ -9,8 +9,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.user import User
 from app.schemas.token import UserCreate, UserResponse
 from app.core.security import get_password_hash
+from app.core.metrics import instrument_service
 
 
+@instrument_service
 async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     """
     Get a user by ID.
@@ -26,6 +28,7 @@ async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     return result.scalars().first()
 
 
+@instrument_service
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """
     Get a user by email.
@@ -41,6 +44,7 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     return result.scalars().first()
 
 
+@instrument_service
 async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
     """
     Create a new user.
@@ -65,6 +69,7 @@ async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
     return db_user
 
 
+@instrument_service
 async def update_user_last_login(db: AsyncSession, user: User) -> None:
     """
     Update the user's last login timestamp.
@@ -85,6 +90,7 @@ async def update_user_last_login(db: AsyncSession, user: User) -> None:
     await db.commit()
 
 
+@instrument_service
 async def authenticate(
     db: AsyncSession, email: str, password: str
 ) -> Optional[UserResponse]:
@@ -110,4 +116,4 @@ async def authenticate(
     # Update last login time
     await update_user_last_login(db, user)
     
-    return UserResponse.from_orm(user)
+    return UserResponse.model_validate(user, from_attributes=True)
@@ -0,0 +1,144 @@
+"""
+Measure the cold start of an API worker.
+
+Every run starts a fresh interpreter that imports ``app.main`` and then
+loads the 3.0 data model, method codes and vocabularies from the snapshot
+(see app/core/data_models.py), reporting the time of each step and the peak
+resident memory. With ``--json-dump``, loading the same data by parsing the
+JSON dump of ``scripts/dump_data_models.js`` is timed as well, for
+comparison. ``--importtime`` lists the modules that take longest to import,
+from ``python -X importtime``, to find what to defer next.
+
+Usage (from backend/, after ``python -m scripts.build_data_models``):
+
+    python -m benchmarks.cold_start --runs 10 --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.core import data_models
+data_models.get_data_model("3.0")
+data_models.get_method_codes()
+data_models.get_vocabularies()
+loaded = time.perf_counter()
+result = {
+    "import_ms": (imported - started) * 1000,
+    "snapshot_ms": (loaded - imported) * 1000,
+}
+if len(sys.argv) > 1:
+    import orjson
+    parse_started = time.perf_counter()
+    with open(sys.argv[1], "rb") as f:
+        document = orjson.loads(f.read())
+    result["json_ms"] = (time.perf_counter() - parse_started) * 1000
+result["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("APP_SECRET_KEY", "benchmark")
+    env.setdefault("SECRET_KEY", "benchmark")
+    env.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/benchmark")
+    return env
+
+
+def run_once(json_dump: Optional[Path]) -> Dict[str, float]:
+    """Start one interpreter and return its timings."""
+    args = [sys.executable, "-c", CHILD]
+    if json_dump is not None:
+        args.append(str(json_dump))
+    child = subprocess.run(
+        args, cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True
+    )
+    if child.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{child.stderr.strip()}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int) -> List[Dict[str, Any]]:
+    """
+    Import ``app.main`` under ``-X importtime``.
+
+    Returns:
+        The modules that take longest to import themselves, slowest first
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True,
+        check=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[12:].split("|"))
+        if own.isdigit():
+            modules.append({
+                "module": name,
+                "own_ms": int(own) / 1000,
+                "cumulative_ms": int(cumulative) / 1000,
+            })
+    modules.sort(key=lambda module: module["own_ms"], reverse=True)
+    return modules[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json-dump", type=Path, help="JSON dump to compare with")
+    parser.add_argument(
+        "--importtime", type=int, nargs="?", const=15, default=0,
+        help="List the slowest imports (default 15)",
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args.json_dump) for _ in range(args.runs)]
+    summary = {
+        key: {
+            "median": round(statistics.median(run[key] for run in runs), 2),
+            "min": round(min(run[key] for run in runs), 2),
+            "max": round(max(run[key] for run in runs), 2),
+        }
+        for key in runs[0]
+    }
+    print(f"{'':<16}{'median':>10}{'min':>10}{'max':>10}", file=sys.stderr)
+    for key, values in summary.items():
+        print(
+            f"{key:<16}{values['median']:>10.1f}{values['min']:>10.1f}"
+            f"{values['max']:>10.1f}",
+            file=sys.stderr,
+        )
+
+    report: Dict[str, Any] = {"runs": args.runs, "summary": summary}
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(args.importtime)
+        print(f"\n{'module':<40}{'own ms':>10}{'cumulative ms':>16}", file=sys.stderr)
+        for module in report["slowest_imports"]:
+            print(
+                f"{module['module']:<40}{module['own_ms']:>10.1f}"
+                f"{module['cumulative_ms']:>16.1f}",
+                file=sys.stderr,
+            )
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+"""
+HTTP benchmarks for the v1 API against a running server.
+
+Every scenario drives one route with ``--concurrency`` clients for
+``--duration`` seconds after a warmup, and reports throughput and p50, p95
+and p99 latency. Results can be saved as a baseline and later runs compared
+against it; a run that is slower than the baseline by more than
+``--tolerance`` exits with status 1, so it can gate a deploy.
+
+Seed the database first with ``benchmarks.seed``. Admission control sheds
+load by design, so run the server with ``ADMISSION_CONTROL_ENABLED=false``
+unless that is what is being measured; shed requests are counted apart
+from errors.
+
+Usage (from backend/):
+
+    python -m benchmarks.seed --scale 100k
+    uvicorn app.main:app --workers 4 &
+    python -m benchmarks.http_bench --save-baseline benchmarks/baselines/100k.json
+    python -m benchmarks.http_bench --baseline benchmarks/baselines/100k.json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic import make_contribution, to_magic_text
+
+# Written by benchmarks.seed
+DEFAULT_MANIFEST = Path(__file__).parent / "results" / "seed.json"
+
+SHED_STATUSES = {429, 503}
+
+# Contributions per bulk status change
+BULK_STATUS_ITEMS = 10
+
+
+class Request(NamedTuple):
+    """
+    A request to send.
+
+    ``then`` builds a follow-up request from a successful response, e.g. the
+    chunk of an upload from its creation; the exchange is timed as a whole
+    and judged by its last response.
+    """
+    method: str
+    url: str
+    headers: Dict[str, str] = {}
+    json: Any = None
+    data: Any = None
+    content: Optional[bytes] = None
+    data_id: Optional[int] = None
+    then: Optional[Callable[[httpx.Response], "Request"]] = None
+
+
+class Scenario(NamedTuple):
+    """A route to benchmark."""
+    name: str
+    build: Callable[["Context"], Request]
+    expected: Set[int] = {200}
+
+
+class Context:
+    """Seeded IDs and credentials shared by the scenarios."""
+
+    def __init__(self, manifest: Dict[str, Any], token: str):
+        self.manifest = manifest
+        self.repository = manifest["repository"]
+        self.token = token
+        self.public_ids = itertools.cycle(manifest["public_ids"])
+        self.private_ids = itertools.cycle(
+            manifest["private_ids"] or manifest["public_ids"]
+        )
+        # Older manifests also list private contributions as large
+        public = set(manifest["public_ids"])
+        self.large_ids = itertools.cycle(
+            [data_id for data_id in manifest["large_ids"] if data_id in public]
+            or manifest["public_ids"]
+        )
+        self.etags: Dict[int, str] = {}
+        self.small_document = make_contribution(n_measurements=100, seed=1)
+        self.statuses = itertools.cycle(["submitted", "draft"])
+        self.upload_body = to_magic_text(self.small_document).encode()
+        self.upload_checksum = "sha256 " + base64.b64encode(
+            hashlib.sha256(self.upload_body).digest()
+        ).decode()
+
+    @property
+    def auth(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def path(self, suffix: str) -> str:
+        return f"/v1/{self.repository}{suffix}"
+
+
+def _login(ctx: Context) -> Request:
+    return Request(
+        "POST",
+        "/v1/authenticate",
+        data={"username": ctx.manifest["email"], "password": ctx.manifest["password"]},
+    )
+
+
+def _get(ctx: Context, data_id: int, query: str = "", **headers: str) -> Request:
+    return Request(
+        "GET", ctx.path(f"/data?data_id={data_id}{query}"), headers, data_id=data_id
+    )
+
+
+def _etag_get(ctx: Context) -> Request:
+    data_id = next(ctx.public_ids)
+    headers = {"If-None-Match": ctx.etags[data_id]} if data_id in ctx.etags else {}
+    return _get(ctx, data_id, **headers)
+
+
+def _update(ctx: Context) -> Request:
+    # Unknown revisions are updated unconditionally; afterwards each update
+    # is based on the ETag of the previous one
+    data_id = next(ctx.private_ids)
+    return Request(
+        "PUT",
+        ctx.path(f"/private/data/{data_id}"),
+        headers={**ctx.auth, "If-Match": ctx.etags.get(data_id, "*")},
+        json={"data": ctx.small_document, "metadata": {"benchmark": "http"}},
+        data_id=data_id,
+    )
+
+
+def _bulk_status(ctx: Context) -> Request:
+    # Between draft and submitted, so the public contributions stay the same
+    ids = dict.fromkeys(next(ctx.private_ids) for _ in range(BULK_STATUS_ITEMS))
+    return Request(
+        "POST",
+        ctx.path("/private/data/status"),
+        headers=ctx.auth,
+        json={
+            "status": next(ctx.statuses),
+            "items": [{"id": data_id} for data_id in ids],
+            "mode": "best_effort",
+        },
+    )
+
+
+def _upload(ctx: Context) -> Request:
+    metadata = {"data_type": "location", "filename": "benchmark.txt"}
+
+    def send_chunk(created: httpx.Response) -> Request:
+        return Request(
+            "PATCH",
+            created.headers["location"],
+            headers={
+                **ctx.auth,
+                "Tus-Resumable": "1.0.0",
+                "Upload-Offset": "0",
+                "Upload-Checksum": ctx.upload_checksum,
+                "Content-Type": "application/offset+octet-stream",
+            },
+            content=ctx.upload_body,
+        )
+
+    return Request(
+        "POST",
+        ctx.path("/private/uploads"),
+        headers={
+            **ctx.auth,
+            "Tus-Resumable": "1.0.0",
+            "Upload-Length": str(len(ctx.upload_body)),
+            "Upload-Metadata": ",".join(
+                f"{key} {base64.b64encode(value.encode()).decode()}"
+                for key, value in metadata.items()
+            ),
+        },
+        then=send_chunk,
+    )
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("auth.login", _login),
+    Scenario("data.get", lambda ctx: _get(ctx, next(ctx.public_ids))),
+    Scenario(
+        "data.get_large",
+        lambda ctx: _get(ctx, next(ctx.large_ids), **{"Accept-Encoding": "gzip"}),
+        {200, 304},
+    ),
+    Scenario(
+        "data.get_projected",
+        lambda ctx: _get(ctx, next(ctx.public_ids), "&view=summaries"),
+    ),
+    Scenario("data.get_not_modified", _etag_get, {200, 304}),
+    Scenario(
+        "data.search",
+        lambda ctx: Request("GET", ctx.path("/data/search?per_page=10&view=summaries")),
+    ),
+    Scenario(
+        "data.history",
+        lambda ctx: Request("GET", ctx.path(f"/data/{next(ctx.public_ids)}/history")),
+    ),
+    *(
+        Scenario(
+            f"search.{level}",
+            lambda ctx, level=level: Request(
+                "GET", ctx.path(f"/search/{level}?per_page=25")
+            ),
+        )
+        for level in ("contributions", "locations", "sites", "specimens", "measurements")
+    ),
+    Scenario(
+        "search.sites_filtered",
+        lambda ctx: Request(
+            "GET", ctx.path("/search/sites?per_page=25&filters=result_type:i")
+        ),
+    ),
+    Scenario(
+        "validate",
+        lambda ctx: Request(
+            "POST",
+            ctx.path("/validate"),
+            json={"data": ctx.small_document, "data_type": "location"},
+        ),
+    ),
+    Scenario(
+        "changes",
+        lambda ctx: Request("GET", ctx.path("/changes?cursor=0&limit=100")),
+    ),
+    Scenario(
+        "private.data.validate",
+        lambda ctx: Request(
+            "POST",
+            ctx.path("/private/data/validate"),
+            headers=ctx.auth,
+            json={"data": ctx.small_document, "data_type": "location"},
+        ),
+    ),
+    Scenario(
+        "private.data.history",
+        lambda ctx: Request(
+            "GET",
+            ctx.path(f"/private/data/{next(ctx.private_ids)}/history"),
+            headers=ctx.auth,
+        ),
+    ),
+    Scenario(
+        "private.search.sites",
+        lambda ctx: Request(
+            "GET", ctx.path("/private/search/private/sites?per_page=25"), headers=ctx.auth
+        ),
+    ),
+    Scenario(
+        "private.data.create",
+        lambda ctx: Request(
+            "POST",
+            ctx.path("/private/data"),
+            headers=ctx.auth,
+            json={
+                "data": ctx.small_document,
+                "data_type": "location",
+                "metadata": {"benchmark": "http"},
+            },
+        ),
+        {201},
+    ),
+    Scenario(
+        "private.data.merge_patch",
+        lambda ctx: Request(
+            "PATCH",
+            ctx.path(f"/private/data/{next(ctx.private_ids)}"),
+            headers={**ctx.auth, "Content-Type": "application/merge-patch+json"},
+            json={"contribution": [{"id": 0, "description": f"patched {time.time()}"}]},
+        ),
+        {200},
+    ),
+    # Merge patches and status changes of the same contributions run
+    # concurrently, so a stale ETag is an expected outcome
+    Scenario("private.data.update_if_match", _update, {200, 412}),
+    Scenario("private.data.status", _bulk_status, {200}),
+    Scenario("private.upload", _upload, {204}),
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _send(client: httpx.AsyncClient, request: Request) -> httpx.Response:
+    return await client.request(
+        request.method,
+        request.url,
+        headers=request.headers,
+        json=request.json,
+        data=request.data,
+        content=request.content,
+    )
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: Context,
+    scenario: Scenario,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> Dict[str, Any]:
+    """
+    Drive one scenario with concurrent clients.
+
+    Returns:
+        Throughput, latency percentiles and status counts
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    shed = 0
+    response_bytes = 0
+
+    async def worker(deadline: float, record: bool) -> None:
+        nonlocal errors, shed, response_bytes
+        while time.perf_counter() < deadline:
+            request = scenario.build(ctx)
+            started = time.perf_counter()
+            try:
+                response = await _send(client, request)
+                while request.then is not None and response.is_success:
+                    request = request.then(response)
+                    response = await _send(client, request)
+            except httpx.HTTPError:
+                if record:
+                    errors += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if request.data_id is not None:
+                if response.status_code == 200 and "etag" in response.headers:
+                    ctx.etags[request.data_id] = response.headers["etag"]
+                elif response.status_code == 412:
+                    # Changed by another client; the next update is unconditional
+                    ctx.etags.pop(request.data_id, None)
+            if not record:
+                continue
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code in SHED_STATUSES:
+                shed += 1
+            elif response.status_code not in scenario.expected:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+                response_bytes += len(response.content)
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(deadline, False) for _ in range(concurrency)))
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(worker(deadline, True) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies) + errors + shed
+    return {
+        "scenario": scenario.name,
+        "requests": total,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "shed_rate": round(shed / total, 4) if total else 0.0,
+        "mean_response_bytes": round(response_bytes / len(latencies)) if latencies else 0,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    A scenario regresses if its p95 latency grew, or its throughput fell, by
+    more than ``tolerance``, or if it has errors the baseline did not.
+
+    Returns:
+        Descriptions of the regressions
+    """
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get(result["scenario"])
+        if base is None:
+            continue
+        name = result["scenario"]
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms"
+            )
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {base['throughput_rps']:.1f} -> "
+                f"{result['throughput_rps']:.1f} req/s"
+            )
+        if result["error_rate"] > base["error_rate"]:
+            regressions.append(
+                f"{name}: error rate {base['error_rate']:.2%} -> {result['error_rate']:.2%}"
+            )
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    manifest = json.loads(args.manifest.read_text())
+    selected = [
+        scenario for scenario in SCENARIOS
+        if not args.scenarios or any(scenario.name.startswith(s) for s in args.scenarios)
+    ]
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        response = await client.post(
+            "/v1/authenticate",
+            data={"username": manifest["email"], "password": manifest["password"]},
+        )
+        response.raise_for_status()
+        ctx = Context(manifest, response.json()["access_token"])
+
+        results = []
+        for scenario in selected:
+            result = await run_scenario(
+                client, ctx, scenario, args.concurrency, args.duration, args.warmup
+            )
+            results.append(result)
+            print(
+                f"{result['scenario']:<28}{result['throughput_rps']:>10.1f}"
+                f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{result['error_rate']:>9.1%}{result['shed_rate']:>8.1%}",
+                file=sys.stderr,
+            )
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "base_url": args.base_url,
+        "scale": manifest.get("scale"),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds before measuring")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--scenarios", nargs="*", help="Only scenarios whose names start with these"
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--save-baseline", type=Path, help="Write results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="Compare results with a baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10,
+        help="Allowed relative regression of p95 latency and throughput",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'scenario':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>9}{'shed':>8}",
+        file=sys.stderr,
+    )
+    report = asyncio.run(run(args))
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("scale") != report["scale"]:
+            print(
+                f"Warning: baseline scale {baseline.get('scale')} differs from "
+                f"{report['scale']}",
+                file=sys.stderr,
+            )
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
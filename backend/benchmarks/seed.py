@@ -0,0 +1,192 @@
+"""
+Seed the database with synthetic MagIC contributions for benchmarks.
+
+Contributions are created through ContributionService, so content hashes,
+history, search tables and the search outbox are written exactly as for
+real uploads. A scale is the total number of measurement rows; it is split
+into contributions of at most ``--max-rows`` rows, since a single jsonb value
+cannot exceed 255 MB, and topped up with many small contributions so that
+searches page through realistic numbers of items. Three in four
+contributions are published; the rest stay private to the benchmark user.
+
+The IDs are written to a manifest that ``benchmarks.http_bench`` reads.
+
+Usage (from backend/, after ``python -m scripts.init_db``):
+
+    python -m benchmarks.seed --scale 100k
+    python -m benchmarks.seed --reset
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("APP_SECRET_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import delete, select
+
+from app.core.security import get_password_hash
+from app.db.models.contribution import Contribution
+from app.db.models.user import User
+from app.db.session import AsyncSessionLocal
+from app.schemas.data import DataCreate
+from app.schemas.token import UserResponse
+from app.services.contribution import ContributionService
+from benchmarks.synthetic import make_contribution
+
+SCALES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+REPOSITORY = "MagIC"
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "benchmark"
+DEFAULT_MANIFEST = Path(__file__).parent / "results" / "seed.json"
+
+
+def plan(total_rows: int, max_rows: int, small: int, small_rows: int) -> List[int]:
+    """
+    Split a scale into contribution sizes.
+
+    Returns:
+        Measurement rows of each contribution to create
+    """
+    sizes = []
+    remaining = total_rows
+    while remaining > 0:
+        sizes.append(min(max_rows, remaining))
+        remaining -= sizes[-1]
+    return sizes + [small_rows] * small
+
+
+async def get_bench_user() -> UserResponse:
+    """Get or create the benchmark user."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.email == BENCH_EMAIL))
+        user = result.scalars().first()
+        if user is None:
+            user = User(
+                email=BENCH_EMAIL,
+                hashed_password=get_password_hash(BENCH_PASSWORD),
+                full_name="Benchmark User",
+                is_active=True,
+                is_superuser=False,
+            )
+            db.add(user)
+            await db.commit()
+        return UserResponse.model_validate(user, from_attributes=True)
+
+
+async def reset(user: UserResponse) -> int:
+    """Delete all contributions of the benchmark user."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(Contribution)
+            .where(Contribution.created_by == user.id)
+            .returning(Contribution.id)
+        )
+        deleted = len(result.all())
+        await db.commit()
+    return deleted
+
+
+async def seed(
+    scale: str, max_rows: int, small: int, small_rows: int
+) -> Dict[str, Any]:
+    """
+    Create the contributions of a scale.
+
+    Returns:
+        Manifest with the benchmark credentials and contribution IDs
+    """
+    user = await get_bench_user()
+    manifest: Dict[str, Any] = {
+        "scale": scale,
+        "measurement_rows": SCALES[scale],
+        "repository": REPOSITORY,
+        "email": BENCH_EMAIL,
+        "password": BENCH_PASSWORD,
+        "public_ids": [],
+        "private_ids": [],
+        "large_ids": [],
+    }
+    sizes = plan(SCALES[scale], max_rows, small, small_rows)
+    started = time.perf_counter()
+    for index, rows in enumerate(sizes):
+        async with AsyncSessionLocal() as db:
+            contribution = await ContributionService.create_contribution(
+                db,
+                DataCreate(
+                    data=make_contribution(n_measurements=rows, seed=index),
+                    data_type="location",
+                    metadata={"benchmark": scale, "measurements": rows},
+                ),
+                REPOSITORY,
+                user,
+            )
+            if index % 4 != 3:
+                await ContributionService.change_contribution_status(
+                    db, contribution.id, "published", user, repository=REPOSITORY
+                )
+                manifest["public_ids"].append(contribution.id)
+                # Fetched anonymously, so only public ones
+                if rows == max_rows or index == 0:
+                    manifest["large_ids"].append(contribution.id)
+            else:
+                manifest["private_ids"].append(contribution.id)
+        print(
+            f"\r{index + 1}/{len(sizes)} contributions "
+            f"({time.perf_counter() - started:.0f} s)",
+            end="",
+            file=sys.stderr,
+        )
+    print(file=sys.stderr)
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=list(SCALES), default="10k")
+    parser.add_argument(
+        "--max-rows", type=int, default=100_000,
+        help="Most measurement rows per contribution",
+    )
+    parser.add_argument(
+        "--small", type=int, default=100, help="Number of small contributions to add"
+    )
+    parser.add_argument(
+        "--small-rows", type=int, default=50, help="Measurement rows per small contribution"
+    )
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    parser.add_argument(
+        "--reset", action="store_true",
+        help="Delete the benchmark user's contributions first (and only, without --scale)",
+    )
+    args = parser.parse_args()
+
+    async def run() -> None:
+        if args.reset:
+            deleted = await reset(await get_bench_user())
+            print(f"Deleted {deleted} benchmark contributions", file=sys.stderr)
+            if "--scale" not in sys.argv:
+                return
+        manifest = await seed(args.scale, args.max_rows, args.small, args.small_rows)
+        args.manifest.parent.mkdir(parents=True, exist_ok=True)
+        args.manifest.write_text(json.dumps(manifest, indent=2))
+        print(f"Wrote {args.manifest}", file=sys.stderr)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare response serialization paths for contribution payloads.
+
+The "response_model" path is what FastAPI does for a route that declares
+``response_model=DataInDB`` and returns an ORM object: decode the JSONB into
+Python objects, validate every field through pydantic, dump it back to
+JSON-compatible objects and encode them with the stdlib ``json`` module. The
+"fast" path validates only the envelope and splices in the data document as
+the JSON text Postgres rendered.
+
+Usage (from backend/):
+
+    python -m benchmarks.serialization --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("APP_SECRET_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/benchmark")
+
+from app.core.responses import compress, render_envelope
+from app.schemas.data import DataEnvelope, DataInDB
+from benchmarks.synthetic import make_contribution
+
+
+def _envelope() -> Dict:
+    return {
+        "id": 1,
+        "repository": "MagIC",
+        "data_type": "sample",
+        "revision": 3,
+        "metadata": {"title": "Synthetic contribution"},
+        "created_by": 1,
+        "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "updated_at": None,
+    }
+
+
+def response_model_path(data_text: str) -> bytes:
+    row = dict(_envelope(), data=json.loads(data_text))
+    content = DataInDB.model_validate(row).model_dump(mode="json")
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(data_text: str) -> bytes:
+    return render_envelope(DataEnvelope.model_validate(_envelope()), data_text)
+
+
+def _time(fn: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        data_text = json.dumps(make_contribution(n_measurements=size))
+        body = fast_path(data_text)
+        assert json.loads(body) == json.loads(response_model_path(data_text))
+
+        for name, fn in (("response_model", response_model_path), ("fast", fast_path)):
+            timings = _time(lambda: fn(data_text), repeat)
+            results.append(
+                {
+                    "path": name,
+                    "measurements": size,
+                    "bytes": len(body),
+                    "median_ms": statistics.median(timings) * 1000,
+                    "min_ms": min(timings) * 1000,
+                }
+            )
+        for encoding in ("gzip", "br"):
+            try:
+                timings = _time(lambda: compress(body, encoding), repeat)
+            except AttributeError:  # brotli not installed
+                continue
+            results.append(
+                {
+                    "path": f"fast+{encoding}",
+                    "measurements": size,
+                    "bytes": len(compress(body, encoding)[0]),
+                    "median_ms": statistics.median(timings) * 1000,
+                    "min_ms": min(timings) * 1000,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'path':<16}{'rows':>10}{'bytes':>14}{'median ms':>12}{'min ms':>10}")
+    for r in results:
+        print(
+            f"{r['path']:<16}{r['measurements']:>10}{r['bytes']:>14}"
+            f"{r['median_ms']:>12.1f}{r['min_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Micro-benchmarks of the contribution processing stages in app/services.
+
+Each stage runs directly, without HTTP or a database, on fixture
+contributions of different shapes:
+
+- parse: MagIC text to a document (``parse.MagICParser``)
+- validate: request model and every table validated (``blocks.validate_document``)
+- hash: per-table content hashes (``hashing.content_hashes``)
+- summarize: rows of every search level, with counts (``search_tables.level_rows``)
+- export: the data response body, as JSON and gzip (``responses``)
+
+For every fixture and stage the median and minimum time over ``--repeat``
+runs are recorded, then one more run under tracemalloc records the peak
+memory above the starting point, the memory still held afterwards, the net
+change in allocated blocks and the garbage collections it triggered.
+
+Usage (from backend/):
+
+    python -m benchmarks.services
+    python -m benchmarks.services --fixtures wide many_tables --output results.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("APP_SECRET_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/benchmark")
+
+from app.core import hashing
+from app.core.responses import compress, dumps
+from app.db.models.search import SearchLevel
+from app.schemas.data import DataCreate
+from app.services import blocks, parse, search_tables
+from benchmarks.synthetic import (
+    make_contribution,
+    make_many_tables_contribution,
+    make_wide_contribution,
+    to_magic_text,
+)
+
+FIXTURES: Dict[str, Callable[[float], Dict[str, Any]]] = {
+    "typical": lambda scale: make_contribution(n_measurements=int(10_000 * scale)),
+    "long_measurements": lambda scale: make_contribution(
+        n_measurements=int(200_000 * scale)
+    ),
+    "wide": lambda scale: make_wide_contribution(n_rows=int(2_000 * scale)),
+    "many_tables": lambda scale: make_many_tables_contribution(
+        n_tables=int(300 * scale)
+    ),
+}
+
+
+def _stages(document: Dict[str, Any], text: str):
+    def parse_stage():
+        return parse.MagICParser("magic").parse_lines(text.splitlines())
+
+    def validate_stage():
+        # What a document whose blocks were never validated costs
+        data_in = DataCreate(data=document, data_type="location")
+        return blocks.validate_document(data_in.data)
+
+    def hash_stage():
+        return hashing.content_hashes(document)
+
+    def summarize_stage():
+        counts = {
+            table: len(search_tables.table_rows(document, table))
+            for table in search_tables.COUNTED_TABLES
+        }
+        return {
+            level: search_tables.level_rows(document, level, counts)
+            for level in SearchLevel
+        }
+
+    def export_stage():
+        body = dumps({"id": 1, "data": document})
+        return compress(body, "gzip")
+
+    return {
+        "parse": parse_stage,
+        "validate": validate_stage,
+        "hash": hash_stage,
+        "summarize": summarize_stage,
+        "export": export_stage,
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    Time a stage, then trace its memory use.
+
+    Returns:
+        Timing and memory statistics
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    collections = sum(stats["collections"] for stats in gc.get_stats())
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    start_bytes, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    net_blocks = sys.getallocatedblocks() - blocks
+    gc_collections = sum(stats["collections"] for stats in gc.get_stats()) - collections
+    del result
+
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "peak_bytes": peak_bytes - start_bytes,
+        "retained_bytes": end_bytes - start_bytes,
+        "net_blocks": net_blocks,
+        "gc_collections": gc_collections,
+    }
+
+
+def run(fixtures: List[str], stages: Optional[List[str]], scale: float, repeat: int):
+    results = []
+    for name in fixtures:
+        document = FIXTURES[name](scale)
+        text = to_magic_text(document)
+        json_bytes = len(dumps(document))
+        for stage, fn in _stages(document, text).items():
+            if stages and stage not in stages:
+                continue
+            result = {
+                "fixture": name,
+                "stage": stage,
+                "input_bytes": len(text) if stage == "parse" else json_bytes,
+                **measure(fn, repeat),
+            }
+            results.append(result)
+            print(
+                f"{name:<20}{stage:<12}{result['median_ms']:>12.1f}"
+                f"{result['peak_bytes'] / 2**20:>12.1f}"
+                f"{result['retained_bytes'] / 2**20:>12.1f}"
+                f"{result['net_blocks']:>12}{result['gc_collections']:>6}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--fixtures", nargs="+", choices=list(FIXTURES), default=list(FIXTURES)
+    )
+    parser.add_argument(
+        "--stages", nargs="+",
+        choices=["parse", "validate", "hash", "summarize", "export"],
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the size of every fixture"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+
+    print(
+        f"{'fixture':<20}{'stage':<12}{'median ms':>12}{'peak MiB':>12}"
+        f"{'kept MiB':>12}{'net blocks':>12}{'gcs':>6}",
+        file=sys.stderr,
+    )
+    results = run(args.fixtures, args.stages, args.scale, args.repeat)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Synthetic MagIC contributions for benchmarks.
+
+Contributions follow the shape produced by parsing a MagIC text file: one
+list of row dicts per table, except measurements, which are stored as
+``{"columns": [...], "rows": [[...], ...]}``.
+"""
+import random
+from typing import Any, Dict, List
+
+MEASUREMENT_COLUMNS = [
+    "measurement",
+    "experiment",
+    "specimen",
+    "sequence",
+    "standard",
+    "quality",
+    "method_codes",
+    "treat_temp",
+    "treat_ac_field",
+    "meas_temp",
+    "magn_moment",
+    "dir_dec",
+    "dir_inc",
+    "citations",
+]
+
+
+def make_contribution(
+    n_measurements: int = 1000,
+    measurements_per_specimen: int = 20,
+    specimens_per_sample: int = 2,
+    samples_per_site: int = 5,
+    sites_per_location: int = 10,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Build a synthetic MagIC contribution.
+
+    Args:
+        n_measurements: Number of measurement rows
+        measurements_per_specimen: Measurement rows per specimen
+        specimens_per_sample: Specimens per sample
+        samples_per_site: Samples per site
+        sites_per_location: Sites per location
+        seed: Random seed, so that runs are reproducible
+
+    Returns:
+        Contribution document
+    """
+    rng = random.Random(seed)
+    n_specimens = max(1, -(-n_measurements // measurements_per_specimen))
+    n_samples = max(1, -(-n_specimens // specimens_per_sample))
+    n_sites = max(1, -(-n_samples // samples_per_site))
+    n_locations = max(1, -(-n_sites // sites_per_location))
+
+    locations = [
+        {
+            "location": f"loc{i}",
+            "location_type": "Outcrop",
+            "geologic_classes": "Igneous",
+            "lithologies": "Basalt",
+            "lat_n": round(rng.uniform(-90, 90), 4),
+            "lat_s": round(rng.uniform(-90, 90), 4),
+            "lon_e": round(rng.uniform(0, 360), 4),
+            "lon_w": round(rng.uniform(0, 360), 4),
+            "age": rng.randint(1, 200),
+            "age_unit": "Ma",
+            "citations": "This study",
+        }
+        for i in range(n_locations)
+    ]
+    sites = [
+        {
+            "site": f"site{i}",
+            "location": f"loc{i // sites_per_location}",
+            "lat": round(rng.uniform(-90, 90), 5),
+            "lon": round(rng.uniform(0, 360), 5),
+            "dir_dec": round(rng.uniform(0, 360), 1),
+            "dir_inc": round(rng.uniform(-90, 90), 1),
+            "dir_k": round(rng.uniform(10, 500), 1),
+            "dir_n_samples": samples_per_site,
+            "method_codes": "LP-DIR-AF:DE-BFL:DA-DIR-GEO",
+            "result_type": "i",
+            "citations": "This study",
+        }
+        for i in range(n_sites)
+    ]
+    samples = [
+        {
+            "sample": f"samp{i}",
+            "site": f"site{i // samples_per_site}",
+            "azimuth": round(rng.uniform(0, 360), 1),
+            "dip": round(rng.uniform(-90, 0), 1),
+            "method_codes": "SO-MAG:FS-FD",
+            "citations": "This study",
+        }
+        for i in range(n_samples)
+    ]
+    specimens = [
+        {
+            "specimen": f"spec{i}",
+            "sample": f"samp{i // specimens_per_sample}",
+            "volume": 1.05e-05,
+            "dir_dec": round(rng.uniform(0, 360), 1),
+            "dir_inc": round(rng.uniform(-90, 90), 1),
+            "dir_mad_free": round(rng.uniform(0, 10), 1),
+            "method_codes": "LP-DIR-AF:DE-BFL",
+            "citations": "This study",
+        }
+        for i in range(n_specimens)
+    ]
+    rows: List[List[Any]] = []
+    for i in range(n_measurements):
+        specimen = i // measurements_per_specimen
+        step = i % measurements_per_specimen
+        rows.append(
+            [
+                f"spec{specimen}-{step}",
+                f"spec{specimen}-LP-DIR-AF",
+                f"spec{specimen}",
+                i,
+                "u",
+                "g",
+                "LT-AF-Z",
+                273,
+                round(step * 0.005, 3),
+                293,
+                rng.uniform(1e-9, 1e-5),
+                round(rng.uniform(0, 360), 1),
+                round(rng.uniform(-90, 90), 1),
+                "This study",
+            ]
+        )
+
+    return {
+        "contribution": [
+            {"id": 0, "version": 1, "contributor": "@synthetic", "data_model_version": "3.0"}
+        ],
+        "locations": locations,
+        "sites": sites,
+        "samples": samples,
+        "specimens": specimens,
+        "measurements": {"columns": list(MEASUREMENT_COLUMNS), "rows": rows},
+    }
+
+
+def make_wide_contribution(
+    n_rows: int = 2000, n_columns: int = 400, seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Build a contribution whose specimens table has many columns.
+
+    Args:
+        n_rows: Number of specimen rows
+        n_columns: Number of extra numeric columns per row
+        seed: Random seed
+
+    Returns:
+        Contribution document
+    """
+    rng = random.Random(seed)
+    columns = [f"param_{i:04d}" for i in range(n_columns)]
+    specimens = []
+    for i in range(n_rows):
+        row: Dict[str, Any] = {"specimen": f"spec{i}", "sample": f"samp{i // 2}"}
+        row.update((column, round(rng.uniform(-1000, 1000), 6)) for column in columns)
+        specimens.append(row)
+    return {
+        "contribution": [{"id": 0, "version": 1, "contributor": "@synthetic"}],
+        "specimens": specimens,
+    }
+
+
+def make_many_tables_contribution(
+    n_tables: int = 300, rows_per_table: int = 20, seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Build a contribution with many small tables.
+
+    Args:
+        n_tables: Number of tables
+        rows_per_table: Rows in each table
+        seed: Random seed
+
+    Returns:
+        Contribution document
+    """
+    rng = random.Random(seed)
+    document: Dict[str, Any] = {
+        "contribution": [{"id": 0, "version": 1, "contributor": "@synthetic"}]
+    }
+    for t in range(n_tables):
+        document[f"table_{t:03d}"] = [
+            {
+                "name": f"t{t}r{i}",
+                "value": round(rng.uniform(0, 1), 6),
+                "method_codes": "LP-DIR-AF",
+                "citations": "This study",
+            }
+            for i in range(rows_per_table)
+        ]
+    return document
+
+
+def to_magic_text(document: Dict[str, Any]) -> str:
+    """
+    Render a contribution as a MagIC text file.
+
+    Args:
+        document: Contribution document
+
+    Returns:
+        Tab-delimited text with one ``tab<TAB>table`` block per table
+    """
+    blocks = []
+    for table, value in document.items():
+        if isinstance(value, dict):
+            columns = value["columns"]
+            rows = value["rows"]
+        else:
+            columns = list(dict.fromkeys(key for row in value for key in row))
+            rows = [[row.get(column, "") for column in columns] for row in value]
+        lines = [f"tab\t{table}", "\t".join(columns)]
+        lines.extend("\t".join(str(cell) for cell in row) for row in rows)
+        blocks.append("\n".join(lines))
+    return "\n>>>>>>>>>>\n".join(blocks) + "\n"
@@ -0,0 +1,106 @@
+"""
+Maintain the month partitions of contribution history (see
+app/db/partitions.py and app/services/history_archive.py).
+
+1. Create the partitions of the next ``HISTORY_PARTITION_MONTHS_AHEAD``
+   months, so that new history never lands in the default partitions.
+2. Archive every month older than ``HISTORY_HOT_MONTHS`` to the blob store
+   selected by ``BLOB_STORAGE``, and drop its partition.
+
+Run it daily, e.g. from cron; it is safe to rerun after a failure. The API
+keeps running: a month is only removed from the database in the transaction
+that makes its archive visible.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.partitions import (
+    HISTORY_TABLE,
+    add_months,
+    create_history_partitions,
+    month_start,
+    partition_name,
+    repositories,
+)
+from app.db.session import engine
+from app.services.history_archive import (
+    archivable_months,
+    archive_month,
+    hot_cutoff,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def create_partitions(months_ahead: int) -> None:
+    """Create the partitions of this month and the next ones."""
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            create_history_partitions,
+            now,
+            add_months(month_start(now), months_ahead),
+        )
+        for repository in [*repositories(), None]:
+            default = f"{partition_name(HISTORY_TABLE, repository)}_default"
+            stray = (
+                await conn.execute(text(f"SELECT COUNT(*) FROM {default}"))
+            ).scalar_one()
+            if stray:
+                logger.warning(
+                    "%d history rows are in %s; move them before their months' "
+                    "partitions can be created or archived",
+                    stray, default,
+                )
+
+
+async def archive(dry_run: bool) -> None:
+    """Archive the months older than the hot window."""
+    cutoff = hot_cutoff()
+    for repository in repositories():
+        async with engine.connect() as conn:
+            months = await archivable_months(conn, repository, cutoff)
+        for month in months:
+            if dry_run:
+                logger.info(
+                    "Would archive %s history of %s", repository, f"{month:%Y-%m}"
+                )
+                continue
+            await archive_month(repository, month)
+
+
+async def main(months_ahead: int, dry_run: bool, skip_archive: bool) -> None:
+    await create_partitions(months_ahead)
+    if not skip_archive:
+        await archive(dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create upcoming history partitions and archive old ones"
+    )
+    parser.add_argument(
+        "--months-ahead", type=int, default=settings.HISTORY_PARTITION_MONTHS_AHEAD,
+        help="Months of partitions to create in advance",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Only list the months that would be archived",
+    )
+    parser.add_argument(
+        "--no-archive", action="store_true",
+        help="Only create partitions",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.months_ahead, args.dry_run, args.no_archive))
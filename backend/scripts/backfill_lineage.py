@@ -0,0 +1,78 @@
+"""
+Assign lineages to contributions created before versions were tracked, and
+flag the latest version of each lineage (see
+ContributionService.refresh_latest).
+
+Every contribution without a lineage starts its own, so until new versions
+are created with ``version_of``, each published contribution is the latest
+of its lineage. Safe to run again; only rows that change are written.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select, update
+
+from app.db.models.contribution import Contribution
+from app.db.session import AsyncSessionLocal
+from app.services.contribution import ContributionService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def backfill(dry_run: bool) -> None:
+    """Assign lineages and refresh the latest flags, one repository at a time."""
+    async with AsyncSessionLocal() as db:
+        repositories = (
+            await db.execute(select(Contribution.repository).distinct())
+        ).scalars().all()
+
+    for repository in sorted(repositories):
+        async with AsyncSessionLocal() as db:
+            unassigned = Contribution.lineage_id.is_(None)
+            if dry_run:
+                count = (
+                    await db.execute(
+                        select(func.count(Contribution.id)).where(
+                            Contribution.repository == repository, unassigned
+                        )
+                    )
+                ).scalar_one()
+                logger.info(
+                    "%s: would assign lineages to %d contributions", repository, count
+                )
+                continue
+            # Assigning lineages leaves revisions untouched; versions whose
+            # latest flag changes get a new revision (and ETag)
+            assigned = await db.execute(
+                update(Contribution)
+                .where(Contribution.repository == repository, unassigned)
+                .values(lineage_id=Contribution.id)
+                .execution_options(synchronize_session=False)
+            )
+            changed = await ContributionService.refresh_latest(db, repository)
+            await db.commit()
+        logger.info(
+            "%s: assigned %d lineages, updated %d latest flags",
+            repository,
+            assigned.rowcount,
+            len(changed),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Assign contribution lineages and flag the latest versions"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Only count the contributions without a lineage",
+    )
+    args = parser.parse_args()
+    asyncio.run(backfill(args.dry_run))
@@ -0,0 +1,90 @@
+"""
+Write the columnar tables of published contributions (see
+app/services/columnar.py).
+
+Tables are written when a contribution is published, so run this once after
+installing the ``arrow`` extra, or on a host with an empty
+``COLUMNAR_CACHE_DIR``. ``--prune`` also deletes the tables that no
+published contribution has any more.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select
+from sqlalchemy.orm import defer
+
+from app.db.models.contribution import Contribution, ContributionStatus
+from app.db.session import AsyncSessionLocal
+from app.services import columnar, offload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def build_columnar(prune: bool) -> None:
+    """Materialize the tables of every published contribution."""
+    if not columnar.enabled():
+        logger.error("The columnar cache is disabled or pyarrow is not installed.")
+        return
+    async with AsyncSessionLocal() as db:
+        keys = (
+            await db.execute(
+                select(Contribution.id, Contribution.repository)
+                .where(
+                    Contribution.status == ContributionStatus.PUBLISHED,
+                    Contribution.is_public == True,
+                )
+                .order_by(Contribution.id)
+            )
+        ).all()
+    logger.info("%d published contributions", len(keys))
+
+    keep = set()
+    written = 0
+    for contribution_id, repository in keys:
+        # One at a time, so only one document is in memory
+        async with AsyncSessionLocal() as db:
+            contribution = (
+                await db.execute(
+                    select(Contribution)
+                    .options(defer(Contribution.data))
+                    .where(
+                        Contribution.id == contribution_id,
+                        Contribution.repository == repository,
+                    )
+                )
+            ).scalar_one()
+            keep.update((contribution.table_hashes or {}).values())
+            if not await columnar.needs_materializing(db, contribution):
+                continue
+            await db.refresh(contribution, ["data"])
+            tables = await columnar.materialize(
+                contribution, await offload.load_data(contribution)
+            )
+        written += 1
+        logger.info(
+            "Wrote %d tables of contribution %s", len(tables), contribution_id
+        )
+    logger.info("Wrote the tables of %d contributions", written)
+
+    if prune:
+        pruned = await asyncio.to_thread(columnar.prune, keep)
+        logger.info("Deleted the tables of %d contributions", pruned)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write the columnar tables of published contributions"
+    )
+    parser.add_argument(
+        "--prune", action="store_true",
+        help="Delete the tables of contributions that are no longer published",
+    )
+    args = parser.parse_args()
+    asyncio.run(build_columnar(args.prune))
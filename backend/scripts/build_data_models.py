@@ -0,0 +1,62 @@
+"""
+Compile the MagIC data models, method codes and controlled vocabularies of
+the old backend into the snapshot read by app/core/data_models.py.
+
+Run this as a build step, e.g. in the container image, whenever the configs
+in old-backend/v1/configs change. It needs Node.js to evaluate them, unless
+``--json`` points at the output of ``node scripts/dump_data_models.js``.
+"""
+import argparse
+import hashlib
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import orjson
+
+from app.core.config import settings
+from app.core.data_models import build_snapshot
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DUMP_SCRIPT = Path(__file__).parent / "dump_data_models.js"
+DEFAULT_CONFIGS = Path(__file__).parent.parent.parent / "old-backend" / "v1" / "configs"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the data model snapshot")
+    parser.add_argument("--configs", type=Path, default=DEFAULT_CONFIGS)
+    parser.add_argument(
+        "--json", type=Path, help="Use an existing dump instead of running Node.js"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=Path(settings.DATA_MODELS_SNAPSHOT)
+    )
+    args = parser.parse_args()
+
+    if args.json is not None:
+        dump = args.json.read_bytes()
+        source = str(args.json)
+    else:
+        dump = subprocess.run(
+            ["node", str(DUMP_SCRIPT), str(args.configs)],
+            capture_output=True,
+            check=True,
+        ).stdout
+        source = str(args.configs)
+
+    size = build_snapshot(
+        orjson.loads(dump),
+        args.output,
+        source=f"{source} (sha256 {hashlib.sha256(dump).hexdigest()})",
+    )
+    logger.info("Wrote %s (%d bytes)", args.output, size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+/*
+ * Print the MagIC data models, method codes and controlled vocabularies of
+ * the old backend as one JSON document, for scripts/build_data_models.py.
+ *
+ * The config files mix ES module and CommonJS exports and are not valid
+ * JSON, so each one is evaluated on its own in a fresh context.
+ *
+ * Usage: node scripts/dump_data_models.js [old-backend/v1/configs]
+ */
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const configs = path.resolve(
+	process.argv[2] || path.join(__dirname, '..', '..', 'old-backend', 'v1', 'configs')
+);
+
+function evaluate(file) {
+	const source = fs
+		.readFileSync(file, 'utf8')
+		.replace(/^export const (\w+)\s*=/gm, 'exports.$1 =');
+	const module = { exports: {} };
+	vm.runInNewContext(source, { module, exports: module.exports }, { filename: file });
+	return module.exports;
+}
+
+const modelsDir = path.join(configs, 'magic', 'data_models');
+const dataModels = {};
+for (const name of fs.readdirSync(modelsDir).sort()) {
+	if (name.endsWith('.js')) {
+		dataModels[name.slice(0, -3)] = evaluate(path.join(modelsDir, name)).model;
+	}
+}
+
+process.stdout.write(
+	JSON.stringify({
+		data_models: dataModels,
+		method_codes: evaluate(path.join(configs, 'magic', 'method_codes.js')).methodCodes,
+		vocabularies: evaluate(path.join(configs, 'controlled_vocabularies.js')).cvs,
+	})
+);
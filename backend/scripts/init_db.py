@@ -15,7 +15,12 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.db.session import Base, engine, AsyncSessionLocal
 from app.db.models.user import User
+from app.db.models.block import ContentBlock
 from app.db.models.contribution import Contribution, ContributionHistory
+from app.db.models.history_archive import HistoryArchive
+from app.db.models.outbox import SearchOutbox
+from app.db.models.search import SEARCH_TABLES
+from app.db.models.upload import UploadSession
 from app.core.security import get_password_hash
 
 logging.basicConfig(level=logging.INFO)
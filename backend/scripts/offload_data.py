@@ -0,0 +1,107 @@
+"""
+Move large contribution documents to blob storage, or sweep unused blobs
+(see app/services/offload.py).
+
+Without options, every inline document of at least
+``DATA_OFFLOAD_THRESHOLD`` bytes is offloaded, one transaction each. Run it
+after lowering the threshold, or to offload documents written before
+offloading was enabled. ``--sweep`` deletes blobs that no contribution
+refers to any more, e.g. after documents were replaced; run it daily.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import Text, cast, func, select, update
+
+from app.core.config import settings
+from app.db.models.contribution import Contribution
+from app.db.session import AsyncSessionLocal
+from app.services import blocks, offload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def offload_large(dry_run: bool) -> None:
+    """Offload the inline documents above the threshold."""
+    if not offload.should_offload(settings.DATA_OFFLOAD_THRESHOLD):
+        logger.error("Offloading is disabled or zstandard is not installed.")
+        return
+    async with AsyncSessionLocal() as db:
+        keys = (
+            await db.execute(
+                select(Contribution.id, Contribution.repository)
+                .where(
+                    Contribution.data_ref.is_(None),
+                    func.octet_length(cast(Contribution.data, Text))
+                    >= settings.DATA_OFFLOAD_THRESHOLD,
+                )
+                .order_by(Contribution.id)
+            )
+        ).all()
+    logger.info("%d documents to offload", len(keys))
+    if dry_run:
+        return
+
+    for contribution_id, repository in keys:
+        this_row = (
+            Contribution.id == contribution_id,
+            Contribution.repository == repository,
+        )
+        async with AsyncSessionLocal() as db:
+            row = (
+                await db.execute(
+                    select(
+                        Contribution.data,
+                        Contribution.content_hash,
+                        Contribution.table_hashes,
+                    )
+                    .where(*this_row, Contribution.data_ref.is_(None))
+                    .with_for_update()
+                )
+            ).one_or_none()
+            if row is None or row.data is None:
+                continue
+            if row.table_hashes is not None:
+                # Blocks are only recorded as stored once they are cataloged
+                await blocks.register(db, row.table_hashes, row.data)
+            # The content does not change, so neither does the revision.
+            values = await offload.stored_values(
+                db, row.data, row.content_hash, row.table_hashes
+            )
+            await db.execute(update(Contribution).where(*this_row).values(**values))
+            await db.commit()
+        logger.info(
+            "Offloaded contribution %s to %s", contribution_id, values["data_ref"]
+        )
+
+
+async def sweep(dry_run: bool) -> None:
+    """Delete unreferenced blobs."""
+    async with AsyncSessionLocal() as db:
+        deleted = await offload.sweep(db, dry_run=dry_run)
+    logger.info(
+        "%s %d unreferenced blobs", "Would delete" if dry_run else "Deleted", deleted
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offload large contribution documents to blob storage"
+    )
+    parser.add_argument(
+        "--sweep", action="store_true",
+        help="Delete blobs no contribution refers to instead",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Only count what would be done",
+    )
+    args = parser.parse_args()
+    asyncio.run(sweep(args.dry_run) if args.sweep else offload_large(args.dry_run))
@@ -0,0 +1,258 @@
+"""
+Convert the contribution tables of an existing database to tables
+partitioned by repository (see app/db/partitions.py).
+
+In one transaction, holding exclusive locks on both tables:
+
+1. drop the foreign keys that reference them from other tables,
+2. rename them, their indexes and their sequences with an ``_unpartitioned``
+   suffix,
+3. create the partitioned tables and their partitions from the models, with
+   month partitions of history back to its oldest entry,
+4. copy the rows over, keeping their ids, and move the id sequences on,
+5. create the tables added since, and add the foreign keys of the existing
+   ones back, now including the repository,
+6. drop the old tables, unless ``--keep-old`` is given.
+
+Databases are upgraded by this script rather than by Alembic migrations, so
+the old tables may predate columns of the models. Only the columns both have
+are copied: history takes the repository of its contribution, and the other
+new columns their server defaults. Run it before ``scripts.init_db``, which
+cannot add tables referencing unpartitioned contributions.
+
+The API must be stopped while this runs; it takes about as long as copying
+the tables. Databases created after partitioning was introduced already have
+partitioned tables, and for them ``--add-partitions`` creates the partitions
+of repositories added to ``RepositoryEnum`` since.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Set
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint
+
+from app.db.models.contribution import Contribution, ContributionHistory
+from app.db.models.search import SEARCH_TABLES
+from app.db.partitions import (
+    create_history_partitions,
+    partition_ddl,
+    partition_name,
+    repositories,
+)
+from app.db.session import Base, engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUFFIX = "_unpartitioned"
+TABLES = [Contribution.__table__, ContributionHistory.__table__]
+
+
+def _is_partitioned(conn: Connection, table: str) -> bool:
+    kind = conn.execute(
+        text(
+            "SELECT relkind::text FROM pg_class "
+            "WHERE relname = :table AND pg_table_is_visible(oid)"
+        ),
+        {"table": table},
+    ).scalar()
+    if kind is None:
+        raise RuntimeError(f"Table {table} does not exist; run scripts.init_db")
+    return kind == "p"
+
+
+def _exists(conn: Connection, table: str) -> bool:
+    return conn.execute(
+        text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}
+    ).scalar()
+
+
+def _columns(conn: Connection, table: str) -> Set[str]:
+    return set(
+        conn.execute(
+            text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table"
+            ),
+            {"table": table},
+        ).scalars()
+    )
+
+
+def _copy(conn: Connection, table: str) -> int:
+    """Copy the rows of the old table, in the columns both tables have."""
+    old = table + SUFFIX
+    present = _columns(conn, old)
+    names = [
+        column.name
+        for column in Base.metadata.tables[table].columns
+        if column.name in present
+    ]
+    values = [f'old."{name}"' for name in names]
+    source = f"{old} AS old"
+    if "repository" not in present:
+        # History written before it was partitioned
+        names.append("repository")
+        values.append("contribution.repository")
+        source += (
+            f" JOIN contributions{SUFFIX} AS contribution"
+            " ON contribution.id = old.contribution_id"
+        )
+    columns = ", ".join(f'"{name}"' for name in names)
+    return conn.exec_driver_sql(
+        f"INSERT INTO {table} ({columns}) "
+        f"SELECT {', '.join(values)} FROM {source} ORDER BY old.id"
+    ).rowcount
+
+
+def _rename_old(conn: Connection, table: str) -> None:
+    """Move a table, its indexes and sequences out of the way."""
+    old = table + SUFFIX
+    for (index,) in conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": table},
+    ):
+        # Identifiers are limited to 63 characters
+        conn.exec_driver_sql(
+            f'ALTER INDEX "{index}" RENAME TO "{index[:63 - len(SUFFIX)]}{SUFFIX}"'
+        )
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+    ).scalar()
+    if sequence is not None:
+        conn.exec_driver_sql(
+            f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq{SUFFIX}"
+        )
+    conn.exec_driver_sql(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+
+
+def partition(conn: Connection, keep_old: bool) -> None:
+    """Convert both tables, see the module docstring."""
+    partitioned = [_is_partitioned(conn, table.name) for table in TABLES]
+    if all(partitioned):
+        logger.info("Contribution tables are already partitioned.")
+        return
+    if any(partitioned):
+        raise RuntimeError("Only some of the contribution tables are partitioned")
+
+    conn.exec_driver_sql(
+        "LOCK TABLE contributions, contribution_history IN ACCESS EXCLUSIVE MODE"
+    )
+
+    referencing = conn.execute(
+        text(
+            """
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE contype = 'f'
+              AND confrelid = 'contributions'::regclass
+              AND conrelid <> 'contribution_history'::regclass
+            """
+        )
+    ).all()
+    for table, constraint in referencing:
+        logger.info("Dropping foreign key %s of %s", constraint, table)
+        conn.exec_driver_sql(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"')
+
+    existing = [
+        model.__table__
+        for model in SEARCH_TABLES.values()
+        if _exists(conn, model.__tablename__)
+    ]
+    for table in TABLES:
+        _rename_old(conn, table.name)
+
+    Base.metadata.create_all(conn, tables=TABLES)
+    oldest = conn.execute(
+        text(f"SELECT MIN(created_at) FROM contribution_history{SUFFIX}")
+    ).scalar()
+    if oldest is not None:
+        create_history_partitions(conn, oldest, datetime.now(timezone.utc))
+
+    for table in TABLES:
+        copied = _copy(conn, table.name)
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+        )
+        logger.info("Copied %d rows into %s", copied, table.name)
+
+    # Tables added since the database was created, with their foreign keys
+    Base.metadata.create_all(conn)
+    for search_table in existing:
+        for constraint in search_table.foreign_key_constraints:
+            if constraint.referred_table is Contribution.__table__:
+                conn.execute(AddConstraint(constraint))
+    # upload_sessions no longer references contributions, see its model.
+
+    if keep_old:
+        logger.info("Kept the old tables with the suffix %s", SUFFIX)
+    else:
+        conn.exec_driver_sql(f"DROP TABLE contribution_history{SUFFIX}")
+        conn.exec_driver_sql(f"DROP TABLE contributions{SUFFIX}")
+
+
+def add_partitions(conn: Connection) -> None:
+    """Create the missing partitions of repositories added since."""
+    for table in TABLES:
+        for repository in repositories():
+            name = partition_name(table.name, repository)
+            exists = conn.execute(
+                text(
+                    "SELECT 1 FROM pg_class "
+                    "WHERE relname = :name AND pg_table_is_visible(oid)"
+                ),
+                {"name": name},
+            ).scalar()
+            if exists:
+                continue
+            # The default partition cannot keep rows that the new partition
+            # would accept.
+            stray = conn.execute(
+                text(
+                    f"SELECT COUNT(*) FROM {partition_name(table.name, None)} "
+                    "WHERE repository = :repository"
+                ),
+                {"repository": repository},
+            ).scalar()
+            if stray:
+                raise RuntimeError(
+                    f"{stray} rows of {repository} are in the default partition "
+                    f"of {table.name}; move them before adding its partition"
+                )
+            conn.exec_driver_sql(partition_ddl(table.name, repository))
+            logger.info("Created partition %s", name)
+
+
+async def main(keep_old: bool, only_add: bool) -> None:
+    async with engine.begin() as conn:
+        if only_add:
+            await conn.run_sync(add_partitions)
+        else:
+            await conn.run_sync(partition, keep_old)
+            for table in TABLES:
+                await conn.exec_driver_sql(f"ANALYZE {table.name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Partition the contribution tables by repository"
+    )
+    parser.add_argument(
+        "--keep-old", action="store_true",
+        help="Keep the unpartitioned tables, renamed, for checking",
+    )
+    parser.add_argument(
+        "--add-partitions", action="store_true",
+        help="Only create partitions for repositories added since",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.keep_old, args.add_partitions))
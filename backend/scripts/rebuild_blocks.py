@@ -0,0 +1,120 @@
+"""
+Catch up the content block catalog with the contribution documents, or
+collect unreferenced blocks (see app/services/blocks.py).
+
+Without options, documents written before content hashes existed are
+hashed, the blocks of every document are added to the catalog if missing,
+and all reference counts are recounted; run it once after upgrading, and
+whenever counts are suspected to be off. Documents whose blocks are all
+known are not read. ``--collect`` deletes blocks that no document referred
+to for ``BLOCK_GC_GRACE_HOURS``, with their blobs; run it daily.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, update
+
+from app.core import hashing
+from app.db.models.contribution import Contribution
+from app.db.session import AsyncSessionLocal
+from app.services import blocks, offload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild(dry_run: bool) -> None:
+    """Hash and register every document, then recount references."""
+    async with AsyncSessionLocal() as db:
+        keys = (
+            await db.execute(
+                select(
+                    Contribution.id,
+                    Contribution.repository,
+                    Contribution.table_hashes,
+                ).order_by(Contribution.id)
+            )
+        ).all()
+    logger.info("%d contributions", len(keys))
+
+    hashed = added = 0
+    for contribution_id, repository, table_hashes in keys:
+        this_row = (
+            Contribution.id == contribution_id,
+            Contribution.repository == repository,
+        )
+        async with AsyncSessionLocal() as db:
+            if table_hashes is not None:
+                known = await blocks.summaries(db, table_hashes.values())
+                if set(table_hashes.values()) <= set(known):
+                    continue
+            contribution = (
+                await db.execute(select(Contribution).where(*this_row))
+            ).scalar_one_or_none()
+            if contribution is None:
+                continue
+            data = await offload.load_data(contribution)
+            if contribution.table_hashes is None:
+                content_hash, table_hashes = hashing.content_hashes(data)
+                if table_hashes is None:
+                    continue
+                hashed += 1
+                if not dry_run:
+                    # The content does not change, so neither does the revision.
+                    await db.execute(
+                        update(Contribution)
+                        .where(*this_row)
+                        .values(content_hash=content_hash, table_hashes=table_hashes)
+                    )
+            else:
+                table_hashes = contribution.table_hashes
+            if dry_run:
+                known = await blocks.summaries(db, table_hashes.values())
+                added += len(set(table_hashes.values()) - set(known))
+                continue
+            added += await blocks.register(db, table_hashes, data)
+            await db.commit()
+    logger.info(
+        "%s %d documents and %d blocks",
+        "Would hash" if dry_run else "Hashed",
+        hashed,
+        added,
+    )
+    if dry_run:
+        return
+
+    async with AsyncSessionLocal() as db:
+        corrected = await blocks.recount(db)
+        await db.commit()
+    logger.info("Corrected the reference counts of %d blocks", corrected)
+
+
+async def collect(dry_run: bool) -> None:
+    """Delete unreferenced blocks."""
+    async with AsyncSessionLocal() as db:
+        deleted = await blocks.collect(db, dry_run=dry_run)
+    logger.info(
+        "%s %d unreferenced blocks", "Would delete" if dry_run else "Deleted", deleted
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Catch up the content block catalog with the documents"
+    )
+    parser.add_argument(
+        "--collect", action="store_true",
+        help="Delete blocks no document refers to instead",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Only count what would be done",
+    )
+    args = parser.parse_args()
+    asyncio.run(collect(args.dry_run) if args.collect else rebuild(args.dry_run))
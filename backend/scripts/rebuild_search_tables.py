@@ -0,0 +1,45 @@
+"""
+Rebuild the per-level search tables from the stored contributions.
+"""
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select
+
+from app.db.models.contribution import Contribution
+from app.db.session import AsyncSessionLocal
+from app.services import search_tables
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_search_tables() -> None:
+    """Rewrite the search rows of every contribution, one transaction each."""
+    async with AsyncSessionLocal() as db:
+        keys = (
+            await db.execute(
+                select(Contribution.id, Contribution.repository).order_by(
+                    Contribution.id
+                )
+            )
+        ).all()
+
+    for contribution_id, repository in keys:
+        async with AsyncSessionLocal() as db:
+            contribution = await db.get(Contribution, (contribution_id, repository))
+            if contribution is None:
+                continue
+            await search_tables.refresh(db, contribution)
+            await db.commit()
+        logger.info("Rebuilt search rows for contribution %s", contribution_id)
+
+
+if __name__ == "__main__":
+    logger.info("Rebuilding search tables...")
+    asyncio.run(rebuild_search_tables())
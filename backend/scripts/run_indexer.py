@@ -0,0 +1,29 @@
+"""
+Run the search indexer as a standalone process.
+"""
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.search_index import SearchIndexer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_indexer() -> None:
+    """Drain the search outbox until interrupted."""
+    indexer = SearchIndexer()
+    try:
+        await indexer.run()
+    finally:
+        await indexer.client.aclose()
+
+
+if __name__ == "__main__":
+    logger.info("Starting search indexer...")
+    asyncio.run(run_indexer())
@@ -0,0 +1,58 @@
+"""
+Shared test configuration.
+
+Settings are required at import time, so placeholders are set before any
+app module is imported. Tests that need PostgreSQL read its URL from
+DATABASE_TEST_URL and are skipped without it.
+"""
+import os
+
+os.environ.setdefault("APP_SECRET_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/fiesta_test")
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+# Register every model, so mappers resolve and create_all knows every table
+from app.db.models import (  # noqa: F401
+    block,
+    contribution,
+    history_archive,
+    outbox,
+    search,
+    upload,
+    user as user_model,
+)
+from app.db.session import Base
+from app.schemas.token import UserResponse
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    """Session factory of an emptied test database."""
+    url = os.environ.get("DATABASE_TEST_URL")
+    if not url:
+        pytest.skip("DATABASE_TEST_URL is not set")
+
+    engine = create_async_engine(url, poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def user(session_factory) -> UserResponse:
+    """A regular user."""
+    async with session_factory() as db:
+        row = user_model.User(
+            email="curator@example.com", hashed_password="x", is_active=True
+        )
+        db.add(row)
+        await db.commit()
+        return UserResponse(id=row.id, email=row.email)
@@ -0,0 +1,86 @@
+"""
+Local HTTP stand-in for the search cluster's ``_bulk`` API.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+class BulkStub:
+    """
+    Answer ``POST /_bulk`` on a local port and record the actions received.
+
+    Each action gets the status ``item_status(action, document_id)`` returns
+    (200 by default); set ``request_status`` to fail whole requests instead,
+    e.g. with 429 to push back.
+    """
+
+    def __init__(self, item_status: Optional[Callable[[str, str], int]] = None):
+        self.item_status = item_status or (lambda action, document_id: 200)
+        self.request_status: Optional[int] = None
+        self.requests: List[List[Dict]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path != "/_bulk":
+                    self._reply(404, {})
+                    return
+                if stub.request_status is not None:
+                    self._reply(stub.request_status, {"error": "rejected"})
+                    return
+                actions = stub._parse(body)
+                stub.requests.append(actions)
+                items = []
+                for action in actions:
+                    status = stub.item_status(action["action"], action["id"])
+                    items.append(
+                        {action["action"]: {"_id": action["id"], "status": status}}
+                    )
+                self._reply(200, {"errors": False, "items": items})
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def _parse(body: bytes) -> List[Dict]:
+        """Split an NDJSON bulk body into actions with their documents."""
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        actions = []
+        index = 0
+        while index < len(lines):
+            (name, meta), = lines[index].items()
+            action = {"action": name, "id": meta["_id"], "index": meta["_index"]}
+            index += 1
+            if name in ("index", "create", "update"):
+                action["document"] = lines[index]
+                index += 1
+            actions.append(action)
+        return actions
+
+    @property
+    def actions(self) -> List[Dict]:
+        """All actions received, in order."""
+        return [action for request in self.requests for action in request]
+
+    def __enter__(self) -> "BulkStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
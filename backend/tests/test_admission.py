@@ -0,0 +1,197 @@
+"""
+Tests for admission control of expensive endpoints.
+"""
+import asyncio
+
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+
+from app.api.v1.endpoints import health_check
+from app.core.admission import (
+    DEFAULT_LIMITS,
+    AdmissionControlMiddleware,
+    AdmissionController,
+    configured_limits,
+)
+from app.core.clients import client_key
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app as fiesta
+
+SEARCH = "/v1/MagIC/data/search"
+
+
+def limits(**values):
+    return {"search": DEFAULT_LIMITS["search"]._replace(**values)}
+
+
+class Held:
+    """An application whose requests run until released."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self, scope, receive, send):
+        self.started += 1
+        await self.release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+
+def client(app, controller) -> httpx.AsyncClient:
+    middleware = AdmissionControlMiddleware(app, controller)
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://test"
+    )
+
+
+def bearer(user_id: int):
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+async def started(app: Held, count: int) -> None:
+    while app.started < count:
+        await asyncio.sleep(0.001)
+
+
+def test_requests_are_classified_by_route():
+    controller = AdmissionController(DEFAULT_LIMITS)
+    classes = {
+        ("POST", "/v1/MagIC/private/validate"): "validate",
+        ("GET", "/v1/MagIC/data/search"): "search",
+        ("GET", "/v1/MagIC/search/sites"): "search",
+        ("PUT", "/v1/MagIC/private/uploads/1/chunks/0"): "upload",
+        ("GET", "/v1/MagIC/data"): "download",
+        ("PUT", "/v1/MagIC/private/data/1"): None,
+        ("GET", "/v1/health-check"): None,
+    }
+    for (method, path), name in classes.items():
+        endpoint_class = controller.classify(method, path)
+        assert (endpoint_class and endpoint_class.name) == name, path
+
+
+def test_client_key():
+    scope = {"headers": [(b"authorization", bearer(7)["Authorization"].encode())]}
+    assert client_key(scope) == "user:7"
+    scope = {
+        "headers": [(b"authorization", b"Bearer invalid")],
+        "client": ("192.0.2.1", 4000),
+    }
+    assert client_key(scope) == "ip:192.0.2.1"
+
+
+def test_configured_limits():
+    overridden = configured_limits({"search": {"concurrency": 32.0}})
+    assert overridden["search"].concurrency == 32
+    assert isinstance(overridden["search"].concurrency, int)
+    assert overridden["validate"] == DEFAULT_LIMITS["validate"]
+    with pytest.raises(ValueError):
+        configured_limits({"browse": {"rate": 1}})
+    with pytest.raises(ValueError):
+        configured_limits({"search": {"speed": 1}})
+
+
+@pytest.mark.asyncio
+async def test_users_over_their_rate_get_429():
+    controller = AdmissionController(limits(rate=0.01, burst=2))
+    app = Held()
+    app.release.set()
+    async with client(app, controller) as http:
+        codes = [
+            (await http.get(SEARCH, headers=bearer(1))).status_code for _ in range(3)
+        ]
+        other = await http.get(SEARCH, headers=bearer(2))
+        rejected = await http.get(SEARCH, headers=bearer(1))
+    assert codes == [200, 200, 429]
+    assert other.status_code == 200
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert controller.classes["search"].rejected["user_rate"] == 2
+
+
+@pytest.mark.asyncio
+async def test_requests_over_the_route_rate_get_503():
+    controller = AdmissionController(limits(route_rate=0.01, route_burst=1))
+    app = Held()
+    app.release.set()
+    async with client(app, controller) as http:
+        first = await http.get(SEARCH, headers=bearer(1))
+        second = await http.get(SEARCH, headers=bearer(2))
+    assert (first.status_code, second.status_code) == (200, 503)
+    assert controller.classes["search"].rejected["route_rate"] == 1
+
+
+@pytest.mark.asyncio
+async def test_users_over_their_concurrency_get_429():
+    controller = AdmissionController(limits(user_concurrency=1))
+    app = Held()
+    async with client(app, controller) as http:
+        running = asyncio.create_task(http.get(SEARCH, headers=bearer(1)))
+        await started(app, 1)
+        rejected = await http.get(SEARCH, headers=bearer(1))
+        app.release.set()
+        assert (await running).status_code == 200
+    assert rejected.status_code == 429
+    assert controller.classes["search"].rejected["user_concurrency"] == 1
+    assert controller.classes["search"].user_inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_requests_queue_for_a_slot_and_are_shed_when_it_is_full():
+    controller = AdmissionController(limits(concurrency=1, queue_size=1))
+    endpoint_class = controller.classes["search"]
+    app = Held()
+    async with client(app, controller) as http:
+        running = asyncio.create_task(http.get(SEARCH, headers=bearer(1)))
+        await started(app, 1)
+        queued = asyncio.create_task(http.get(SEARCH, headers=bearer(2)))
+        while not endpoint_class.gate.queued:
+            await asyncio.sleep(0.001)
+        shed = await http.get(SEARCH, headers=bearer(3))
+        assert endpoint_class.stats()["queued"] == 1
+
+        app.release.set()
+        responses = await asyncio.gather(running, queued)
+    assert [response.status_code for response in responses] == [200, 200]
+    assert shed.status_code == 503
+    assert "Retry-After" in shed.headers
+    stats = endpoint_class.stats()
+    assert (stats["active"], stats["queued"], stats["admitted"]) == (0, 0, 2)
+    assert stats["rejected"]["queue_full"] == 1
+
+
+@pytest.mark.asyncio
+async def test_requests_waiting_too_long_are_shed():
+    controller = AdmissionController(limits(concurrency=1, queue_timeout=0.05))
+    endpoint_class = controller.classes["search"]
+    app = Held()
+    async with client(app, controller) as http:
+        running = asyncio.create_task(http.get(SEARCH, headers=bearer(1)))
+        await started(app, 1)
+        timed_out = await http.get(SEARCH, headers=bearer(2))
+        app.release.set()
+        await running
+    assert timed_out.status_code == 503
+    assert endpoint_class.rejected["queue_timeout"] == 1
+    assert endpoint_class.gate.queued == 0
+    assert endpoint_class.gate.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_stats(monkeypatch):
+    controller = AdmissionController(limits(concurrency=1))
+    monkeypatch.setattr(health_check, "admission_controller", controller)
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL_ENABLED", True)
+    app = Held()
+    async with client(app, controller) as http, httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=fiesta), base_url="http://test"
+    ) as api:
+        assert (await api.get("/v1/health-check/admission")).json()["status"] == "ok"
+
+        running = asyncio.create_task(http.get(SEARCH))
+        await started(app, 1)
+        response = await api.get("/v1/health-check/admission")
+        app.release.set()
+        await running
+    assert response.json()["status"] == "saturated"
+    assert response.json()["classes"]["search"]["active"] == 1
@@ -0,0 +1,36 @@
+"""
+Tests for validating documents block by block.
+"""
+import pytest
+from sqlalchemy import select
+
+from app.db.models.block import ContentBlock
+from app.services import blocks
+
+DOCUMENT = {
+    "sites": [{"site": "a", "lat": 1.0}],
+    "measurements": {"columns": ["specimen", "treat_temp"], "rows": [["s1"]]},
+}
+
+
+def test_validate_document_checks_every_table():
+    errors, warnings = blocks.validate_document(DOCUMENT)
+    assert [error["table"] for error in errors] == ["measurements"]
+    assert blocks.validate_document([]) == blocks.NOT_AN_OBJECT
+
+
+@pytest.mark.asyncio
+async def test_validate_caches_messages_of_new_blocks(session_factory):
+    async with session_factory() as db:
+        first = await blocks.validate(db, DOCUMENT)
+        await db.commit()
+
+    async with session_factory() as db:
+        saved = (await db.execute(select(ContentBlock))).scalars().all()
+        assert len(saved) == 2
+        assert all(block.ref_count == 0 for block in saved)
+        assert all(block.released_at is not None for block in saved)
+        assert all(block.validation for block in saved)
+
+        assert await blocks.validate(db, DOCUMENT) == first
+        assert first == blocks.validate_document(DOCUMENT)
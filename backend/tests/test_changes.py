@@ -0,0 +1,51 @@
+"""
+Tests for the contribution change feed.
+"""
+import pytest
+
+from app.db.models.contribution import ContributionStatus
+from app.schemas.changes import ChangeCursor
+from app.schemas.data import DataCreate, DataType
+from app.services.contribution import ContributionService
+
+
+@pytest.mark.parametrize(
+    "value, cursor",
+    [
+        ("0", ChangeCursor(0, 0)),
+        ("812-40", ChangeCursor(812, 40)),
+        ("40", ChangeCursor(None, 40)),
+    ],
+)
+def test_cursor_round_trip(value, cursor):
+    assert ChangeCursor.parse(value) == cursor
+    assert str(cursor) == value
+
+
+@pytest.mark.parametrize("value", ["", "x", "-1", "1-2-3", "1--2"])
+def test_invalid_cursors_are_refused(value):
+    with pytest.raises(ValueError):
+        ChangeCursor.parse(value)
+
+
+@pytest.mark.asyncio
+async def test_public_feed_moves_past_private_changes(session_factory, user):
+    async with session_factory() as db:
+        published = await ContributionService.create_contribution(
+            db, DataCreate(data={"sites": []}, data_type=DataType.SITE), "MagIC", user
+        )
+        await ContributionService.change_contribution_status(
+            db, published.id, ContributionStatus.PUBLISHED, user, repository="MagIC"
+        )
+        await ContributionService.create_contribution(
+            db, DataCreate(data={"sites": []}, data_type=DataType.SITE), "MagIC", user
+        )
+
+    async with session_factory() as db:
+        events, cursor = await ContributionService.get_changes(db, "MagIC")
+        assert [event.contribution_id for event in events] == [published.id] * 2
+        assert cursor.id > events[-1].id
+
+        events, again = await ContributionService.get_changes(db, "MagIC", cursor)
+        assert events == []
+        assert again == cursor
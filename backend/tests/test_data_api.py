@@ -0,0 +1,130 @@
+"""
+Tests for the data endpoints, called through the application.
+"""
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.api.v1.deps import get_current_active_user
+from app.api.v1.endpoints.data import make_etag
+from app.core.security import create_access_token
+from app.db.session import get_db, get_read_db
+from app.main import app
+from app.schemas.data import DataCreate, DataType
+from app.services.contribution import ContributionService
+
+
+@pytest_asyncio.fixture
+async def anonymous(session_factory):
+    """Client of the application on the test database."""
+
+    async def test_db():
+        async with session_factory() as session:
+            yield session
+            await session.commit()
+
+    app.dependency_overrides[get_db] = test_db
+    app.dependency_overrides[get_read_db] = test_db
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+@pytest_asyncio.fixture
+async def client(anonymous, user):
+    """Client of the application on the test database, signed in as ``user``."""
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    yield anonymous
+
+
+@pytest.mark.asyncio
+async def test_put_returns_the_updated_document(client, session_factory, user):
+    async with session_factory() as db:
+        created = await ContributionService.create_contribution(
+            db,
+            DataCreate(data={"sites": [{"site": "a"}]}, data_type=DataType.SITE),
+            "MagIC",
+            user,
+        )
+    url = f"/v1/MagIC/private/data/{created.id}"
+
+    changed = await client.put(
+        url,
+        json={"data": {"sites": [{"site": "b"}]}, "metadata": {"note": "b"}},
+        headers={"If-Match": make_etag(created.id, created.revision)},
+    )
+    assert changed.status_code == 200, changed.text
+    assert changed.json()["data"] == {"sites": [{"site": "b"}]}
+    assert changed.json()["metadata"] == {"note": "b"}
+    etag = changed.headers["ETag"]
+    assert etag != make_etag(created.id, created.revision)
+
+    unchanged = await client.put(
+        url,
+        json={"data": {"sites": [{"site": "b"}]}},
+        headers={"If-Match": etag},
+    )
+    assert unchanged.status_code == 200, unchanged.text
+    assert unchanged.json()["data"] == {"sites": [{"site": "b"}]}
+    assert unchanged.headers["ETag"] == etag
+
+    async with session_factory() as db:
+        stored = await ContributionService.get_contribution(
+            db, created.id, include_private=True, repository="MagIC"
+        )
+    assert stored.data == {"sites": [{"site": "b"}]}
+
+
+@pytest.mark.asyncio
+async def test_put_with_a_stale_etag_is_rejected(client, session_factory, user):
+    async with session_factory() as db:
+        created = await ContributionService.create_contribution(
+            db,
+            DataCreate(data={"sites": [{"site": "a"}]}, data_type=DataType.SITE),
+            "MagIC",
+            user,
+        )
+
+    response = await client.put(
+        f"/v1/MagIC/private/data/{created.id}",
+        json={"data": {"sites": [{"site": "b"}]}},
+        headers={"If-Match": make_etag(created.id, created.revision + 1)},
+    )
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_patch_checks_the_media_type_before_the_body(client):
+    response = await client.patch(
+        "/v1/MagIC/private/data/1",
+        content=b"not json",
+        headers={"Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_bulk_status_changes_only_take_known_statuses(client):
+    response = await client.post(
+        "/v1/MagIC/private/data/status",
+        json={"status": "deleted", "items": [{"id": 1}]},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_private_routes_take_a_bearer_token(anonymous, user):
+    url = "/v1/MagIC/private/data/1"
+    body = {"data": {"sites": []}}
+    token = create_access_token({"sub": str(user.id)})
+    signed_in = await anonymous.put(
+        url, json=body, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert signed_in.status_code == 404
+
+    for token in ("invalid", create_access_token({"sub": "curator"})):
+        rejected = await anonymous.put(
+            url, json=body, headers={"Authorization": f"Bearer {token}"}
+        )
+        assert rejected.status_code == 401
@@ -0,0 +1,75 @@
+"""
+Tests for contribution lineages and their latest versions.
+"""
+import pytest
+
+from app.db.models.contribution import ContributionStatus
+from app.schemas.data import BulkStatusItem, DataCreate, DataType
+from app.services.contribution import ContributionService
+
+
+def document(site: str, version_of=None) -> DataCreate:
+    return DataCreate(
+        data={"sites": [{"site": site}]}, data_type=DataType.SITE, version_of=version_of
+    )
+
+
+@pytest.mark.asyncio
+async def test_publishing_a_newer_version_changes_the_older_etag(
+    session_factory, user
+):
+    async with session_factory() as db:
+        older = await ContributionService.create_contribution(
+            db, document("a"), "MagIC", user
+        )
+        older = await ContributionService.change_contribution_status(
+            db, older.id, ContributionStatus.PUBLISHED, user, repository="MagIC"
+        )
+        assert older.is_latest
+        newer = await ContributionService.create_contribution(
+            db, document("b", version_of=older.id), "MagIC", user
+        )
+        before = await ContributionService.get_contribution_revision(
+            db, older.id, repository="MagIC"
+        )
+
+        draft_revision = newer.revision
+        newer = await ContributionService.change_contribution_status(
+            db, newer.id, ContributionStatus.PUBLISHED, user, repository="MagIC"
+        )
+        assert newer.is_latest
+        # One status change, one revision, although the flag changed too
+        assert newer.revision == draft_revision + 1
+
+    async with session_factory() as db:
+        after = await ContributionService.get_contribution_revision(
+            db, older.id, repository="MagIC"
+        )
+        assert after > before
+        older = await ContributionService.get_contribution(
+            db, older.id, repository="MagIC"
+        )
+        assert not older.is_latest
+
+
+@pytest.mark.asyncio
+async def test_bulk_results_report_revisions_after_the_latest_flag(
+    session_factory, user
+):
+    async with session_factory() as db:
+        draft = await ContributionService.create_contribution(
+            db, document("a"), "MagIC", user
+        )
+        result = await ContributionService.change_contributions_status(
+            db,
+            [BulkStatusItem(id=draft.id, revision=draft.revision)],
+            ContributionStatus.PUBLISHED,
+            user,
+            "MagIC",
+        )
+
+    async with session_factory() as db:
+        revision = await ContributionService.get_contribution_revision(
+            db, draft.id, repository="MagIC"
+        )
+    assert result.results[0].revision == revision == 2
@@ -0,0 +1,133 @@
+"""
+Tests for converting a database created before the contribution tables were
+partitioned.
+"""
+import pytest
+from sqlalchemy import text
+
+from app.db.models.contribution import Contribution, ContributionHistory
+from app.db.models.search import SEARCH_TABLES
+from app.db.session import Base
+from scripts.partition_by_repository import partition
+
+# The contribution tables as the first release created them
+BASELINE = [
+    """
+    CREATE TABLE contributions (
+        id SERIAL PRIMARY KEY,
+        repository VARCHAR(50) NOT NULL,
+        data_type VARCHAR(50) NOT NULL,
+        version VARCHAR(20),
+        data JSONB NOT NULL,
+        metadata JSONB,
+        status contributionstatus,
+        is_public BOOLEAN,
+        created_by INTEGER NOT NULL REFERENCES users (id),
+        updated_by INTEGER REFERENCES users (id),
+        published_at TIMESTAMP WITHOUT TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    "CREATE INDEX ix_contributions_repository ON contributions (repository)",
+    """
+    CREATE TABLE contribution_history (
+        id SERIAL PRIMARY KEY,
+        contribution_id INTEGER NOT NULL REFERENCES contributions (id),
+        action VARCHAR(50) NOT NULL,
+        changes JSONB,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+]
+
+
+@pytest.mark.asyncio
+async def test_a_baseline_database_is_converted(session_factory, user):
+    engine = session_factory.kw["bind"]
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync: Base.metadata.drop_all(
+                sync,
+                tables=[
+                    table
+                    for table in Base.metadata.sorted_tables
+                    if table.name != "users"
+                ],
+                checkfirst=True,
+            )
+        )
+        await conn.exec_driver_sql(
+            "CREATE TYPE contributionstatus AS ENUM "
+            "('DRAFT', 'SUBMITTED', 'PUBLISHED', 'REJECTED', 'ARCHIVED')"
+        )
+        for statement in BASELINE:
+            await conn.exec_driver_sql(statement)
+        await conn.execute(
+            text(
+                "INSERT INTO contributions (repository, data_type, data, status, "
+                "is_public, created_by, created_at) VALUES "
+                "('MagIC', 'site', '{\"sites\": []}', 'PUBLISHED', true, :user, "
+                "'2023-05-04')"
+            ),
+            {"user": user.id},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO contribution_history "
+                "(contribution_id, action, changes, user_id, created_at) "
+                "VALUES (1, 'create', '{}', :user, '2023-05-04')"
+            ),
+            {"user": user.id},
+        )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(partition, False)
+    # Converted tables are left alone
+    async with engine.begin() as conn:
+        await conn.run_sync(partition, False)
+
+    async with engine.connect() as conn:
+        kinds = dict(
+            (
+                await conn.execute(
+                    text(
+                        "SELECT relname, relkind::text FROM pg_class WHERE relname IN "
+                        "('contributions', 'contribution_history', "
+                        "'contributions_unpartitioned')"
+                    )
+                )
+            ).all()
+        )
+        assert kinds == {"contributions": "p", "contribution_history": "p"}
+        for model in SEARCH_TABLES.values():
+            assert (
+                await conn.execute(
+                    text("SELECT to_regclass(:table)"),
+                    {"table": model.__tablename__},
+                )
+            ).scalar()
+
+    async with session_factory() as db:
+        contribution = await db.get(Contribution, (1, "MagIC"))
+        assert contribution.revision == 1
+        assert contribution.data == {"sites": []}
+        history = (
+            await db.execute(text("SELECT repository, txid FROM contribution_history"))
+        ).one()
+        assert history.repository == "MagIC"
+        assert history.txid is not None
+
+        db.add(
+            ContributionHistory(
+                contribution_id=1, repository="MagIC", action="update", user_id=user.id
+            )
+        )
+        contribution.metadata = {"checked": True}
+        await db.commit()
+        assert contribution.revision == 2
+        assert (
+            await db.execute(text("SELECT MAX(id) FROM contribution_history"))
+        ).scalar() == 2
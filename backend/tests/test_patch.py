@@ -0,0 +1,192 @@
+"""
+Tests for JSON Patch and JSON Merge Patch compiled to SQL, run in Postgres.
+
+Most cases are the examples of RFC 6902, appendix A, and RFC 7386,
+appendix A.
+"""
+import orjson
+import pytest
+from sqlalchemy import cast, literal, select, true
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.schemas.data import DataCreate, DataType
+from app.services import patch
+from app.services.contribution import ContributionService
+
+
+async def apply(session_factory, document, operations):
+    """Patch a document in the database; None if the patch does not apply."""
+    base = select(
+        cast(literal(orjson.dumps(document).decode()), JSONB).label("d"),
+        true().label("ok"),
+    ).subquery()
+    patched = patch.compile_patch(base, operations)
+    async with session_factory() as db:
+        row = (await db.execute(select(patched.c.d, patched.c.ok))).one()
+    return row.d if row.ok else None
+
+
+def json_patch(*operations):
+    return patch.parse_json_patch(list(operations), 100)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "document, operations, expected",
+    [
+        (
+            {"foo": "bar"},
+            [{"op": "add", "path": "/baz", "value": "qux"}],
+            {"baz": "qux", "foo": "bar"},
+        ),
+        (
+            {"foo": ["bar", "baz"]},
+            [{"op": "add", "path": "/foo/1", "value": "qux"}],
+            {"foo": ["bar", "qux", "baz"]},
+        ),
+        (
+            {"foo": ["bar"]},
+            [{"op": "add", "path": "/foo/-", "value": ["abc", "def"]}],
+            {"foo": ["bar", ["abc", "def"]]},
+        ),
+        (
+            {"foo": ["bar"]},
+            [{"op": "add", "path": "/foo/1", "value": "baz"}],
+            {"foo": ["bar", "baz"]},
+        ),
+        (
+            {"baz": "qux", "foo": "bar"},
+            [{"op": "remove", "path": "/baz"}],
+            {"foo": "bar"},
+        ),
+        (
+            {"foo": ["bar", "qux", "baz"]},
+            [{"op": "remove", "path": "/foo/1"}],
+            {"foo": ["bar", "baz"]},
+        ),
+        (
+            {"baz": "qux", "foo": "bar"},
+            [{"op": "replace", "path": "/baz", "value": "boo"}],
+            {"baz": "boo", "foo": "bar"},
+        ),
+        (
+            {"foo": {"bar": "baz", "waldo": "fred"}, "qux": {"corge": "grault"}},
+            [{"op": "move", "from": "/foo/waldo", "path": "/qux/thud"}],
+            {"foo": {"bar": "baz"}, "qux": {"corge": "grault", "thud": "fred"}},
+        ),
+        (
+            {"foo": ["all", "grass", "cows", "eat"]},
+            [{"op": "move", "from": "/foo/1", "path": "/foo/3"}],
+            {"foo": ["all", "cows", "eat", "grass"]},
+        ),
+        (
+            {"foo": {"bar": 1}},
+            [{"op": "copy", "from": "/foo", "path": "/baz"}],
+            {"foo": {"bar": 1}, "baz": {"bar": 1}},
+        ),
+        (
+            {"baz": "qux", "foo": ["a", 2, "c"]},
+            [
+                {"op": "test", "path": "/baz", "value": "qux"},
+                {"op": "test", "path": "/foo/1", "value": 2},
+            ],
+            {"baz": "qux", "foo": ["a", 2, "c"]},
+        ),
+        (
+            {"/": 9, "~1": 10},
+            [
+                {"op": "test", "path": "/~01", "value": 10},
+                {"op": "replace", "path": "/~1", "value": 11},
+            ],
+            {"/": 11, "~1": 10},
+        ),
+        (
+            # Tokens that are not indexes are keys of objects
+            {"sites": {"01": "a", "-1": "b"}},
+            [
+                {"op": "remove", "path": "/sites/01"},
+                {"op": "replace", "path": "/sites/-1", "value": "c"},
+            ],
+            {"sites": {"-1": "c"}},
+        ),
+        (
+            {"foo": "bar"},
+            [{"op": "replace", "path": "", "value": {"baz": "qux"}}],
+            {"baz": "qux"},
+        ),
+    ],
+)
+async def test_json_patch(session_factory, document, operations, expected):
+    assert await apply(session_factory, document, json_patch(*operations)) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "document, operation",
+    [
+        ({"baz": "qux"}, {"op": "test", "path": "/baz", "value": "bar"}),
+        ({"foo": "bar"}, {"op": "remove", "path": "/baz"}),
+        ({"foo": "bar"}, {"op": "replace", "path": "/baz", "value": 1}),
+        ({"foo": "bar"}, {"op": "add", "path": "/baz/bat", "value": "qux"}),
+        ({"foo": ["bar"]}, {"op": "add", "path": "/foo/2", "value": "qux"}),
+        ({"foo": "bar"}, {"op": "copy", "from": "/baz", "path": "/qux"}),
+        ({"foo": ["a", "b"]}, {"op": "remove", "path": "/foo/01"}),
+        ({"foo": ["a", "b"]}, {"op": "replace", "path": "/foo/-1", "value": "c"}),
+        ({"foo": ["a", "b"]}, {"op": "add", "path": "/foo/-1", "value": "c"}),
+        ({"foo": ["a", "b"]}, {"op": "test", "path": "/foo/-1", "value": "b"}),
+        ({"foo": [{"a": 1}]}, {"op": "add", "path": "/foo/00/b", "value": 2}),
+    ],
+)
+async def test_json_patch_conflicts(session_factory, document, operation):
+    assert await apply(session_factory, document, json_patch(operation)) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "document, merge, expected",
+    [
+        ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+        ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+        ({"a": "b"}, {"a": None}, {}),
+        ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+        ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+        ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+        ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+        ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+        ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+        ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+        ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+    ],
+)
+async def test_merge_patch(session_factory, document, merge, expected):
+    operations = patch.merge_patch_operations(merge, 100)
+    assert await apply(session_factory, document, operations) == expected
+
+
+@pytest.mark.asyncio
+async def test_a_failed_test_leaves_the_contribution_unchanged(
+    session_factory, user
+):
+    async with session_factory() as db:
+        created = await ContributionService.create_contribution(
+            db,
+            DataCreate(data={"sites": [{"site": "a"}]}, data_type=DataType.SITE),
+            "MagIC",
+            user,
+        )
+        data_id, revision = created.id, created.revision
+        operations = json_patch(
+            {"op": "replace", "path": "/sites/0/site", "value": "b"},
+            {"op": "test", "path": "/sites/0/site", "value": "a"},
+        )
+        with pytest.raises(patch.PatchConflictError):
+            await ContributionService.patch_contribution(
+                db, data_id, operations, {"patch": []}, user, repository="MagIC"
+            )
+
+    async with session_factory() as db:
+        stored = await ContributionService.get_contribution(
+            db, data_id, include_private=True, repository="MagIC"
+        )
+    assert stored.revision == revision
+    assert stored.data == {"sites": [{"site": "a"}]}
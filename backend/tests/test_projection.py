@@ -0,0 +1,150 @@
+"""
+Tests for field projections, compiled to SQL and run in Postgres.
+"""
+import orjson
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Text, cast, literal, select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.api.v1.deps import get_level_projection, get_projection
+from app.core.config import settings
+from app.db.models.search import SearchLevel
+from app.schemas.data import DataCreate, DataType
+from app.services.contribution import ContributionService
+from app.services.projection import MAX_DEPTH, VIEWS, Projection, parse_paths
+
+DOCUMENT = {
+    "contribution": [{"id": 1, "version": 2, "reference": "doi"}],
+    "sites": [
+        {"site": "a", "lat": 1.5, "lon": 2.5, "method_codes": "X"},
+        {"site": "b", "lat": 3.5},
+    ],
+    "measurements": {"columns": ["m"], "rows": [[1]]},
+}
+
+
+async def project(session_factory, projection, document=DOCUMENT):
+    source = cast(literal(orjson.dumps(document).decode()), JSONB)
+    async with session_factory() as db:
+        return (await db.execute(select(projection.apply(source)))).scalar_one()
+
+
+def test_parse_paths():
+    assert parse_paths(" sites.lat, contribution ,") == [
+        ("sites", "lat"),
+        ("contribution",),
+    ]
+    assert parse_paths(None) == []
+    with pytest.raises(ValueError):
+        parse_paths("sites..lat")
+    with pytest.raises(ValueError):
+        parse_paths(".".join(["a"] * (MAX_DEPTH + 1)))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "fields, exclude, expected",
+    [
+        (None, None, DOCUMENT),
+        ("contribution", None, {"contribution": DOCUMENT["contribution"]}),
+        (
+            "contribution.id,sites.lat",
+            None,
+            {"contribution": [{"id": 1}], "sites": [{"lat": 1.5}, {"lat": 3.5}]},
+        ),
+        ("locations", None, {}),
+        (
+            None,
+            "measurements,sites.lat,sites.lon",
+            {
+                "contribution": DOCUMENT["contribution"],
+                "sites": [{"site": "a", "method_codes": "X"}, {"site": "b"}],
+            },
+        ),
+        (None, "locations.lat", DOCUMENT),
+        # Conflicting and redundant paths
+        (
+            "sites",
+            "sites.lat,sites.lon,sites.method_codes",
+            {"sites": [{"site": "a"}, {"site": "b"}]},
+        ),
+        ("sites.lat,contribution.id", "sites", {"contribution": [{"id": 1}]}),
+        ("sites.site,sites", None, {"sites": DOCUMENT["sites"]}),
+        ("sites.lat", "sites.lat", {"sites": [{}, {}]}),
+    ],
+)
+async def test_projection(session_factory, fields, exclude, expected):
+    projection = Projection(parse_paths(fields), parse_paths(exclude))
+    assert await project(session_factory, projection) == expected
+
+
+@pytest.mark.parametrize(
+    "level, view",
+    [(level, view) for level, views in VIEWS.items() for view in views],
+)
+def test_views_are_valid_paths(level, view):
+    projection = Projection.from_query(level, view=view.upper())
+    assert projection.fields == parse_paths(",".join(VIEWS[level][view]["fields"]))
+    assert projection.exclude == parse_paths(",".join(VIEWS[level][view]["exclude"]))
+
+
+def test_views_add_to_the_requested_paths():
+    projection = Projection.from_query("sites", fields="method_codes", view="map")
+    assert projection.fields == parse_paths("method_codes,site,location,lat,lon")
+    with pytest.raises(ValueError):
+        Projection.from_query("measurements", view="map")
+
+
+@pytest.mark.asyncio
+async def test_contributions_map_view(session_factory):
+    projection = Projection.from_query("contributions", view="map")
+    assert await project(session_factory, projection) == {
+        "contribution": [{"id": 1, "version": 2, "reference": "doi"}],
+    }
+
+
+def test_projection_dependencies():
+    projection = get_projection("contributions")(
+        fields="contribution", exclude="contribution.id", view=None
+    )
+    assert projection.fields == [("contribution",)]
+    assert projection.exclude == [("contribution", "id")]
+
+    projection = get_level_projection(
+        SearchLevel.SITES, fields=None, exclude=None, view="map"
+    )
+    assert projection.fields == parse_paths("site,location,lat,lon")
+
+    for level, view in ((SearchLevel.MEASUREMENTS, "map"), (SearchLevel.SITES, "x")):
+        with pytest.raises(HTTPException) as error:
+            get_level_projection(level, fields=None, exclude=None, view=view)
+        assert error.value.status_code == 422
+    with pytest.raises(HTTPException) as error:
+        get_projection("sites")(fields="a..b", exclude=None, view=None)
+    assert error.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_offloaded_documents_are_projected(
+    session_factory, user, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(settings, "DATA_OFFLOAD_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "BLOB_DIR", str(tmp_path))
+    async with session_factory() as db:
+        created = await ContributionService.create_contribution(
+            db, DataCreate(data=DOCUMENT, data_type=DataType.SITE), "MagIC", user
+        )
+        assert created.data_ref is not None
+
+    projection = Projection(parse_paths("sites.site"), [])
+    async with session_factory() as db:
+        _, data_json = await ContributionService.get_contribution_json(
+            db, created.id, include_private=True, projection=projection
+        )
+        assert orjson.loads(data_json) == {"sites": [{"site": "a"}, {"site": "b"}]}
+
+        _, data_json = await ContributionService.get_contribution_json(
+            db, created.id, include_private=True
+        )
+        assert data_json is None
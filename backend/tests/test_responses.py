@@ -0,0 +1,30 @@
+"""
+Tests for the compressed JSON responses.
+"""
+import pytest
+from starlette.requests import Request
+
+from app.core.responses import json_response
+
+BODY = b"[" + b"1," * 100000 + b"1]"
+
+
+def request(accept_encoding: str = "") -> Request:
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.mark.asyncio
+async def test_compressed_bodies_get_a_weak_etag():
+    response = await json_response(request("gzip"), BODY, headers={"ETag": '"1-2"'})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"1-2"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio
+async def test_identity_bodies_keep_the_strong_etag():
+    response = await json_response(request(), BODY, headers={"ETag": '"1-2"'})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"1-2"'
+    assert response.headers["vary"] == "Accept-Encoding"
@@ -0,0 +1,141 @@
+"""
+Tests for draining the search outbox into the search cluster.
+"""
+import json
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from app.db.models.contribution import ContributionStatus
+from app.db.models.outbox import SearchOutbox, SearchOutboxAction
+from app.schemas.data import DataCreate, DataType
+from app.services.contribution import ContributionService
+from app.services.search_index import SearchIndexer
+
+from tests.search_stub import BulkStub
+
+
+def make_indexer(stub: BulkStub, session_factory=None, **kwargs) -> SearchIndexer:
+    kwargs.setdefault("poll_interval", 0.01)
+    return SearchIndexer(
+        session_factory=session_factory,
+        client=httpx.AsyncClient(base_url=stub.url),
+        **kwargs,
+    )
+
+
+def action(kind: str, contribution_id: int) -> bytes:
+    meta = {"_index": "fiesta_magic", "_id": str(contribution_id)}
+    lines = [json.dumps({kind: meta})]
+    if kind == "index":
+        lines.append(json.dumps({"id": contribution_id}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.mark.asyncio
+async def test_send_splits_bulk_requests_and_maps_item_statuses():
+    statuses = {("index", "1"): 200, ("delete", "2"): 404, ("index", "3"): 429}
+    with BulkStub(lambda kind, document_id: statuses[kind, document_id]) as stub:
+        indexer = make_indexer(stub, max_bulk_bytes=len(action("index", 1)) + 1)
+        results = await indexer._send(
+            [
+                (11, action("index", 1)),
+                (12, action("delete", 2)),
+                (13, action("index", 3)),
+            ]
+        )
+        await indexer.client.aclose()
+
+    assert len(stub.requests) > 1
+    assert [(a["action"], a["id"]) for a in stub.actions] == list(statuses)
+    assert results == {11: (200, None), 12: (404, None), 13: (429, None)}
+
+
+@pytest.mark.asyncio
+async def test_send_reports_rejected_requests_for_every_action():
+    with BulkStub() as stub:
+        stub.request_status = 503
+        indexer = make_indexer(stub)
+        results = await indexer._send(
+            [(1, action("index", 1)), (2, action("index", 2))]
+        )
+        await indexer.client.aclose()
+
+    assert {entry_id: status for entry_id, (status, _) in results.items()} == {
+        1: 503,
+        2: 503,
+    }
+
+
+def test_superseded_entries_are_judged_by_the_action_sent():
+    older = SearchOutbox(id=1, contribution_id=5, action=SearchOutboxAction.INDEX)
+    newest = SearchOutbox(id=2, contribution_id=5, action=SearchOutboxAction.DELETE)
+    indexer = SearchIndexer(client=httpx.AsyncClient())
+
+    succeeded, retry = indexer._resolve(
+        [older, newest], {5: newest}, {2: (404, None)}
+    )
+    assert succeeded == [1, 2]
+    assert retry == {}
+
+    succeeded, retry = indexer._resolve(
+        [older, newest], {5: newest}, {2: (500, "boom")}
+    )
+    assert succeeded == []
+    assert set(retry) == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_drain_indexes_only_published_public_contributions(session_factory, user):
+    async with session_factory() as db:
+        published = await ContributionService.create_contribution(
+            db, DataCreate(data={"sites": [{"site": "a"}]}, data_type=DataType.SITE),
+            "MagIC", user,
+        )
+        draft = await ContributionService.create_contribution(
+            db, DataCreate(data={"sites": [{"site": "b"}]}, data_type=DataType.SITE),
+            "MagIC", user,
+        )
+        await ContributionService.change_contribution_status(
+            db, published.id, ContributionStatus.PUBLISHED, user, repository="MagIC"
+        )
+        # A contribution that was deleted since
+        db.add(SearchOutbox(contribution_id=999999, repository="MagIC"))
+        await db.commit()
+
+    with BulkStub(lambda kind, _: 404 if kind == "delete" else 201) as stub:
+        indexer = make_indexer(stub, session_factory)
+        claimed = await indexer.drain_once()
+        await indexer.client.aclose()
+
+    assert claimed == 4
+    sent = {(a["action"], a["id"]) for a in stub.actions}
+    assert sent == {
+        ("index", str(published.id)),
+        ("delete", str(draft.id)),
+        ("delete", "999999"),
+    }
+    indexed = next(a for a in stub.actions if a["action"] == "index")
+    assert indexed["document"]["status"] == "published"
+    async with session_factory() as db:
+        assert (await db.execute(select(SearchOutbox))).scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_drain_backs_off_when_the_cluster_pushes_back(session_factory, user):
+    async with session_factory() as db:
+        db.add(SearchOutbox(contribution_id=1, repository="MagIC"))
+        await db.commit()
+
+    with BulkStub() as stub:
+        stub.request_status = 429
+        indexer = make_indexer(stub, session_factory, batch_size=8)
+        assert await indexer.drain_once() == 1
+        await indexer.client.aclose()
+
+    assert indexer.batch_size == 4
+    async with session_factory() as db:
+        entry = (await db.execute(select(SearchOutbox))).scalar_one()
+    assert entry.attempts == 1
+    assert entry.processed_at is None
@@ -0,0 +1,70 @@
+"""
+Tests for pinning clients that wrote to the primary.
+"""
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app.db import session as db_session
+from app.db.models.user import User
+from app.db.replicas import Replica, ReplicaRouter
+
+
+def request(method: str) -> Request:
+    return Request({
+        "type": "http", "method": method, "headers": [], "client": ("192.0.2.1", 1)
+    })
+
+
+@pytest.fixture
+def primary(session_factory, monkeypatch):
+    """Session factory of get_db on the test database, with one replica."""
+    factory = sessionmaker(
+        bind=session_factory.kw["bind"],
+        class_=AsyncSession,
+        sync_session_class=db_session.PrimarySession,
+        expire_on_commit=False,
+    )
+    router = ReplicaRouter(
+        [Replica("replica", create_async_engine("postgresql+asyncpg://replica/db"))]
+    )
+    monkeypatch.setattr(db_session, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(db_session, "replica_router", router)
+    return router
+
+
+async def run(method: str, work) -> None:
+    dependency = db_session.get_db(request(method))
+    db = await dependency.__anext__()
+    await work(db)
+    with pytest.raises(StopAsyncIteration):
+        await dependency.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_only_requests_that_committed_a_write_are_pinned(primary, user):
+    async def read(db):
+        await db.execute(select(User))
+        await db.execute(select(User.id).with_for_update())
+
+    async def write_rolled_back(db):
+        await db.execute(update(User).values(full_name="Curator"))
+        await db.rollback()
+
+    async def write_committed(db):
+        await db.execute(update(User).values(full_name="Curator"))
+        await db.commit()
+
+    async def flush(db):
+        row = await db.get(User, user.id)
+        row.full_name = "Curator"
+
+    for work in (read, write_rolled_back):
+        await run("POST", work)
+        assert not primary.is_pinned("ip:192.0.2.1")
+    for work in (write_committed, flush):
+        primary._pins.clear()
+        await run("POST", work)
+        assert primary.is_pinned("ip:192.0.2.1")
@@ -0,0 +1,60 @@
+"""
+Tests for reading and placing resumable upload chunks.
+"""
+import base64
+import hashlib
+
+import pytest
+
+from app.db.models.upload import UploadSession, UploadStatus
+from app.services import upload as upload_service
+
+
+def session(status: UploadStatus = UploadStatus.UPLOADING) -> UploadSession:
+    return UploadSession(id="u", upload_length=10, received=[], status=status)
+
+
+async def stream(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def sha256(data: bytes):
+    return upload_service.parse_checksum(
+        "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+    )
+
+
+@pytest.mark.asyncio
+async def test_read_chunk_verifies_the_checksum_before_returning():
+    chunk = await upload_service.read_chunk(
+        session(), 2, stream(b"abc", b"de"), sha256(b"abcde")
+    )
+    assert chunk == b"abcde"
+
+    with pytest.raises(upload_service.ChecksumMismatchError):
+        await upload_service.read_chunk(
+            session(), 2, stream(b"abc", b"dX"), sha256(b"abcde")
+        )
+
+
+@pytest.mark.asyncio
+async def test_read_chunk_refuses_chunks_past_the_end():
+    with pytest.raises(upload_service.UploadOffsetError):
+        await upload_service.read_chunk(session(), 8, stream(b"abc"))
+
+
+@pytest.mark.asyncio
+async def test_read_chunk_refuses_finished_uploads():
+    with pytest.raises(upload_service.UploadStateError):
+        await upload_service.read_chunk(
+            session(UploadStatus.PROCESSING), 0, stream(b"abc")
+        )
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [(0, 2, False), (0, 3, True), (4, 6, True), (9, 12, True), (12, 14, False)],
+)
+def test_overlaps(start, end, expected):
+    assert upload_service.overlaps([[2, 5], [8, 12]], start, end) is expected